@@ -2,21 +2,35 @@ import os
 import sys
 import platform
 import glob
+import json
 import struct
 from PIL import Image, ImagePalette
+from WayForward_Common import ExtractError, DecodeTiles4BPP, ShiftPaletteRows, OpenROM, ReadPalette, GrayscalePalette, ConvertARGB4444, PackRects, HashImage, SaveDuplicates, AddInput, CheckManifest, SaveManifest, ChooseFormat, StageTimer, CountFile, ImageSaver, RenderFrameJob
 
 # WayForward GBA/DS/LeapFrog Didj/Leapster sprite animation (*.ANM/*.AN4/*.AN8) extraction script written by Random Talking Bush.
 # Based only slightly on onepill's TextureUnpacker script: https://github.com/onepill/texture_unpacker_scirpt
 # Thanks to Dr. RNG / BLINXGLITCHES for figuring out the Leapster sprite compression.
 
 ANMFormat = 0 # See the list below for which value should be used for the game you're ripping from. Actual "version" ordering is 1 > 2 > 0 > 3 > 4 > 6 > 5, "0" was made the default due to being the most common.
+AutoDetect = False # Set this to True to work out the "ANMFormat" value from the sprite set itself instead, by checking which format its header and frame data make the most sense for. Even when this is False, the script warns if the file looks like it's in a different format.
 SpriteName = "20" # The name of the .ANM, .AN4 or .AN8 file, will also be the name of the folder said sprites will extract to. Ignored if UseGBAROM = True (it will use the "SpriteStart" offset instead). (Example: "20" will be Shantae's .ANM filename when using my QuickBMS script to unpack Shantae Advance: Risky Revolution.)
 SceneName = "419" # The name of the .SCN or .PAL file to use the palette from, minus extension. Leave blank to use a grayscale palette. Ignored when ANMFormat = 6 (Leapster sprites have no separate palettes).
 PaletteNum = 1 # Use the specified palette number (from 0-15) for the exported sprites. If the sprites look off, change this number and re-export. Ignored if sprites are 8BPP / 256-colour, or when ANMFormat = 6.
+PaletteVariants = [] # List of extra palette numbers to export the sprites with, all in the same run, such as [0, 2, 3] or list(range(16)) for every one of them. Each gets its own "palette0", "palette2" (and so on) subfolder. Leave it empty to only export with "PaletteNum".
 SpriteWidth = 256 # Change this and/or the next value to adjust the image dimensions of the sprite output.
-SpriteHeight = 256 # You will need to set this to a higher amount such as 384 for some of the larger sprites, or else they'll be cropped off at the edges. 256 is more than enough for most of them.
+SpriteHeight = 256 # You will need to set this to a higher amount such as 384 for some of the larger sprites, or else they'll be cropped off at the edges (the script warns about it when that happens). 256 is more than enough for most of them, or see "TightBounds" below.
 TileBounds = False # Set this to True to use a transparent canvas for the extracted sprites instead of limiting them to their 256-colour palettes, exposing the tile edges in the process. Forced on when ANMFormat = 6 (Leapster sprites can have semi-transparency, and don't have "tiles" due to their variable width/height).
 RawPalette = True # Set this to True to read palette values as multiples of 8 (0, 8, 16, etc. with max of 248 for DS or 240 for Leapster). Set this to False to recalculate them to 255 maximum like most emulators would display.
+TightBounds = False # Set this to True to size each frame to fit its pieces exactly, instead of using the same "SpriteWidth" x "SpriteHeight" canvas for all of them (so large sprites never get cropped, and small ones don't waste space). A "frames.json" file gets saved alongside, listing where each frame's pivot point is.
+AtlasMode = False # Set this to True to pack every frame (trimmed down to just the sprite) into one or a few "atlas" sheets instead of saving each frame as its own PNG. An "atlas.json" file gets saved alongside, listing where each frame is on the sheets and where its pivot point is.
+AtlasSize = 2048 # Largest width and height for each atlas sheet, more sheets get made if the frames don't all fit. Ignored if AtlasMode = False.
+SkipDuplicates = False # Set this to True to only save the first copy of frames which come out exactly the same (pixel for pixel). The skipped ones get listed in a "duplicates.json" file, pointing at the frame they're a copy of. In atlas mode, they share the same spot on the sheet instead.
+SkipUnchanged = False # Set this to True to skip re-exporting the sprite set if neither its files nor the settings above have changed since last time. Each export saves a "manifest.json" file in the sprite set's folder, recording what it was made from.
+Instrument = False # Set this to True to time each stage of the export (header, palette, reading the pieces, decoding tiles, pasting them together and saving) and count the bytes read and seeks made, saved as a "timing.json" file in the sprite set's folder. With FrameWorkers above 1, the frames themselves only get timed as a whole.
+SaveWorkers = 2 # How many PNGs to compress at the same time, in the background while the next frames are being built. Set this to 0 to save each frame before moving on to the next one.
+CompressLevel = 6 # How hard to compress the PNGs, from 0 (fastest to save, largest files) to 9 (slowest to save, smallest files). The images themselves come out the same either way.
+OptimizePNG = False # Set this to True to squeeze the PNGs down as small as they'll go, which takes a while longer to save. Handy for a final export, not so much while trying out settings.
+FrameWorkers = 1 # How many frames to build at the same time, each in its own process. Set this to 0 to use one per CPU core, or leave it at 1 to build them one by one. Needs Python 3, and is mostly worth it for sprite sets with hundreds of frames.
 
 UseGBAROM = False # Change this to True to read from a GBA ROM instead of a .ANM file. Make sure both the "ROMName" and "SpriteStart" lines below are filled in correctly. For experts only -- you're better off using my QuickBMS scripts to unpack the ROM files instead.
 ROMName = "Shantae.gba" # Game Boy Advance ROM file needed to extract sprite data. Ignored when UseGBAROM is False (it uses the "SpriteName" above instead).
@@ -24,6 +38,7 @@ SpriteStart = 0x34E368 # Offset to the start of animation data in a GBA ROM, loc
 
 # Instructions on how to use this script:
 # 1. Install both Python (either 2 or 3, both work) and Pillow: https://github.com/python-pillow/Pillow
+# 1B. Keep the "WayForward_Common.py" file in the same folder as this script, it contains functions shared between all of the extraction scripts.
 # 2. If ripping from a GBA game, use QuickBMS (https://aluigi.altervista.org/quickbms.htm) and one of my "WayForwardGBA" scripts (https://github.com/RandomTBush/RTB-QuickBMS-Scripts/tree/master/Archive) to unpack the game you want to rip from. For DS or Didj games, you can use something like Tinke to unpack the former and 7-Zip for the latter.
 # 3. For a .ANM file, set the UseGBAROM option to False. Change the path for the "SpriteName" entry above to the name of the .ANM file you want to extract (if UseGBAROM = False, otherwise see the section below), and the "SceneName" to the scene / palette file you want to use for the exported sprites.
 # 4. Run the script (no additional command-line parameters needed). If everything's ret-2-go, then resulting sprites can be found in the subfolder named after the "SpriteName" above. Change the "PaletteNum" value or try another scene / palette file if the sprites have the wrong palette applied.
@@ -31,9 +46,10 @@ SpriteStart = 0x34E368 # Offset to the start of animation data in a GBA ROM, loc
 # ROM-file ripping (for experts):
 # 3B. Set the UseGBAROM option to True, change the name for the "ROMName" entry to match the GBA ROM you want to try extracting sprites from (eg. "Shantae.gba", it can either be a relative name or a full path).
 # 3C. Locate the assembly information for the respective sprite set in the GBA ROM, which has the visual appearance of random pixels scattered about and is always located above the sprite tiles (not below). At the very top of the "thinner" set and immediately following the tiles of the previous sprite set should be the offset you want to fill in for the "SpriteStart" value above.
+# 3D. Alternatively, run my "WayForward_ROM-Scan" script on the ROM first. It lists every offset that looks like the start of a file, best matches first, so you can copy one of the "SpriteStart" offsets marked ANM straight from there.
 
 # Troubleshooting:
-# If the sprites have the wrong palette, change the "PaletteNum" value and re-export, as stated above.
+# If the sprites have the wrong palette, change the "PaletteNum" value and re-export, as stated above. Or set "PaletteVariants" to list(range(16)) to export them with every palette at once, then pick whichever subfolder looks right.
 # If the script throws an error or doesn't export anything, check to make sure that you have the right "ANMFormat" and "SpriteName" values filled in. 
 # If extracting from a GBA ROM instead of a .ANM file, make sure that the "SpriteStart" offset ends in either 0, 4, 8 or C, double-check in a hex editor to make sure you're in the right spot if you need to. Sprite assembly data starts with something similar to "00 00 05 00" with only the third byte being non-zero, and 16 bytes ahead of that should be "00 00 00 00" for the most common .ANM formats. Shift it forward or backward by 4 at a time if you need to.
 
@@ -99,134 +115,82 @@ SpriteStart = 0x34E368 # Offset to the start of animation data in a GBA ROM, loc
 # --------------------------------------------------------------------------------
 # Everything below this line should be left alone.
 
-if PaletteNum < 0 or PaletteNum > 15:
-    print("Invalid 'PaletteNum' value. Make sure it's set to a number within the 0-15 range.")
-    exit()
-
-if UseGBAROM == False:
-    SpriteStart = 0x0 # Zeroing out the offset, as .ANM/.AN4/.AN8 files have it at the beginning.
-    if not os.path.exists(SpriteName + ".anm"):
-        if not os.path.exists(SpriteName + ".an4"):
-            if not os.path.exists(SpriteName + ".an8"):
-                print("Can't find '" + SpriteName + ".anm', '" + SpriteName + ".an4' or '" + SpriteName + ".an8'. Check to make sure you filled in the 'SpriteName' entry correctly.")
-                os.system('pause')
-                exit()
-            else:
-                anmfile = open(SpriteName + ".an8", "rb") # Opens a .AN8 file, uses the name listed in "SpriteName" above.
-        else:
-            anmfile = open(SpriteName + ".an4", "rb") # Opens a .AN4 file, uses the name listed in "SpriteName" above.
+def LoadSpritePalette(anmfile, SpriteStart, ANMFormat, UseGBAROM, SceneName, RawPalette, Inputs):
+    # Reads the palette the sprites get drawn with: the Didj's own palette block, the scene / palette file named by "SceneName", or grayscale if there isn't one.
+    if UseGBAROM == False and ANMFormat == 5:
+        # LeapFrog Didj has a 0x200 palette block at the beginning of its .ANM files, which is considered part of the file for its offset calculations.
+        print("Didj format tileset, using internal palette.")
+        anmfile.seek(0, 0) # Start reading the .ANM file.
+        return ReadPalette(anmfile, RawPalette) # Converted through a lookup table, built once for the "RawPalette" setting.
     else:
-        anmfile = open(SpriteName + ".anm", "rb") # Opens a .ANM file, uses the name listed in "SpriteName" above.
-else:
-    if not os.path.exists(ROMName):
-        print("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
-        os.system('pause')
-        exit()
+        anmfile.seek(SpriteStart, 0) # Start reading the .ANM / ROM file.
+        if os.path.exists(SceneName + ".pal") or os.path.exists(SceneName + ".scn"):
+            if os.path.exists(SceneName + ".pal"):
+                scnfile = open(SceneName + ".pal", "rb") # Opens a .PAL file to extract palette information from.
+                scnfile.seek(0, 0) # Sprite palettes are in the latter half of the SCN file.
+                AddInput(Inputs, SceneName + ".pal")
+            elif os.path.exists(SceneName + ".scn"):
+                scnfile = open(SceneName + ".scn", "rb") # Opens a .SCN file to extract palette information from.
+                AddInput(Inputs, SceneName + ".scn")
+                scnfile.seek(0x200, 0) # Sprite palettes are in the latter half of the SCN file.
+            return ReadPalette(scnfile, RawPalette) # Converted through a lookup table, built once for the "RawPalette" setting.
+        else:
+            if SceneName == "":
+                print("Defaulting to grayscale palette.")
+            else:
+                print("Couldn't find '" + SceneName + ".scn' or '" + SceneName + ".pal', defaulting to grayscale instead.")
+            return GrayscalePalette() # Forcing a grayscale palette.
+
+def ReadSpriteHeader(anmfile, SpriteStart, ANMFormat, UseGBAROM):
+    # Reads the sprite set's header, leaving the file at the start of the frame table.
+    if UseGBAROM == False and ANMFormat == 5:
+        anmfile.seek(512, 0) # LeapFrog Didj has a 0x200 palette block at the beginning of its .ANM files, which is considered part of the file for its offset calculations.
     else:
-        anmfile = open(ROMName, "rb") # Opens a ROM file needed to extract assembly data, see the above note for the "SpriteStart" offset.
-
-if UseGBAROM == False and ANMFormat == 5:
-    # LeapFrog Didj has a 0x200 palette block at the beginning of its .ANM files, which is considered part of the file for its offset calculations.
-    print("Didj format tileset, using internal palette.")
-    anmfile.seek(0, 0) # Start reading the .ANM file.
-    ANMPalette = bytearray()
-    # I am doing it this way for the sake of "raw" palettes, and so that the method is compatible with both Python 2 and 3.
-    for x in range(256):
-        PaletteBytes = struct.unpack('<H', anmfile.read(2))[0]
-        PaletteByteA = ((PaletteBytes & 0x001F)) * 8
-        PaletteByteB = ((PaletteBytes & 0x03E0) >> 5) * 8
-        PaletteByteC = ((PaletteBytes & 0x7C00) >> 10) * 8
-        if RawPalette == False:
-            PaletteByteA = PaletteByteA + ((PaletteByteA + 1) // 32)
-            PaletteByteB = PaletteByteB + ((PaletteByteB + 1) // 32)
-            PaletteByteC = PaletteByteC + ((PaletteByteC + 1) // 32)
-        ANMPalette.append(PaletteByteA)
-        ANMPalette.append(PaletteByteB)
-        ANMPalette.append(PaletteByteC)
-else:
-    anmfile.seek(SpriteStart, 0) # Start reading the .ANM / ROM file.
-    if os.path.exists(SceneName + ".pal") or os.path.exists(SceneName + ".scn"):
-        if os.path.exists(SceneName + ".pal"):
-            scnfile = open(SceneName + ".pal", "rb") # Opens a .PAL file to extract palette information from.
-            scnfile.seek(0, 0) # Sprite palettes are in the latter half of the SCN file.
-        elif os.path.exists(SceneName + ".scn"):
-            scnfile = open(SceneName + ".scn", "rb") # Opens a .SCN file to extract palette information from.
-            scnfile.seek(0x200, 0) # Sprite palettes are in the latter half of the SCN file.
-        ANMPalette = bytearray()
-        # I am doing it this way for the sake of "raw" palettes, and so that the method is compatible with both Python 2 and 3.
-        for x in range(256):
-            PaletteBytes = struct.unpack('<H', scnfile.read(2))[0]
-            PaletteByteA = ((PaletteBytes & 0x001F)) * 8
-            PaletteByteB = ((PaletteBytes & 0x03E0) >> 5) * 8
-            PaletteByteC = ((PaletteBytes & 0x7C00) >> 10) * 8
-            if RawPalette == False:
-                PaletteByteA = PaletteByteA + ((PaletteByteA + 1) // 32)
-                PaletteByteB = PaletteByteB + ((PaletteByteB + 1) // 32)
-                PaletteByteC = PaletteByteC + ((PaletteByteC + 1) // 32)
-            ANMPalette.append(PaletteByteA)
-            ANMPalette.append(PaletteByteB)
-            ANMPalette.append(PaletteByteC)
+        anmfile.seek(SpriteStart, 0) # And now we start reading the .ANM / ROM file.
+    FrameFlags = struct.unpack('<H', anmfile.read(2))[0] # 0x0000 (16-colour) and 0x8000 (256-colour), or 0x0F00 (16-colour) and 0xFF00 (256-colour).
+    FrameMaxPieces = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wObjMax". Most amount of pieces used for a single frame.
+    FrameMaxBytes = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wSizeMax". Most amount of bytes used for a single frame's tiles.
+    FrameTotal = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wFrameCount". How many frames for the respective sprite set.
+    if ANMFormat == 1:
+        anmfile.seek(8, 1) # The Scorpion King has two extra sets of bytes in its header.
+    SpriteTileStart = (struct.unpack('<L', anmfile.read(4))[0] + SpriteStart) # Relative position from the "SpriteStart" value above (or 0 for a .ANM file) where the tile graphics start.
+    SpriteTileSize = struct.unpack('<L', anmfile.read(4))[0] # Total amount of bytes taken up by the tile graphics.
+    return FrameFlags, FrameTotal, SpriteTileStart, SpriteTileSize
+
+def ReadFrameTable(anmfile, FrameTotal, SpriteStart, SpriteTileStart, ANMFormat):
+    # Reads where each frame's pieces and tiles are, straight after the header.
+    FrameOffset = {}; FrameStart = {}; FrameLength = {} # Initializing the arrays...
+    if ANMFormat != 1:
+        FrameTable = struct.unpack('<' + str(FrameTotal * 3) + 'L', anmfile.read(FrameTotal * 12)) # Reading the whole frame table in one go, three values per frame.
+        for x in range(FrameTotal):
+            FrameOffset[x] = FrameTable[x * 3] + SpriteStart # Relative position from the "SpriteStart" value above (or 0 for a .ANM file) for the sprite's tile assembly information.
+            FrameStart[x] = FrameTable[(x * 3) + 1] + SpriteTileStart # Add to the "SpriteTileStart" value above for the start of the sprite's tiles.
+            FrameLength[x] = FrameTable[(x * 3) + 2] # How many bytes used for the entire sprite's tiles. Not used by the script, but tracked anyway.
     else:
-        if SceneName == "":
-            print("Defaulting to grayscale palette.")
-        else:
-            print("Couldn't find '" + SceneName + ".scn' or '" + SceneName + ".pal', defaulting to grayscale instead.")
-        ANMPalette = bytearray() # Forcing a grayscale palette for Python 3 compatibility.
-        for x in range(256):
-            ANMPalette.append(x) 
-            ANMPalette.append(x)
-            ANMPalette.append(x)
-
-FrameOffset = {}; FrameStart = {}; FrameLength = {} # Initializing the arrays...
-if UseGBAROM == False and ANMFormat == 5:
-    anmfile.seek(512, 0) # LeapFrog Didj has a 0x200 palette block at the beginning of its .ANM files, which is considered part of the file for its offset calculations.
-else:
-    anmfile.seek(SpriteStart, 0) # And now we start reading the .ANM / ROM file.
-FrameFlags = struct.unpack('<H', anmfile.read(2))[0] # 0x0000 (16-colour) and 0x8000 (256-colour), or 0x0F00 (16-colour) and 0xFF00 (256-colour).
-FrameMaxPieces = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wObjMax". Most amount of pieces used for a single frame.
-FrameMaxBytes = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wSizeMax". Most amount of bytes used for a single frame's tiles.
-FrameTotal = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "wFrameCount". How many frames for the respective sprite set.
-if ANMFormat == 1:
-    anmfile.seek(8, 1) # The Scorpion King has two extra sets of bytes in its header.
-SpriteTileStart = (struct.unpack('<L', anmfile.read(4))[0] + SpriteStart) # Relative position from the "SpriteStart" value above (or 0 for a .ANM file) where the tile graphics start.
-SpriteTileSize = struct.unpack('<L', anmfile.read(4))[0] # Total amount of bytes taken up by the tile graphics.
-
-if UseGBAROM == True:
-    if not os.path.exists(str(SpriteStart)):
-        os.makedirs(str(SpriteStart)) # If the folder doesn't exist, then make it.
-else:
-    if not os.path.exists(SpriteName):
-        os.makedirs(SpriteName) # If the folder doesn't exist, then make it.
-
-if ANMFormat != 1:
-    for x in range(FrameTotal):
-        FrameOffset[x] = (struct.unpack('<L', anmfile.read(4))[0] + SpriteStart) # Relative position from the "SpriteStart" value above (or 0 for a .ANM file) for the sprite's tile assembly information.
-        FrameStart[x] = struct.unpack('<L', anmfile.read(4))[0] + SpriteTileStart # Add to the "SpriteTileStart" value above for the start of the sprite's tiles.
-        FrameLength[x] = struct.unpack('<L', anmfile.read(4))[0] # How many bytes used for the entire sprite's tiles. Not used by the script, but tracked anyway.
-else:
-    for x in range(FrameTotal):
-        FrameOffset[x] = (struct.unpack('<L', anmfile.read(4))[0] + SpriteStart) # The Scorpion King stores these in three separate buffers.
-    for x in range(FrameTotal):
-        FrameStart[x] = struct.unpack('<L', anmfile.read(4))[0] + SpriteTileStart # Add to the "SpriteTileStart" value above for the start of the sprite's tiles.
-    for x in range(FrameTotal):
-        FrameLength[x] = struct.unpack('<H', anmfile.read(2))[0] # How many bytes used for the entire sprite's tiles. Not used by the script, but tracked anyway.
+        FrameTable = struct.unpack('<' + str(FrameTotal * 2) + 'L' + str(FrameTotal) + 'H', anmfile.read(FrameTotal * 10)) # The Scorpion King stores these in three separate buffers.
+        for x in range(FrameTotal):
+            FrameOffset[x] = FrameTable[x] + SpriteStart
+            FrameStart[x] = FrameTable[FrameTotal + x] + SpriteTileStart # Add to the "SpriteTileStart" value above for the start of the sprite's tiles.
+            FrameLength[x] = FrameTable[(FrameTotal * 2) + x] # How many bytes used for the entire sprite's tiles. Not used by the script, but tracked anyway.
+    return FrameOffset, FrameStart, FrameLength
 
-for x in range(FrameTotal):
-    PivotX = {}; PivotY = {}; TileStart = {}; PieceSize = {}; TileWidth = {}; TileHeight = {} # More array initialization.
-    anmfile.seek(FrameOffset[x], 0) # Jump to the next frame for assembly.
+def RenderFrame(anmfile, FrameOffset, FrameStart, SpriteTileStart, FrameFlags, ANMPalette, ANMFormat, PaletteNum, SpriteWidth, SpriteHeight, TileBounds, RawPalette, TightBounds=False, Timer=StageTimer()):
+    # Assembles a single frame. Hands back the finished image, where the next Leapster sprite starts (ANMFormat = 6 only, otherwise it's passed through as-is), and the frame's pivot point and bounds.
+    TileStart = {}; PieceSize = {}; TileWidth = {}; TileHeight = {} # More array initialization.
+    Timer.Start('Pieces')
+    anmfile.seek(FrameOffset, 0) # Jump to the next frame for assembly.
     if ANMFormat == 1:
-        anmfile.seek(16, 1) # The Scorpion King has tiny buffers.
+        BoundsSize = 16 # The Scorpion King has tiny buffers.
     elif ANMFormat == 3 or ANMFormat == 5:
-        anmfile.seek(32, 1) # Certain DS games and Didj games have an extra 8 bytes.
+        BoundsSize = 32 # Certain DS games and Didj games have an extra 8 bytes.
     elif ANMFormat == 4:
-        anmfile.seek(56, 1) # ...while other DS games have an extra 32 bytes instead.
+        BoundsSize = 56 # ...while other DS games have an extra 32 bytes instead.
     else:
-        anmfile.seek(24, 1) # Bounding boxes. In order: X1 (X min), X2 (X max), Y1 (Y min), Y2 (Y max). Three short values for each (so X1 0, X1 1, X1 2, and so on).
+        BoundsSize = 24 # Bounding boxes. In order: X1 (X min), X2 (X max), Y1 (Y min), Y2 (Y max). Three short values for each (so X1 0, X1 1, X1 2, and so on).
+    HeaderBounds = struct.unpack('<' + str(BoundsSize // 2) + 'h', anmfile.read(BoundsSize)) # Not used for building the frame (the layout differs between formats), but kept in the frame info.
     PieceCount = struct.unpack('<H', anmfile.read(2))[0] # a.k.a "Cuts". How many pieces the sprites are made up of.
-    for s in range(PieceCount):
-        PivotX[s] = struct.unpack('<h', anmfile.read(2))[0] # Signed value for the X position offsets of each piece are stored all in a row...
-    for s in range(PieceCount):
-        PivotY[s] = struct.unpack('<h', anmfile.read(2))[0] # ...and *then* all of the Y position offsets in a row. So "XXXXYYYY", not "XYXYXYXY" in other words.
+    PivotX = struct.unpack('<' + str(PieceCount) + 'h', anmfile.read(PieceCount * 2)) # Signed value for the X position offsets of each piece are stored all in a row...
+    PivotY = struct.unpack('<' + str(PieceCount) + 'h', anmfile.read(PieceCount * 2)) # ...and *then* all of the Y position offsets in a row. So "XXXXYYYY", not "XYXYXYXY" in other words.
     for s in range(PieceCount):
         if ANMFormat != 6:
             PieceFlags = struct.unpack('<H', anmfile.read(2))[0] # Two bytes shared between two different information sets below.
@@ -269,40 +233,50 @@ for x in range(FrameTotal):
             TileWidth[s] = struct.unpack('<B', anmfile.read(1))[0] # Leapster sprites only consist of one piece, and have one byte apiece for width and height respectively.
             TileHeight[s] = struct.unpack('<B', anmfile.read(1))[0]
 
+    if ANMFormat == 6:
+        PieceWidths = [TileWidth.get(s, 0) for s in range(PieceCount)]; PieceHeights = [TileHeight.get(s, 0) for s in range(PieceCount)] # Leapster sizes are in pixels...
+    else:
+        PieceWidths = [TileWidth.get(s, 0) * 8 for s in range(PieceCount)]; PieceHeights = [TileHeight.get(s, 0) * 8 for s in range(PieceCount)] # ...everything else is in tiles.
+    if PieceCount > 0:
+        FrameBounds = (min(PivotX), min(PivotY), max([PivotX[s] + PieceWidths[s] for s in range(PieceCount)]), max([PivotY[s] + PieceHeights[s] for s in range(PieceCount)])) # Every piece put together, relative to the pivot.
+    else:
+        FrameBounds = (0, 0, 0, 0)
+    Timer.Stop('Pieces')
+    if TightBounds == True:
+        CanvasWidth = max(FrameBounds[2] - FrameBounds[0], 1); CanvasHeight = max(FrameBounds[3] - FrameBounds[1], 1)
+        OriginX = -FrameBounds[0]; OriginY = -FrameBounds[1] # Where the pivot lands on the frame.
+    else:
+        CanvasWidth = SpriteWidth; CanvasHeight = SpriteHeight
+        OriginX = SpriteWidth // 2; OriginY = SpriteHeight // 2 # Pivot's always in the middle of the canvas.
+    FrameInfo = {'PivotX': OriginX, 'PivotY': OriginY, 'Width': CanvasWidth, 'Height': CanvasHeight, 'HeaderBounds': list(HeaderBounds),
+        'Cropped': FrameBounds[0] + OriginX < 0 or FrameBounds[1] + OriginY < 0 or FrameBounds[2] + OriginX > CanvasWidth or FrameBounds[3] + OriginY > CanvasHeight}
     if TileBounds == True or ANMFormat == 6:
-        result_image = Image.new('RGBA', (SpriteWidth, SpriteHeight), (0, 0, 0, 0)) # Initializing the assembled (transparent) sprite PNG in memory.
+        result_image = Image.new('RGBA', (CanvasWidth, CanvasHeight), (0, 0, 0, 0)) # Initializing the assembled (transparent) sprite PNG in memory.
     else:
-        result_image = Image.new('P', (SpriteWidth, SpriteHeight), (0, 0, 0, 255)) # Initializing the assembled (palettized) sprite PNG in memory.
+        result_image = Image.new('P', (CanvasWidth, CanvasHeight), (0, 0, 0, 255)) # Initializing the assembled (palettized) sprite PNG in memory.
+    FrameInfo['RowShiftable'] = TileBounds == False and ANMFormat != 6 # Whether the frame can be moved onto another palette without building it again (see SavePaletteVariants).
     for s in range(PieceCount):
         if ANMFormat != 6:
-            anmfile.seek(FrameStart[x] + (TileStart[s] * 32), 0) # Jump to the beginning of the piece's tiles.
+            anmfile.seek(FrameStart + (TileStart[s] * 32), 0) # Jump to the beginning of the piece's tiles.
             # print(str(PivotX[s]) + "," + str(PivotY[s]) + " | " + str(hex(PieceSize[s])) + " | " + str(TileStart[s])) # Uncomment to watch the script print piece information as it builds the sprites.
             TilePasteX = 0; TilePasteY = 0 # Initializing values for chunk assembly.
             TileImage = Image.new('P', (TileWidth[s] * 8, TileHeight[s] * 8), (0, 0, 0, 255)) # Initializing the assembled tile chunk in memory.
+            if PieceSize[s] & 0x8000 != 0x8000 and FrameFlags != 0x8000:
+                if PieceSize[s] & 0x4000 == 0x4000:
+                    TilePalette = (PaletteNum + 1) * 16 # Bit 15 means the piece uses the palette after the chosen one.
+                else:
+                    TilePalette = PaletteNum * 16
+                Timer.Start('Decode')
+                TileIndices = DecodeTiles4BPP(anmfile.read(TileWidth[s] * TileHeight[s] * 0x20), TilePalette) # Decode the whole chunk's tiles in one go.
+                Timer.Stop('Decode')
+            else:
+                FrameInfo['RowShiftable'] = False # 256-colour pieces don't use the palette rows.
+            Timer.Start('Paste')
             for t in range(TileWidth[s] * TileHeight[s]):
                 if PieceSize[s] & 0x8000 == 0x8000 or FrameFlags == 0x8000:
                     CropImage = Image.frombuffer('L', (8,8), anmfile.read(0x40), 'raw', 'L', 0, 1)
                 else:
-                    TempTile = bytearray()
-                    for y in range(32):
-                        TileByte = struct.unpack('<B', anmfile.read(1))[0]
-                        if PieceSize[s] & 0x4000 == 0x4000:
-                            TileByteA = (TileByte & 0x0F) + ((PaletteNum + 1)* 16)
-                            if TileByteA & 0x0F == 0:
-                                TileByteA = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                            TileByteB = ((TileByte & 0xF0) >> 4) + ((PaletteNum + 1) * 16)
-                            if TileByteB & 0x0F == 0:
-                                TileByteB = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                        else:
-                            TileByteA = (TileByte & 0x0F) + (PaletteNum * 16)
-                            if TileByteA & 0x0F == 0:
-                                TileByteA = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                            TileByteB = ((TileByte & 0xF0) >> 4) + (PaletteNum * 16)
-                            if TileByteB & 0x0F == 0:
-                                TileByteB = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                        TempTile.append(TileByteA)
-                        TempTile.append(TileByteB)
-                    CropImage = Image.frombuffer('L', (8,8), TempTile, 'raw', 'L', 0, 1)
+                    CropImage = Image.frombuffer('L', (8,8), TileIndices[(t * 0x40):(t * 0x40) + 0x40], 'raw', 'L', 0, 1) # Index 0 is already a global transparency instead of that line's specific transparency value.
                 if TileBounds == True:
                     TileImage.putpalette(ANMPalette) # If using the "TileBounds" option, apply the palette before pasting it instead of after.
                 TileImage.paste(CropImage, (TilePasteX * 8, TilePasteY * 8), mask=0) # Pasting the tile in the right spot.
@@ -310,51 +284,306 @@ for x in range(FrameTotal):
                 if TilePasteX == TileWidth[s]:
                     TilePasteX = 0 # We've reached the edge, so we reset and...
                     TilePasteY = TilePasteY + 1 # ...move onto the next line.
+            Timer.Stop('Paste')
         else:
             anmfile.seek(SpriteTileStart, 0) # Jump to the beginning of the sprite.
             # print(str(PivotX[s]) + "," + str(PivotY[s]) + " | " + str(TileWidth[s]) + "x" + str(TileHeight[s])) # Uncomment to watch the script print piece information as it builds the sprites.
+            Timer.Start('Decode')
             TempTile = bytearray() # Set up a buffer for the decompressed sprite data.
             for y in range(TileHeight[s]):
-                PadBytes = struct.unpack('<B', anmfile.read(1))[0] # How many pixels are blank (from left side). Right side is calculated via remaining pixels.
-                SpriteBytes = struct.unpack('<B', anmfile.read(1))[0] # How many pixels to copy over after padding.
-                for z in range(PadBytes):
-                     TempTile.append(0) # Need to do this four times, one for each R/G/B/A value.
-                     TempTile.append(0)
-                     TempTile.append(0)
-                     TempTile.append(0)
-                for z in range(SpriteBytes):
-                    TileBytes = struct.unpack('<H', anmfile.read(2))[0] # Leapster uses ARGB4444, two bytes per pixel.
-                    if RawPalette == True:
-                        TileByteA = ((TileBytes & 0x0F00) >> 8) * 16 # Second "nibble" is the red value.
-                        TileByteB = ((TileBytes & 0x00F0) >> 4) * 16 # Third "nibble" is the green value.
-                        TileByteC = (TileBytes & 0x000F) * 16 # Fourth "nibble" is the blue value.
-                    else:
-                        TileByteA = ((TileBytes & 0x0F00) >> 8) + (((TileBytes & 0x0F00) >> 8) * 16) # Second "nibble" is the red value.
-                        TileByteB = ((TileBytes & 0x00F0) >> 4) + (((TileBytes & 0x00F0) >> 4) * 16) # Third "nibble" is the green value.
-                        TileByteC = (TileBytes & 0x000F) + ((TileBytes & 0x000F) * 16) # Fourth "nibble" is the blue value.
-                    TileByteD = ((((TileBytes & 0xF000) >> 12) + (((TileBytes & 0xF000) >> 12) * 16)) * -1) + 255 # First "nibble" is the alpha value. The alpha value is inverted, so we need to fix that.
-                    TempTile.append(TileByteA)
-                    TempTile.append(TileByteB)
-                    TempTile.append(TileByteC)
-                    TempTile.append(TileByteD)
-                for z in range(TileWidth[s] - PadBytes - SpriteBytes):
-                     TempTile.append(0) # Need to do this four times, one for each R/G/B/A value.
-                     TempTile.append(0)
-                     TempTile.append(0)
-                     TempTile.append(0)
+                PadBytes, SpriteBytes = struct.unpack('<BB', anmfile.read(2)) # How many pixels are blank (from left side), then how many pixels to copy over after padding. Right side is calculated via remaining pixels.
+                TempTile += bytearray(PadBytes * 4) # Four bytes per blank pixel, one for each R/G/B/A value.
+                TempTile += ConvertARGB4444(anmfile.read(SpriteBytes * 2), RawPalette) # Leapster uses ARGB4444, two bytes per pixel. The whole row gets converted in one go.
+                TempTile += bytearray(max(TileWidth[s] - PadBytes - SpriteBytes, 0) * 4)
             SpriteTileStart = anmfile.tell() # Updating the offset for the next sprite in line.
             TileImage = Image.frombuffer('RGBA', (TileWidth[s],TileHeight[s]), TempTile, 'raw', 'RGBA', 0, 1)
-        result_image.paste(TileImage, (PivotX[s] + (SpriteWidth // 2), PivotY[s] + (SpriteHeight // 2)), mask=0) # Paste the assembled tile into the sprite PNG.
+            Timer.Stop('Decode')
+        Timer.Start('Paste')
+        result_image.paste(TileImage, (PivotX[s] + OriginX, PivotY[s] + OriginY), mask=0) # Paste the assembled tile into the sprite PNG.
+        Timer.Stop('Paste')
 
-    if UseGBAROM == True:
-        outfile = (str(SpriteStart) + '/' + str(x) + '.png') # Setting up the file path.
-    else:
-        outfile = (SpriteName + '/' + str(x) + '.png') # Setting up the file path.
     if TileBounds == False and ANMFormat != 6:
         result_image.putpalette(ANMPalette) # Applying the palette to the resulting image.
-    result_image.save(outfile) # Saving the file.
-    print("Saved to " + outfile) # We did the thing.
+    return result_image, SpriteTileStart, FrameInfo
+
+def ScanLeapsterFrames(anmfile, FrameOffset, FrameTotal, SpriteTileStart):
+    # Leapster sprites are stored one after another, and the frame table doesn't say where each one starts. Walking through the row headers (without converting any pixels) finds them all up front.
+    SpriteStarts = {}
+    for x in range(FrameTotal):
+        SpriteStarts[x] = SpriteTileStart
+        anmfile.seek(FrameOffset[x] + 24, 0) # Skipping the bounding boxes, same as in RenderFrame.
+        PieceCount = struct.unpack('<H', anmfile.read(2))[0]
+        anmfile.seek(PieceCount * 4, 1) # Skipping the pivots.
+        PieceSizes = struct.unpack('<' + str(PieceCount * 2) + 'B', anmfile.read(PieceCount * 2)) # Width and height for each piece, only the height matters here.
+        for s in range(PieceCount):
+            anmfile.seek(SpriteTileStart, 0)
+            for y in range(PieceSizes[(s * 2) + 1]):
+                PadBytes, SpriteBytes = struct.unpack('<BB', anmfile.read(2))
+                anmfile.seek(SpriteBytes * 2, 1) # Two bytes per pixel.
+            SpriteTileStart = anmfile.tell()
+    return SpriteStarts, SpriteTileStart
+
+def TrimFrame(result_image):
+    # Crops a frame down to just the sprite (index 0 or zero alpha counts as empty), along with where the crop starts on the full canvas.
+    FrameBox = result_image.getbbox()
+    if FrameBox == None:
+        return 0, 0, None # Nothing in this frame at all.
+    return FrameBox[0], FrameBox[1], result_image.crop(FrameBox)
+
+def FinishFrame(result_image, outfile, Saver, Timer=StageTimer()):
+    if outfile == None:
+        return result_image # Atlas mode or duplicate checking, the frame gets looked at before anything's saved.
+    Timer.Start('Save')
+    Saver.Save(result_image, outfile) # Saving the file (or handing it off to be saved).
+    Timer.Stop('Save')
+    return outfile
+
+def RenderFrames(anmfile, FrameFiles, FrameOffset, FrameStart, SpriteTileStart, Saver, Timer, *FrameArgs):
+    # Builds the frames one by one in this process instead, carrying the Leapster sprite position over from each frame to the next.
+    for x in range(len(FrameFiles)):
+        result_image, SpriteTileStart, FrameInfo = RenderFrame(anmfile, FrameOffset[x], FrameStart[x], SpriteTileStart, *FrameArgs, Timer=Timer)
+        yield FinishFrame(result_image, FrameFiles[x], Saver, Timer), FrameInfo, SpriteTileStart
+
+def SavePaletteVariants(anmfile, FolderName, x, result_image, FrameInfo, FrameArgs, PaletteVariants, Saver):
+    # Saves a frame again for each of the "PaletteVariants" numbers. 16-colour frames get their pixels moved over to the other palette rows through a lookup table, without decoding anything again.
+    # Frames with 256-colour pieces (or TileBounds on) can't be moved like that, so those get built again with the other palette number instead. FrameArgs are the same values RenderFrame was given, "PaletteNum" included.
+    VariantFiles = []
+    for VariantNum in PaletteVariants:
+        if FrameInfo['RowShiftable'] == True:
+            VariantImage = Image.frombytes('P', result_image.size, bytes(ShiftPaletteRows(result_image.tobytes(), (VariantNum - FrameArgs[6]) * 16)))
+            VariantImage.putpalette(FrameArgs[4]) # Same palette, the pixels just point further along it.
+        else:
+            VariantImage = RenderFrame(anmfile, *(FrameArgs[0:6] + (VariantNum,) + FrameArgs[7:]))[0]
+        outfile = FolderName + '/palette' + str(VariantNum) + '/' + str(x) + '.png'
+        Saver.Save(VariantImage, outfile)
+        VariantFiles.append(outfile)
+    return VariantFiles
+
+def SaveAtlas(FolderName, TrimmedFrames, FrameInfos, ANMPalette, AtlasSize, Saver, SkipDuplicates=False):
+    # Packs the trimmed frames onto as few sheets as possible, and saves those along with a JSON file describing where everything went.
+    FirstCopies = {}; DuplicateOf = {}
+    if SkipDuplicates == True:
+        for x in range(len(TrimmedFrames)):
+            if TrimmedFrames[x][2] != None:
+                FrameHash = HashImage(TrimmedFrames[x][2])
+                if FrameHash in FirstCopies:
+                    DuplicateOf[x] = FirstCopies[FrameHash] # Packed as an empty frame, then pointed at the first copy's spot.
+                else:
+                    FirstCopies[FrameHash] = x
+    RectSpots, SheetSizes = PackRects([(TrimmedFrames[x][2].size if TrimmedFrames[x][2] != None and x not in DuplicateOf else (0, 0)) for x in range(len(TrimmedFrames))], AtlasSize)
+    for x in DuplicateOf:
+        RectSpots[x] = RectSpots[DuplicateOf[x]]
+    SheetMode = 'P'
+    for TrimmedFrame in TrimmedFrames:
+        if TrimmedFrame[2] != None:
+            SheetMode = TrimmedFrame[2].mode # Every frame in a set has the same mode.
+            break
+    SheetImages = []
+    for SheetSize in SheetSizes:
+        if SheetMode == 'P':
+            SheetImage = Image.new('P', SheetSize, 0) # Index 0 is transparent, same as the frame canvas.
+            SheetImage.putpalette(ANMPalette)
+        else:
+            SheetImage = Image.new('RGBA', SheetSize, (0, 0, 0, 0))
+        SheetImages.append(SheetImage)
+    AtlasInfo = {'Sheets': [], 'Frames': []}
+    for x in range(len(TrimmedFrames)):
+        CropX, CropY, CropImage = TrimmedFrames[x]
+        FrameInfo = {'Frame': x, 'Sheet': None, 'X': 0, 'Y': 0, 'Width': 0, 'Height': 0, 'OffsetX': CropX, 'OffsetY': CropY, 'CanvasWidth': FrameInfos[x]['Width'], 'CanvasHeight': FrameInfos[x]['Height'],
+            'PivotX': FrameInfos[x]['PivotX'] - CropX, 'PivotY': FrameInfos[x]['PivotY'] - CropY, 'HeaderBounds': FrameInfos[x]['HeaderBounds']} # The pivot is where the piece offsets (PivotX/PivotY) are measured from, relative to the trimmed frame's corner.
+        if RectSpots[x] != None:
+            FrameInfo['Sheet'], FrameInfo['X'], FrameInfo['Y'] = RectSpots[x]
+            FrameInfo['Width'], FrameInfo['Height'] = CropImage.size
+            if x in DuplicateOf:
+                FrameInfo['DuplicateOf'] = DuplicateOf[x]
+            else:
+                SheetImages[RectSpots[x][0]].paste(CropImage, (RectSpots[x][1], RectSpots[x][2]))
+        AtlasInfo['Frames'].append(FrameInfo)
+    OutputFiles = []
+    for x in range(len(SheetImages)):
+        outfile = FolderName + '/atlas' + str(x) + '.png'
+        Saver.Save(SheetImages[x], outfile)
+        AtlasInfo['Sheets'].append('atlas' + str(x) + '.png')
+        OutputFiles.append(outfile)
+        print("Saved to " + outfile)
+    outfile = FolderName + '/atlas.json'
+    with open(outfile, "w") as atlasfile:
+        json.dump(AtlasInfo, atlasfile, indent=1, sort_keys=True)
+    OutputFiles.append(outfile)
+    print("Saved to " + outfile)
+    return OutputFiles
 
-if UseGBAROM == True:
-    print("The next file should (theoretically) start at around " + str(hex(SpriteTileStart + SpriteTileSize)) + " in " + ROMName + ".")
-    os.system('pause')
\ No newline at end of file
+def SaveFrameInfo(FolderName, FrameInfos, FrameFiles):
+    # Lists each frame's size and pivot point, needed to line up frames which all have different sizes.
+    FrameList = []
+    for x in range(len(FrameInfos)):
+        FrameList.append({'Frame': x, 'File': FrameFiles[x], 'Width': FrameInfos[x]['Width'], 'Height': FrameInfos[x]['Height'], 'PivotX': FrameInfos[x]['PivotX'], 'PivotY': FrameInfos[x]['PivotY'], 'HeaderBounds': FrameInfos[x]['HeaderBounds']})
+    outfile = FolderName + '/frames.json'
+    with open(outfile, "w") as infofile:
+        json.dump({'Frames': FrameList}, infofile, indent=1, sort_keys=True)
+    print("Saved to " + outfile)
+    return outfile
+
+def ExtractSprites(SpriteName=SpriteName, SceneName=SceneName, ANMFormat=ANMFormat, PaletteNum=PaletteNum, PaletteVariants=PaletteVariants, SpriteWidth=SpriteWidth, SpriteHeight=SpriteHeight, TileBounds=TileBounds, RawPalette=RawPalette, UseGBAROM=UseGBAROM, ROMName=ROMName, SpriteStart=SpriteStart, FrameWorkers=FrameWorkers, AtlasMode=AtlasMode, AtlasSize=AtlasSize, TightBounds=TightBounds, SkipDuplicates=SkipDuplicates, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, SaveWorkers=SaveWorkers, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG):
+    OutputFiles = [] # Every file saved, handed back to whoever called this.
+    Timer = StageTimer(Instrument) # Does nothing unless "Instrument" is on.
+    Inputs = {} # Every file read (and its hash), for the manifest.
+
+    if PaletteNum < 0 or PaletteNum > 15:
+        raise ExtractError("Invalid 'PaletteNum' value. Make sure it's set to a number within the 0-15 range.")
+    for VariantNum in PaletteVariants:
+        if VariantNum < 0 or VariantNum > 15:
+            raise ExtractError("Invalid 'PaletteVariants' value (" + str(VariantNum) + "). Make sure every number in the list is within the 0-15 range.")
+
+    if UseGBAROM == False:
+        SpriteStart = 0x0 # Zeroing out the offset, as .ANM/.AN4/.AN8 files have it at the beginning.
+        if not os.path.exists(SpriteName + ".anm"):
+            if not os.path.exists(SpriteName + ".an4"):
+                if not os.path.exists(SpriteName + ".an8"):
+                    raise ExtractError("Can't find '" + SpriteName + ".anm', '" + SpriteName + ".an4' or '" + SpriteName + ".an8'. Check to make sure you filled in the 'SpriteName' entry correctly.")
+                else:
+                    SourceName = SpriteName + ".an8"
+                    anmfile = open(SourceName, "rb") # Opens a .AN8 file, uses the name listed in "SpriteName" above.
+            else:
+                SourceName = SpriteName + ".an4"
+                anmfile = open(SourceName, "rb") # Opens a .AN4 file, uses the name listed in "SpriteName" above.
+        else:
+            SourceName = SpriteName + ".anm"
+            anmfile = open(SourceName, "rb") # Opens a .ANM file, uses the name listed in "SpriteName" above.
+    else:
+        if not os.path.exists(ROMName):
+            raise ExtractError("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
+        else:
+            SourceName = ROMName
+            anmfile = OpenROM(ROMName) # Maps a ROM file (shared with any other extractions from the same ROM) needed to extract assembly data, see the above note for the "SpriteStart" offset.
+
+    anmfile = CountFile(anmfile, Timer) # Counting bytes read and seeks made, if "Instrument" is on.
+
+    if UseGBAROM == False:
+        ANMFormat = ChooseFormat('ANM', anmfile.read(), 0, ANMFormat, AutoDetect) # Checking the header and frame table against every format before going any further.
+        anmfile.seek(0, 0) # Back to the top of the .ANM file.
+    else:
+        ANMFormat = ChooseFormat('ANM', anmfile.View, SpriteStart, ANMFormat, AutoDetect, False)
+
+    Timer.Start('Palette')
+    ANMPalette = LoadSpritePalette(anmfile, SpriteStart, ANMFormat, UseGBAROM, SceneName, RawPalette, Inputs)
+    Timer.Stop('Palette')
+
+    Timer.Start('Header')
+    FrameFlags, FrameTotal, SpriteTileStart, SpriteTileSize = ReadSpriteHeader(anmfile, SpriteStart, ANMFormat, UseGBAROM)
+    Timer.Stop('Header')
+
+    if UseGBAROM == True:
+        if not os.path.exists(str(SpriteStart)):
+            os.makedirs(str(SpriteStart)) # If the folder doesn't exist, then make it.
+        FolderName = str(SpriteStart)
+        AddInput(Inputs, ROMName, SpriteStart, SpriteTileStart + SpriteTileSize) # Only the sprite set's own part of the ROM counts.
+    else:
+        if not os.path.exists(SpriteName):
+            os.makedirs(SpriteName) # If the folder doesn't exist, then make it.
+        FolderName = SpriteName
+        AddInput(Inputs, SourceName)
+
+    Settings = {'Script': 'ANM', 'ANMFormat': ANMFormat, 'PaletteNum': PaletteNum, 'PaletteVariants': list(PaletteVariants), 'SpriteWidth': SpriteWidth, 'SpriteHeight': SpriteHeight, 'TileBounds': TileBounds, 'RawPalette': RawPalette, 'TightBounds': TightBounds, 'AtlasMode': AtlasMode, 'AtlasSize': AtlasSize, 'SkipDuplicates': SkipDuplicates, 'CompressLevel': CompressLevel, 'OptimizePNG': OptimizePNG}
+    ManifestName = FolderName + '/manifest.json'
+    if SkipUnchanged == True:
+        SavedFiles = CheckManifest(ManifestName, Inputs, Settings)
+        if SavedFiles != None:
+            print("Nothing's changed since " + ManifestName + " was saved, skipping.")
+            return SavedFiles + [ManifestName]
+
+    Timer.Start('Header')
+    FrameOffset, FrameStart, FrameLength = ReadFrameTable(anmfile, FrameTotal, SpriteStart, SpriteTileStart, ANMFormat)
+    Timer.Stop('Header')
+
+    if len(PaletteVariants) > 0:
+        if FrameFlags == 0x8000 or ANMFormat == 6:
+            print("Sprite set doesn't use the palette rows, so there's nothing for 'PaletteVariants' to change. Skipping them.")
+            PaletteVariants = []
+        for VariantNum in PaletteVariants:
+            if not os.path.exists(FolderName + '/palette' + str(VariantNum)):
+                os.makedirs(FolderName + '/palette' + str(VariantNum)) # One subfolder per palette number.
+
+    SaveAsBuilt = AtlasMode == False and SkipDuplicates == False and len(PaletteVariants) == 0 # Otherwise each frame gets handed back to be checked (or packed, or recoloured) before anything's saved.
+    Saver = ImageSaver(SaveWorkers, CompressLevel, OptimizePNG) # Frames get compressed in the background while the next ones are built.
+    OutFiles = {}; TrimmedFrames = []; FrameInfos = []; FrameFiles = []; FrameHashes = {}; Duplicates = {}
+    for x in range(FrameTotal):
+        if SaveAsBuilt == False:
+            OutFiles[x] = None
+        else:
+            OutFiles[x] = (FolderName + '/' + str(x) + '.png') # Setting up the file path.
+
+    if FrameWorkers != 1 and FrameTotal > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        if ANMFormat == 6:
+            SpriteStarts, SpriteTileStart = ScanLeapsterFrames(anmfile, FrameOffset, FrameTotal, SpriteTileStart) # Every frame needs to know where its sprite starts before they can be split up.
+        else:
+            SpriteStarts = dict((x, SpriteTileStart) for x in range(FrameTotal))
+        FrameArgs = [(FrameOffset[x], FrameStart[x], SpriteStarts[x], FrameFlags, ANMPalette, ANMFormat, PaletteNum, SpriteWidth, SpriteHeight, TileBounds, RawPalette, TightBounds) for x in range(FrameTotal)]
+        WorkerTotal = FrameWorkers if FrameWorkers > 0 else (os.cpu_count() or 1)
+        Pool = ProcessPoolExecutor(max_workers=WorkerTotal)
+        Timer.Start('Workers') # The workers can't report back their own stages, so this covers everything they do.
+        FrameResults = ((FrameResult, FrameInfo, SpriteTileStart) for FrameResult, FrameInfo in Pool.map(RenderFrameJob, [SourceName] * FrameTotal, [OutFiles[x] for x in range(FrameTotal)], FrameArgs, [(CompressLevel, OptimizePNG)] * FrameTotal, chunksize=max(1, FrameTotal // (WorkerTotal * 4)))) # Handed out in batches, and handed back in frame order.
+    else:
+        Pool = None
+        FrameResults = RenderFrames(anmfile, [OutFiles[x] for x in range(FrameTotal)], FrameOffset, FrameStart, SpriteTileStart, Saver, Timer, FrameFlags, ANMPalette, ANMFormat, PaletteNum, SpriteWidth, SpriteHeight, TileBounds, RawPalette, TightBounds)
+    for x, (FrameResult, FrameInfo, SpriteTileStart) in enumerate(FrameResults):
+        FrameInfos.append(FrameInfo)
+        if len(PaletteVariants) > 0:
+            VariantFiles = SavePaletteVariants(anmfile, FolderName, x, FrameResult, FrameInfo, (FrameOffset[x], FrameStart[x], SpriteTileStart, FrameFlags, ANMPalette, ANMFormat, PaletteNum, SpriteWidth, SpriteHeight, TileBounds, RawPalette, TightBounds), PaletteVariants, Saver)
+            OutputFiles.extend(VariantFiles)
+            print("Saved " + str(len(VariantFiles)) + " palette variants of frame " + str(x))
+        if AtlasMode == True:
+            TrimmedFrames.append(TrimFrame(FrameResult))
+            continue
+        if SkipDuplicates == True:
+            FrameHash = HashImage(FrameResult)
+            if FrameHash in FrameHashes:
+                FrameFiles.append(FrameFiles[FrameHashes[FrameHash]]) # Same pixels as an earlier frame, so it just points at that one.
+                Duplicates[str(x) + '.png'] = FrameFiles[-1]
+                continue
+            FrameHashes[FrameHash] = x
+        if SaveAsBuilt == False:
+            FrameResult = FinishFrame(FrameResult, FolderName + '/' + str(x) + '.png', Saver, Timer)
+        FrameFiles.append(str(x) + '.png')
+        OutputFiles.append(FrameResult)
+        print("Saved to " + FrameResult) # We did the thing.
+    if Pool != None:
+        Pool.shutdown()
+        Timer.Stop('Workers')
+    CroppedFrames = [str(x) for x in range(FrameTotal) if FrameInfos[x]['Cropped'] == True]
+    if len(CroppedFrames) > 0:
+        print("WARNING: Frames " + ", ".join(CroppedFrames) + " go past the edges of the " + str(SpriteWidth) + "x" + str(SpriteHeight) + " canvas and got cropped. Set TightBounds = True, or raise the SpriteWidth/SpriteHeight values.")
+    if AtlasMode == True:
+        Timer.Start('Save')
+        OutputFiles.extend(SaveAtlas(FolderName, TrimmedFrames, FrameInfos, ANMPalette, AtlasSize, Saver, SkipDuplicates))
+        Timer.Stop('Save')
+    else:
+        if TightBounds == True:
+            OutputFiles.append(SaveFrameInfo(FolderName, FrameInfos, FrameFiles))
+        if SkipDuplicates == True:
+            OutputFiles.append(SaveDuplicates(FolderName, Duplicates))
+            print("Skipped " + str(len(Duplicates)) + " duplicate frames, listed in " + OutputFiles[-1])
+    Timer.Start('SaveWait')
+    Saver.Finish() # Everything has to be written before the manifest says it was.
+    Timer.Stop('SaveWait')
+    if Instrument == True:
+        Timer.Count('Frames', FrameTotal)
+        Timer.Count('Duplicates', len(Duplicates))
+        OutputFiles.append(Timer.Save(FolderName + '/timing.json'))
+        print("Timings saved to " + OutputFiles[-1])
+    OutputFiles.append(SaveManifest(ManifestName, Inputs, Settings, list(OutputFiles)))
+
+    if UseGBAROM == True:
+        print("The next file should (theoretically) start at around " + str(hex(SpriteTileStart + SpriteTileSize)) + " in " + ROMName + ".")
+    return OutputFiles
+
+if __name__ == "__main__":
+    try:
+        ExtractSprites()
+    except ExtractError as Error:
+        print(Error)
+        os.system('pause')
+        exit()
+    if UseGBAROM == True:
+        os.system('pause')
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+from WayForward_Common import ExtractError, OpenROM, ReadFileList, FindFile, PairScenes, ReadHeader, ScanROM, RankCandidates, TilesetTypes, SpriteTypes, ScreenTypes, SceneTypes
+
+# WayForward GBA/DS/LeapFrog Didj/Leapster asset indexing script written by Random Talking Bush.
+# Reads the header of every tileset, sprite set, screen and scene file in an unpacked game (or every candidate found in a GBA ROM) once, and keeps what it found in a small database next to them.
+# After that, questions like "which .LYR files use tileset 311" or "how many frames does this .ANM have" get answered from the database, without opening the files again.
+
+FileList = "WayForward File IDs/[GBA] Shantae Advance - Risky Revolution (Main).txt" # The "WayForward File IDs" list for the game, used for the file names. Leave blank when indexing a ROM you don't have a list for.
+GameFolder = "" # Folder containing the unpacked game files. Leave blank to use the current folder. Ignored if UseGBAROM = True.
+TSFormat = 1 # Same as the "TSFormat" value in "WayForward_TS-Extract", see the list in that script.
+ANMFormat = 0 # Same as the "ANMFormat" value in "WayForward_ANM-Extract", see the list in that script.
+LYRFormat = 2 # Same as the "LYRFormat" value in "WayForward_LYR-Extract", see the list in that script.
+SceneName = "" # Same as the "SceneName" value in "WayForward_Batch-Extract": the scene file recorded for every sprite set, and for any tilesets that don't have a scene file listed before them.
+
+UseGBAROM = False # Change this to True to index a GBA ROM instead of an unpacked game. The ROM gets scanned the same way "WayForward_ROM-Scan" does it.
+ROMName = "Shantae.gba" # GBA ROM file to index. Ignored when UseGBAROM is False.
+
+IndexName = "" # Database file to keep the index in. Leave blank to use "WayForward_Index.db" in the game folder, or the ROM's name with "_index.db" on the end.
+UpdateIndex = False # The index is built the first time this script is run, and only read afterwards. Set this to True to check for changed files (only those get read again).
+FindTileset = -1 # Set this to a tileset ID to list every .LYR file that uses it.
+FindName = "" # Set this to a file name or ID (such as "shantae.anm" or "20") to show everything indexed about it.
+
+# Instructions on how to use this script:
+# 1. Install Python (either 2 or 3, both work). Pillow isn't needed for this one (nothing here builds any images, and "WayForward_Common.py" only imports it for the ones that do), but "WayForward_Common.py" has to be in the same folder as this script.
+# 2. Fill in the entries above the same way as for "WayForward_Batch-Extract" (or "ROMName" and "UseGBAROM" for a ROM).
+# 3. Run the script (no additional command-line parameters needed). The first run reads every file and saves the index, later runs only read the index.
+# 4. Fill in "FindTileset" or "FindName" and run it again to look things up.
+
+# What gets saved for each file:
+# Its ID and name from the list, type and format, where it is (file name, or offset in the ROM) and which bytes it covers, every header value the extraction scripts read, and a SHA-1 hash of its contents.
+# Dependencies get saved separately: the tileset ID each .LYR uses, and the scene file each .TS4/.TS8/.ANM gets extracted with by "WayForward_Batch-Extract" (the "SceneName" setting for sprites, the closest matching scene file for tilesets).
+# The database is plain SQLite, so anything that can open one can be used to look through it as well.
+
+# Everything below this line should be left alone.
+
+FileFormats = {'TS': TSFormat, 'ANM': ANMFormat, 'LYR': LYRFormat, 'SCN': 0}
+
+def GetFileType(FileName):
+    FileType = os.path.splitext(FileName)[1].lower()
+    if FileType in TilesetTypes:
+        return 'TS'
+    elif FileType in SpriteTypes:
+        return 'ANM'
+    elif FileType in ScreenTypes:
+        return 'LYR'
+    elif FileType in SceneTypes:
+        return 'SCN'
+    return None
+
+def OpenIndex(IndexPath):
+    Connection = sqlite3.connect(IndexPath)
+    Connection.execute("CREATE TABLE IF NOT EXISTS IndexInfo (Key TEXT PRIMARY KEY, Value TEXT)")
+    Connection.execute("CREATE TABLE IF NOT EXISTS Assets (AssetID INTEGER PRIMARY KEY, FileID INTEGER, Name TEXT, Type TEXT, Format INTEGER, File TEXT, Offset INTEGER, ByteStart INTEGER, ByteEnd INTEGER, Header TEXT, Hash TEXT, Score INTEGER, Size INTEGER, Modified REAL)")
+    Connection.execute("CREATE TABLE IF NOT EXISTS Dependencies (AssetID INTEGER, Kind TEXT, TargetID INTEGER, TargetName TEXT)")
+    Connection.execute("CREATE INDEX IF NOT EXISTS AssetFiles ON Assets (File)")
+    Connection.execute("CREATE INDEX IF NOT EXISTS AssetNames ON Assets (Name COLLATE NOCASE)")
+    Connection.execute("CREATE INDEX IF NOT EXISTS DependencyTargets ON Dependencies (Kind, TargetID)")
+    return Connection
+
+def GetIndexSettings():
+    # If any of these change, everything has to be read again, as the header values would be read differently.
+    return json.dumps({'Source': os.path.abspath(ROMName) if UseGBAROM == True else os.path.abspath("."), 'FileList': FileList, 'Formats': [TSFormat, ANMFormat, LYRFormat]}, sort_keys=True)
+
+def RemoveAssets(Connection, WhereClause, WhereValues):
+    Connection.execute("DELETE FROM Dependencies WHERE AssetID IN (SELECT AssetID FROM Assets WHERE " + WhereClause + ")", WhereValues)
+    Connection.execute("DELETE FROM Assets WHERE " + WhereClause, WhereValues)
+
+def AddAsset(Connection, Asset, Dependencies):
+    AssetID = Connection.execute("INSERT INTO Assets (FileID, Name, Type, Format, File, Offset, ByteStart, ByteEnd, Header, Hash, Score, Size, Modified) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (Asset['FileID'], Asset['Name'], Asset['Type'], Asset['Format'], Asset['File'], Asset['Offset'], Asset['ByteStart'], Asset['ByteEnd'], json.dumps(Asset['Header'], sort_keys=True), Asset['Hash'], Asset['Score'], Asset['Size'], Asset['Modified'])).lastrowid
+    for Kind, TargetID, TargetName in Dependencies:
+        Connection.execute("INSERT INTO Dependencies (AssetID, Kind, TargetID, TargetName) VALUES (?, ?, ?, ?)", (AssetID, Kind, TargetID, TargetName))
+
+def GetTilesetDependency(HeaderFields, FileNames):
+    TilesetID = HeaderFields.get('ScreenTilesetID')
+    if TilesetID == None:
+        return []
+    return [('Tileset', TilesetID, FileNames[TilesetID] if TilesetID < len(FileNames) else None)]
+
+def IndexFolder(Connection, FileNames, Rebuild):
+    # Only files which are new, or have a different size or modification time than last time, get read.
+    KnownFiles = dict((Row[0], (Row[1], Row[2])) for Row in Connection.execute("SELECT File, Size, Modified FROM Assets"))
+    ScenePairs = PairScenes(FileNames, SceneName)
+    SeenFiles = set()
+    Counts = {'Read': 0, 'Unchanged': 0, 'Failed': 0}
+    for FileID, FileName in enumerate(FileNames):
+        FileType = GetFileType(FileName)
+        if FileType == None:
+            continue
+        FoundName = FindFile(FileID, FileName)
+        if FoundName == None:
+            continue
+        FilePath = FoundName + os.path.splitext(FileName)[1].lower()
+        if not os.path.exists(FilePath):
+            FilePath = FoundName + os.path.splitext(FileName)[1]
+        SeenFiles.add(FilePath)
+        FileStat = os.stat(FilePath)
+        if Rebuild == False and KnownFiles.get(FilePath) == (FileStat.st_size, FileStat.st_mtime):
+            Counts['Unchanged'] = Counts['Unchanged'] + 1
+            continue
+        RemoveAssets(Connection, "File = ?", (FilePath,))
+        with open(FilePath, "rb") as assetfile:
+            FileData = assetfile.read()
+        FileFormat = FileFormats[FileType]
+        HeaderOffset = 0x200 if (FileType == 'TS' and FileFormat == 3) or (FileType == 'ANM' and FileFormat == 5) else 0 # LeapFrog Didj files have a palette block before the header.
+        Dependencies = []
+        try:
+            if FileType == 'SCN':
+                HeaderFields = {}
+            else:
+                HeaderFields = ReadHeader(FileType, FileData, HeaderOffset, FileFormat)
+            if FileType == 'LYR':
+                Dependencies = GetTilesetDependency(HeaderFields, FileNames)
+            elif FileType == 'ANM' and SceneName != "":
+                Dependencies = [('Scene', None, SceneName)] # Sprites use the same scene file throughout, rather than the one listed before them.
+            elif FileType == 'TS' and ScenePairs.get(FileID, "") != "":
+                Dependencies = [('Scene', None, ScenePairs[FileID])]
+            Score = 100
+            Counts['Read'] = Counts['Read'] + 1
+        except struct.error:
+            HeaderFields = {}; Score = 0 # Too short to even have a header, but it's still worth keeping track of.
+            Counts['Failed'] = Counts['Failed'] + 1
+        AddAsset(Connection, {'FileID': FileID, 'Name': FileName, 'Type': FileType, 'Format': FileFormat, 'File': FilePath, 'Offset': HeaderOffset, 'ByteStart': 0, 'ByteEnd': len(FileData),
+            'Header': HeaderFields, 'Hash': hashlib.sha1(FileData).hexdigest(), 'Score': Score, 'Size': FileStat.st_size, 'Modified': FileStat.st_mtime}, Dependencies)
+    for FilePath in set(KnownFiles) - SeenFiles:
+        RemoveAssets(Connection, "File = ?", (FilePath,)) # Deleted since the last time.
+    return Counts
+
+def IndexROM(Connection, FileNames, Rebuild):
+    # A ROM is one big file, so it's either scanned again entirely (if it changed) or not at all.
+    ROMStat = os.stat(ROMName)
+    KnownROM = Connection.execute("SELECT Size, Modified FROM Assets WHERE File = ? LIMIT 1", (ROMName,)).fetchone()
+    if Rebuild == False and KnownROM != None and tuple(KnownROM) == (ROMStat.st_size, ROMStat.st_mtime):
+        return {'Read': 0, 'Unchanged': Connection.execute("SELECT COUNT(*) FROM Assets").fetchone()[0], 'Failed': 0}
+    RemoveAssets(Connection, "1 = 1", ())
+    ROMData = OpenROM(ROMName).View
+    Candidates, ScanStats = ScanROM(ROMData, TSFormat, ANMFormat, LYRFormat)
+    for Candidate in RankCandidates(Candidates):
+        HeaderFields = ReadHeader(Candidate['Type'], ROMData, Candidate['Offset'], Candidate['Format'])
+        Dependencies = GetTilesetDependency(HeaderFields, FileNames) if Candidate['Type'] == 'LYR' else []
+        AddAsset(Connection, {'FileID': None, 'Name': Candidate['Type'] + " at " + str(hex(Candidate['Offset'])), 'Type': Candidate['Type'], 'Format': Candidate['Format'], 'File': ROMName, 'Offset': Candidate['Offset'], 'ByteStart': Candidate['Offset'], 'ByteEnd': Candidate['End'],
+            'Header': HeaderFields, 'Hash': hashlib.sha1(ROMData[Candidate['Offset']:Candidate['End']]).hexdigest(), 'Score': Candidate['Score'], 'Size': ROMStat.st_size, 'Modified': ROMStat.st_mtime}, Dependencies)
+    return {'Read': len(Candidates), 'Unchanged': 0, 'Failed': 0}
+
+def BuildIndex(Connection, FileNames, Rebuild=False):
+    StartTime = time.time()
+    KnownSettings = Connection.execute("SELECT Value FROM IndexInfo WHERE Key = 'Settings'").fetchone()
+    if KnownSettings == None or KnownSettings[0] != GetIndexSettings():
+        Rebuild = True # Different formats or a different file list since last time.
+    if UseGBAROM == True:
+        Counts = IndexROM(Connection, FileNames, Rebuild)
+    else:
+        Counts = IndexFolder(Connection, FileNames, Rebuild)
+    Connection.execute("INSERT OR REPLACE INTO IndexInfo (Key, Value) VALUES ('Settings', ?)", (GetIndexSettings(),))
+    Connection.execute("INSERT OR REPLACE INTO IndexInfo (Key, Value) VALUES ('Updated', ?)", (str(time.time()),))
+    Connection.commit()
+    print("Indexed in " + str(round(time.time() - StartTime, 2)) + " seconds: " + str(Counts['Read']) + " read, " + str(Counts['Unchanged']) + " unchanged, " + str(Counts['Failed']) + " too short to read.")
+    return Counts
+
+def FindScreensUsing(Connection, TilesetID):
+    return Connection.execute("SELECT Assets.* FROM Assets JOIN Dependencies ON Dependencies.AssetID = Assets.AssetID WHERE Dependencies.Kind = 'Tileset' AND Dependencies.TargetID = ? ORDER BY Assets.FileID, Assets.Offset", (TilesetID,)).fetchall()
+
+def FindAssets(Connection, NameOrID):
+    if str(NameOrID).isdigit():
+        return Connection.execute("SELECT * FROM Assets WHERE FileID = ? OR Name = ? COLLATE NOCASE ORDER BY FileID", (int(NameOrID), str(NameOrID))).fetchall()
+    return Connection.execute("SELECT * FROM Assets WHERE Name = ? COLLATE NOCASE ORDER BY FileID, Offset", (NameOrID,)).fetchall()
+
+def GetDependencies(Connection, AssetID):
+    return Connection.execute("SELECT Kind, TargetID, TargetName FROM Dependencies WHERE AssetID = ?", (AssetID,)).fetchall()
+
+def DescribeAsset(Connection, AssetRow, ShowHeader=False):
+    AssetID, FileID, Name, FileType, FileFormat, FilePath, Offset, ByteStart, ByteEnd, Header, Hash, Score, Size, Modified = AssetRow
+    Description = FileType.ljust(4) + (str(FileID) + ": " if FileID != None else "") + Name + " (" + FilePath + ", bytes " + str(hex(ByteStart)) + "-" + str(hex(ByteEnd)) + ")"
+    if ShowHeader == True:
+        for Key, Value in sorted(json.loads(Header).items()):
+            Description = Description + "\n    " + Key + " = " + str(Value)
+        for Kind, TargetID, TargetName in GetDependencies(Connection, AssetID):
+            Description = Description + "\n    Uses " + Kind.lower() + (" " + str(TargetID) if TargetID != None else "") + (" (" + TargetName + ")" if TargetName != None else "")
+        Description = Description + "\n    SHA-1 " + Hash
+    return Description
+
+def RunIndex():
+    FileNames = ReadFileList(FileList) if FileList != "" else []
+    if UseGBAROM == True:
+        if not os.path.exists(ROMName):
+            raise ExtractError("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
+        IndexPath = IndexName if IndexName != "" else os.path.splitext(ROMName)[0] + "_index.db"
+    else:
+        if GameFolder != "":
+            os.chdir(GameFolder)
+        IndexPath = IndexName if IndexName != "" else "WayForward_Index.db"
+    IndexExists = os.path.exists(IndexPath)
+    Connection = OpenIndex(IndexPath)
+    if IndexExists == False or UpdateIndex == True:
+        BuildIndex(Connection, FileNames)
+    else:
+        print("Using the existing index in " + IndexPath + " (set UpdateIndex = True to check for changed files).")
+
+    for FileType, TypeCount in Connection.execute("SELECT Type, COUNT(*) FROM Assets GROUP BY Type ORDER BY Type"):
+        print(FileType + ": " + str(TypeCount) + " indexed.")
+    if FindTileset >= 0:
+        print("--------------------------------------------------------------------------------")
+        Screens = FindScreensUsing(Connection, FindTileset)
+        print(str(len(Screens)) + " screen files use tileset " + str(FindTileset) + ":")
+        for AssetRow in Screens:
+            print(DescribeAsset(Connection, AssetRow))
+    if FindName != "":
+        print("--------------------------------------------------------------------------------")
+        Assets = FindAssets(Connection, FindName)
+        if len(Assets) == 0:
+            print("Nothing indexed under '" + str(FindName) + "'.")
+        for AssetRow in Assets:
+            print(DescribeAsset(Connection, AssetRow, True))
+    Connection.close()
+
+if __name__ == "__main__":
+    try:
+        RunIndex()
+    except ExtractError as Error:
+        print(Error)
+    os.system('pause')
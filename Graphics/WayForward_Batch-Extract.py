@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import json
+import struct
+from WayForward_Common import ExtractError, LoadExtractScript, ReadFileList, FindFile, PairScenes, DetectFormat, TilesetTypes, SpriteTypes, ScreenTypes
+
+# WayForward GBA/DS/LeapFrog Didj/Leapster batch extraction script written by Random Talking Bush.
+# Runs my "WayForward_TS-Extract", "WayForward_ANM-Extract" and "WayForward_LYR-Extract" scripts over every file listed in one of the "WayForward File IDs" lists, all in a single run.
+
+FileList = "WayForward File IDs/[GBA] Shantae Advance - Risky Revolution (Main).txt" # The "WayForward File IDs" list for the game you're ripping from. Each line number (starting from 0) is that file's ID, which is also the filename my QuickBMS scripts use when unpacking GBA games.
+GameFolder = "" # Folder containing the unpacked game files. Leave blank to use the current folder. Everything gets exported into this folder, same as running the scripts one at a time.
+TSFormat = 1 # Same as the "TSFormat" value in "WayForward_TS-Extract", see the list in that script.
+ANMFormat = 0 # Same as the "ANMFormat" value in "WayForward_ANM-Extract", see the list in that script.
+LYRFormat = 2 # Same as the "LYRFormat" value in "WayForward_LYR-Extract", see the list in that script.
+AutoDetect = False # Set this to True to work out the three format values above for each file instead, same as the "AutoDetect" value in the other scripts. Handy for games which aren't on any of the lists yet.
+SceneName = "" # The .SCN or .PAL file to use for sprites, and for any tilesets that don't have a scene file listed before them. Leave blank to use a grayscale palette.
+PaletteNum = 1 # Same as the "PaletteNum" value in "WayForward_ANM-Extract".
+ExtractTilesets = True # Set any of these to False to skip that type of file.
+ExtractSprites = True
+ExtractScreens = True
+SkipDuplicates = False # Same as the "SkipDuplicates" value in "WayForward_ANM-Extract" and "WayForward_LYR-Extract", for sprite frames and screens.
+SkipUnchanged = True # Set this to False to re-export everything. Otherwise files whose inputs (the file itself, its palette, or the metatile image for a .LYR) and settings haven't changed since the last run get skipped, going by the manifests saved alongside each export.
+CompressLevel = 6 # Same as the "CompressLevel" value in the other scripts, from 0 (fastest to save) to 9 (smallest files).
+OptimizePNG = False # Same as the "OptimizePNG" value in the other scripts. Set this to True for a final export, once everything else is sorted out.
+WorkerCount = 0 # How many files to extract at the same time. Set this to 0 to use one per CPU core, or 1 to extract them one by one.
+Instrument = False # Same as the "Instrument" value in the other scripts. Each export's "timing.json" / "_timing.json" report gets added up by file type, printed at the end and saved as "batch_timing.json" in the game folder.
+Verbose = False # Set this to True to see every "Saved to" line from the extraction scripts, rather than one line per file.
+
+# Instructions on how to use this script:
+# 1. Install Python 3 (batch mode needs it for running multiple extractions at once) and Pillow: https://github.com/python-pillow/Pillow
+# 2. Unpack the game you want to rip from, as explained in the other scripts. Keep this script, "WayForward_Common.py" and the three "WayForward_*-Extract" scripts in the same folder.
+# 3. Fill in the "FileList" entry above with the list matching the game, the "GameFolder" with wherever the unpacked files are, and the three format values from the lists in the other scripts (or set "AutoDetect" to True).
+# 4. Run the script (no additional command-line parameters needed). Tilesets (.TS4/.TS8) are exported first, then each .LYR gets exported as soon as the tileset it uses is done. A summary gets printed at the end.
+
+# Troubleshooting:
+# Files are looked for by their ID first (such as "365.ts4" for GBA games unpacked with QuickBMS), then by the name in the list (such as "arachnid.ts8" for DS games).
+# Tilesets use the scene file with the same name if there is one (such as "hub1.scn" for "hub1.ts4"), otherwise the closest one listed before them.
+# Failed files are listed at the end along with the error message. If most of one type fails, you most likely have the wrong format value filled in. Try running with "AutoDetect" set to True, each file's detected format is listed with "Verbose" on.
+# If the exports look out of date after updating the scripts themselves, set "SkipUnchanged" to False for one run (or delete the "manifest.json" / "_manifest.json" files) to re-export everything.
+
+# Everything below this line should be left alone.
+
+def ReadTilesetID(ScreenName, LYRFormat):
+    # Grabs the tileset ID from a .LYR header, so we know which tileset needs to be done before it.
+    with open(ScreenName + '.lyr', "rb") as scrfile:
+        ScreenHeader = scrfile.read()
+    if AutoDetect == True:
+        LYRFormat = DetectFormat('LYR', ScreenHeader)[0] # The tileset ID isn't in the same spot for every format.
+        if LYRFormat == None:
+            return None
+    if LYRFormat == 0:
+        return struct.unpack_from('<H', ScreenHeader, 12)[0]
+    elif LYRFormat == 1:
+        return struct.unpack_from('<H', ScreenHeader, 14)[0]
+    return struct.unpack_from('<H', ScreenHeader, 18)[0]
+
+def BuildJobs(FileNames):
+    Jobs = []; Missing = []
+    ScenePairs = PairScenes(FileNames, SceneName)
+    for FileID, FileName in enumerate(FileNames):
+        FileType = os.path.splitext(FileName)[1].lower()
+        if (FileType in TilesetTypes and ExtractTilesets == True) or (FileType in SpriteTypes and ExtractSprites == True) or (FileType in ScreenTypes and ExtractScreens == True):
+            FoundName = FindFile(FileID, FileName)
+            if FoundName == None:
+                Missing.append(FileName)
+                continue
+            Job = {'ID': FileID, 'Name': FileName, 'File': FoundName}
+            if FileType in TilesetTypes:
+                Job['Type'] = 'TS'
+                Job['Scene'] = ScenePairs[FileID]
+            elif FileType in SpriteTypes:
+                Job['Type'] = 'ANM'
+                Job['Scene'] = SceneName
+            else:
+                Job['Type'] = 'LYR'
+                try:
+                    Job['TilesetID'] = ReadTilesetID(FoundName, LYRFormat)
+                except (IOError, struct.error):
+                    Job['TilesetID'] = None
+            Jobs.append(Job)
+    return Jobs, Missing
+
+def RunJob(Job):
+    # Runs a single extraction. This happens in a worker process, so everything it needs is passed in through the job itself.
+    StartTime = time.time()
+    Timing = None
+    RealOutput = sys.stdout
+    if Verbose == False:
+        sys.stdout = open(os.devnull, "w") # The extraction scripts print a line per file saved, which adds up fast.
+    try:
+        if Job['Type'] == 'TS':
+            OutputFiles = LoadExtractScript('TS').ExtractTileset(TilesetName=Job['File'], SceneName=Job['Scene'], TSFormat=TSFormat, UseGBAROM=False, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG)
+        elif Job['Type'] == 'ANM':
+            OutputFiles = LoadExtractScript('ANM').ExtractSprites(SpriteName=Job['File'], SceneName=Job['Scene'], ANMFormat=ANMFormat, PaletteNum=PaletteNum, UseGBAROM=False, FrameWorkers=1, SaveWorkers=0, SkipDuplicates=SkipDuplicates, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG) # Files are already being split across processes, so each sprite set's frames are built and saved one by one.
+        else:
+            OutputFiles = LoadExtractScript('LYR').ExtractScreens(ScreenName=Job['File'], MetatilesName=Job.get('MetatilesName', ""), LYRFormat=LYRFormat, UseGBAROM=False, SaveWorkers=0, SkipDuplicates=SkipDuplicates, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG)
+        Status = "OK"; Message = str(len(OutputFiles)) + " files"
+        Unchanged = os.path.getmtime(OutputFiles[-1]) < StartTime # The manifest is always saved last, so if it's older than this job, the job got skipped.
+        if Unchanged == True:
+            Message = Message + ", unchanged"
+        elif Instrument == True:
+            with open(OutputFiles[-2], "r") as timingfile:
+                Timing = json.load(timingfile) # The timing report is always saved right before the manifest.
+    except Exception as Error:
+        # Anything can go wrong with the wrong format value or a broken file, so don't let one file stop the whole batch.
+        OutputFiles = []; Status = "FAILED"; Message = type(Error).__name__ + ": " + str(Error); Unchanged = False; Timing = None
+    finally:
+        if sys.stdout is not RealOutput:
+            sys.stdout.close()
+            sys.stdout = RealOutput
+    return {'Job': Job, 'Status': Status, 'Message': Message, 'Outputs': len(OutputFiles), 'Unchanged': Unchanged, 'Time': time.time() - StartTime, 'Timing': Timing}
+
+def AddTimings(TypeResults):
+    # Adds up the timing reports from every file of one type.
+    Totals = {'Files': 0, 'Seconds': 0.0, 'Stages': {}, 'Counters': {}}
+    for Result in TypeResults:
+        if Result['Timing'] != None:
+            Totals['Files'] = Totals['Files'] + 1
+            Totals['Seconds'] = Totals['Seconds'] + Result['Timing']['Seconds']
+            for Stage, StageTotal in Result['Timing']['Stages'].items():
+                Totals['Stages'].setdefault(Stage, {'Seconds': 0.0, 'Calls': 0})
+                Totals['Stages'][Stage]['Seconds'] = Totals['Stages'][Stage]['Seconds'] + StageTotal['Seconds']
+                Totals['Stages'][Stage]['Calls'] = Totals['Stages'][Stage]['Calls'] + StageTotal['Calls']
+            for Counter, Amount in Result['Timing']['Counters'].items():
+                Totals['Counters'][Counter] = Totals['Counters'].get(Counter, 0) + Amount
+    return Totals
+
+def RunBatch():
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    FileNames = ReadFileList(FileList)
+    if GameFolder != "":
+        os.chdir(GameFolder)
+    Jobs, Missing = BuildJobs(FileNames)
+    TilesetNames = dict((Job['ID'], Job['File']) for Job in Jobs if Job['Type'] == 'TS')
+    WaitingScreens = {} # .LYR files waiting on their tileset, by tileset ID.
+    LateScreens = [] # .LYR files whose tileset isn't part of this run, done once every tileset is out of the way.
+    print("Found " + str(len(Jobs)) + " files to extract (" + str(len(Missing)) + " listed files missing).")
+
+    StartTime = time.time()
+    Results = []
+    Pool = ProcessPoolExecutor(max_workers=(WorkerCount if WorkerCount > 0 else None))
+    Pending = {}
+    TilesetsLeft = len(TilesetNames)
+    for Job in Jobs:
+        if Job['Type'] == 'LYR':
+            if Job['TilesetID'] in TilesetNames:
+                Job['MetatilesName'] = TilesetNames[Job['TilesetID']]
+                WaitingScreens.setdefault(Job['TilesetID'], []).append(Job)
+            else:
+                LateScreens.append(Job)
+        else:
+            Pending[Pool.submit(RunJob, Job)] = Job
+    if TilesetsLeft == 0:
+        for Job in LateScreens:
+            Pending[Pool.submit(RunJob, Job)] = Job
+        LateScreens = []
+    while len(Pending) > 0:
+        Finished = wait(list(Pending), return_when=FIRST_COMPLETED)[0]
+        for Future in Finished:
+            Job = Pending.pop(Future)
+            Result = Future.result()
+            Results.append(Result)
+            print("[" + str(len(Results)) + "/" + str(len(Jobs)) + "] " + Job['Type'] + " " + Job['Name'] + " (" + Job['File'] + "): " + Result['Status'] + ", " + Result['Message'])
+            if Job['Type'] == 'TS':
+                TilesetsLeft = TilesetsLeft - 1
+                for ScreenJob in WaitingScreens.pop(Job['ID'], []):
+                    Pending[Pool.submit(RunJob, ScreenJob)] = ScreenJob # The tileset's done, so its screens can go ahead.
+                if TilesetsLeft == 0:
+                    for ScreenJob in LateScreens:
+                        Pending[Pool.submit(RunJob, ScreenJob)] = ScreenJob
+                    LateScreens = []
+    Pool.shutdown()
+
+    print("--------------------------------------------------------------------------------")
+    print("Finished in " + str(round(time.time() - StartTime, 2)) + " seconds.")
+    for JobType in ('TS', 'ANM', 'LYR'):
+        TypeResults = [Result for Result in Results if Result['Job']['Type'] == JobType]
+        if len(TypeResults) > 0:
+            Succeeded = len([Result for Result in TypeResults if Result['Status'] == "OK"])
+            Unchanged = len([Result for Result in TypeResults if Result['Unchanged'] == True])
+            print(JobType + ": " + str(Succeeded - Unchanged) + " extracted, " + str(Unchanged) + " unchanged, " + str(len(TypeResults) - Succeeded) + " failed, " + str(sum(Result['Outputs'] for Result in TypeResults if Result['Unchanged'] == False)) + " files saved, " + str(round(sum(Result['Time'] for Result in TypeResults), 2)) + " seconds of work.")
+    if Instrument == True:
+        TimingTotals = {}
+        for JobType in ('TS', 'ANM', 'LYR'):
+            TimingTotals[JobType] = AddTimings([Result for Result in Results if Result['Job']['Type'] == JobType])
+            if TimingTotals[JobType]['Files'] > 0:
+                print(JobType + " stages: " + ", ".join(Stage + " " + str(round(StageTotal['Seconds'], 2)) + " s" for Stage, StageTotal in sorted(TimingTotals[JobType]['Stages'].items(), key=lambda StageItem: -StageItem[1]['Seconds'])) + ".")
+        with open("batch_timing.json", "w") as timingfile:
+            json.dump(TimingTotals, timingfile, indent=1, sort_keys=True)
+        print("Timings saved to batch_timing.json")
+    if len(Missing) > 0:
+        print("Missing: " + str(len(Missing)) + " listed files weren't found in the game folder.")
+    for Result in Results:
+        if Result['Status'] != "OK":
+            print("FAILED: " + Result['Job']['Name'] + " (" + Result['Job']['File'] + ") - " + Result['Message'])
+    return Results
+
+if __name__ == "__main__":
+    try:
+        RunBatch()
+    except ExtractError as Error:
+        print(Error)
+        os.system('pause')
+        exit()
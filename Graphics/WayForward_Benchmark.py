@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import platform
+from WayForward_Common import ExtractError, LoadExtractScript
+
+# WayForward extraction benchmark script written by Random Talking Bush.
+# Times the TS, ANM and LYR extraction scripts on the made-up files from "WayForward_Make-Fixtures", and reports how many tiles, frames and screens per second each one gets through along with how much memory it took.
+
+FixtureFolder = "Fixtures" # Folder the "WayForward_Make-Fixtures" script wrote its files to. Everything gets extracted in there as well.
+Repeats = 3 # How many times to run each extraction. The fastest run is the one that gets reported, which evens out anything else the computer happened to be doing.
+BenchTilesets = True # Set any of these to False to skip timing that type of file. Maps need the tileset images, so tilesets always get extracted once either way.
+BenchSprites = True
+BenchScreens = True
+FrameWorkers = 1 # Same as the "FrameWorkers" value in "WayForward_ANM-Extract", for timing sprite sets built across several processes. Set this to 0 to use one per CPU core.
+ResultsName = "benchmark.json" # File to save the results to, so they can be compared against later. Leave blank to not save anything.
+CompareWith = "" # Results file from an earlier run (such as before changing something) to compare against. Leave blank to skip the comparison.
+
+# Instructions on how to use this script:
+# 1. Install Python 3 and Pillow: https://github.com/python-pillow/Pillow. Keep this script in the same folder as "WayForward_Common.py" and the three "WayForward_*-Extract" scripts.
+# 2. Run "WayForward_Make-Fixtures" first, then this script (no additional command-line parameters needed).
+# 3. To check whether a change made things faster, run it once before the change, rename "benchmark.json" to something else and fill that in as "CompareWith", then run it again after the change.
+
+# How it works:
+# Every run happens in a brand new process, so nothing (decoded tiles, lookup tables, memory-mapped files) carries over from one run to the next, and the peak memory use is that run's alone.
+# Peak memory is the most the whole process used, Python and Pillow included, so it's only meant for comparing runs with each other. With "FrameWorkers" above 1, the frame workers' own memory isn't part of it. It can't be measured on Windows, where it's left out.
+# Results are only comparable between runs using the same fixture settings (the "Seed" and "Scale" are saved along with them), on the same computer.
+
+# Everything below this line should be left alone.
+
+def RunFixture(FolderName, Fixture, SceneName, FrameWorkers):
+    # Runs a single extraction, in a fresh worker process.
+    os.chdir(FolderName)
+    RealOutput = sys.stdout
+    sys.stdout = open(os.devnull, "w") # The extraction scripts print a line per file saved, which would only slow them down here.
+    try:
+        StartTime = time.time()
+        if Fixture['Type'] == 'TS':
+            OutputFiles = LoadExtractScript('TS').ExtractTileset(TilesetName=Fixture['Name'], SceneName=SceneName, TSFormat=Fixture['Format'], UseGBAROM=False)
+        elif Fixture['Type'] == 'ANM':
+            OutputFiles = LoadExtractScript('ANM').ExtractSprites(SpriteName=Fixture['Name'], SceneName=SceneName, ANMFormat=Fixture['Format'], UseGBAROM=False, FrameWorkers=FrameWorkers)
+        else:
+            OutputFiles = LoadExtractScript('LYR').ExtractScreens(ScreenName=Fixture['Name'], MetatilesName=Fixture['Tileset'], LYRFormat=Fixture['Format'], UseGBAROM=False)
+        RunTime = time.time() - StartTime
+    finally:
+        sys.stdout.close()
+        sys.stdout = RealOutput
+    try:
+        import resource
+        PeakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024) # Bytes on macOS, kilobytes everywhere else.
+    except ImportError:
+        PeakMemory = None
+    return {'Time': RunTime, 'PeakMemory': PeakMemory, 'Outputs': len(OutputFiles)}
+
+def DescribeResult(Result):
+    ResultText = (Result['Type'] + " " + Result['File']).ljust(18) + " " + str(round(Result['Time'], 3)).rjust(7) + " s, " + str(int(Result['PerSecond'])).rjust(7) + " " + Result['Units'] + "/s"
+    if Result['PeakMemory'] != None:
+        ResultText = ResultText + ", " + str(round(Result['PeakMemory'] / 1048576.0, 1)) + " MB peak"
+    return ResultText
+
+def CompareResults(Results, Totals, FixtureList, OldResults):
+    OldTimes = dict((OldResult['File'], OldResult) for OldResult in OldResults['Results'])
+    if OldResults.get('Seed') != FixtureList['Seed'] or OldResults.get('Scale') != FixtureList['Scale']:
+        print("WARNING: " + CompareWith + " was made with different fixture settings, so the comparison doesn't mean much.")
+    if OldResults.get('FrameWorkers', 1) != FrameWorkers:
+        print("NOTE: " + CompareWith + " was made with FrameWorkers = " + str(OldResults.get('FrameWorkers', 1)) + ", this run used " + str(FrameWorkers) + ".")
+    print("--------------------------------------------------------------------------------")
+    for Result in Results:
+        if Result['File'] in OldTimes:
+            OldResult = OldTimes[Result['File']]
+            print((Result['Type'] + " " + Result['File']).ljust(18) + " " + str(round(OldResult['Time'], 3)).rjust(7) + " s -> " + str(round(Result['Time'], 3)).rjust(7) + " s (" + str(round(OldResult['Time'] / max(Result['Time'], 0.000001), 2)) + "x)")
+    for FileType in ('TS', 'ANM', 'LYR'):
+        if FileType in Totals and FileType in OldResults.get('Totals', {}):
+            print(FileType + " overall: " + str(round(OldResults['Totals'][FileType]['Time'] / max(Totals[FileType]['Time'], 0.000001), 2)) + "x as fast as before.")
+
+def RunFresh(SpawnContext, *FixtureArgs):
+    # Each run gets a process of its own, shut down straight after. Not a multiprocessing.Pool, as its processes aren't allowed to start any of their own (which the "FrameWorkers" runs need).
+    from concurrent.futures import ProcessPoolExecutor
+    Pool = ProcessPoolExecutor(max_workers=1, mp_context=SpawnContext)
+    try:
+        return Pool.submit(RunFixture, *FixtureArgs).result()
+    finally:
+        Pool.shutdown()
+
+def RunBenchmark():
+    import multiprocessing
+    ListName = os.path.join(FixtureFolder, "fixtures.json")
+    if not os.path.exists(ListName):
+        raise ExtractError("Can't find '" + ListName + "'. Run the 'WayForward_Make-Fixtures' script first, or correct the 'FixtureFolder' entry if you already did.")
+    with open(ListName, "r") as listfile:
+        FixtureList = json.load(listfile)
+    FolderName = os.path.abspath(FixtureFolder)
+    BenchTypes = [FileType for FileType, BenchType in (('TS', BenchTilesets), ('ANM', BenchSprites), ('LYR', BenchScreens)) if BenchType == True]
+    SpawnContext = multiprocessing.get_context('spawn') # A new process for every run.
+
+    Results = []
+    for FileType in ('TS', 'ANM', 'LYR'):
+        for Fixture in FixtureList['Fixtures']:
+            if Fixture['Type'] != FileType or (FileType not in BenchTypes and not (FileType == 'TS' and 'LYR' in BenchTypes)):
+                continue
+            Runs = [RunFresh(SpawnContext, FolderName, Fixture, FixtureList['Scene'], FrameWorkers) for r in range(Repeats if FileType in BenchTypes else 1)]
+            if FileType not in BenchTypes:
+                continue # Only needed the tileset images for the maps.
+            BestRun = min(Runs, key=lambda Run: Run['Time'])
+            Result = {'File': Fixture['File'], 'Type': FileType, 'Format': Fixture['Format'], 'Count': Fixture['Count'], 'Units': Fixture['Units'], 'Time': BestRun['Time'], 'Times': [Run['Time'] for Run in Runs],
+                'PerSecond': Fixture['Count'] / max(BestRun['Time'], 0.000001), 'PeakMemory': max(Run['PeakMemory'] for Run in Runs) if BestRun['PeakMemory'] != None else None, 'Outputs': BestRun['Outputs']}
+            Results.append(Result)
+            print(DescribeResult(Result))
+
+    Totals = {}
+    print("--------------------------------------------------------------------------------")
+    for FileType in BenchTypes:
+        TypeResults = [Result for Result in Results if Result['Type'] == FileType]
+        if len(TypeResults) > 0:
+            Totals[FileType] = {'Count': sum(Result['Count'] for Result in TypeResults), 'Time': sum(Result['Time'] for Result in TypeResults), 'Units': TypeResults[0]['Units']}
+            print(FileType + ": " + str(Totals[FileType]['Count']) + " " + Totals[FileType]['Units'] + " in " + str(round(Totals[FileType]['Time'], 3)) + " seconds, " + str(int(Totals[FileType]['Count'] / max(Totals[FileType]['Time'], 0.000001))) + " " + Totals[FileType]['Units'] + "/s overall.")
+
+    if ResultsName != "":
+        import PIL
+        with open(ResultsName, "w") as resultsfile:
+            json.dump({'Seed': FixtureList['Seed'], 'Scale': FixtureList['Scale'], 'Repeats': Repeats, 'FrameWorkers': FrameWorkers, 'Python': platform.python_version(), 'Pillow': getattr(PIL, '__version__', None), 'Platform': platform.platform(),
+                'Results': Results, 'Totals': Totals}, resultsfile, indent=1, sort_keys=True)
+        print("Saved to " + ResultsName)
+    if CompareWith != "":
+        if not os.path.exists(CompareWith):
+            raise ExtractError("Can't find '" + CompareWith + "'. Check to make sure you filled in the 'CompareWith' entry correctly.")
+        with open(CompareWith, "r") as resultsfile:
+            CompareResults(Results, Totals, FixtureList, json.load(resultsfile))
+    return Results
+
+if __name__ == "__main__":
+    try:
+        RunBenchmark()
+    except ExtractError as Error:
+        print(Error)
+    os.system('pause')
@@ -0,0 +1,1002 @@
+# Shared helper functions for Random Talking Bush's WayForward GBA/DS/LeapFrog Didj/Leapster extraction scripts.
+# Keep this file in the same folder as the "WayForward_*-Extract" scripts, they import from it.
+# Pillow only gets imported inside the functions that work with images, so "WayForward_ROM-Scan" and "WayForward_Asset-Index" run without it.
+
+import io
+import os
+import re
+import sys
+import mmap
+import time
+import json
+import bisect
+import zlib
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+try:
+    import queue # Python 3.
+except ImportError:
+    import Queue as queue # Python 2.
+
+class ExtractError(Exception):
+    # Raised by the extraction scripts when they can't go any further (missing files, invalid settings), so that a batch run can carry on with the next file.
+    pass
+
+def LoadExtractScript(ScriptType):
+    # The extraction scripts have dashes in their filenames, so they can't be imported the usual way. ScriptType is "TS", "ANM" or "LYR".
+    ModuleName = "WayForward_" + ScriptType + "_Extract"
+    if ModuleName not in sys.modules:
+        ScriptPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "WayForward_" + ScriptType + "-Extract.py")
+        try:
+            import importlib.util
+            ScriptSpec = importlib.util.spec_from_file_location(ModuleName, ScriptPath)
+            ScriptModule = importlib.util.module_from_spec(ScriptSpec)
+            ScriptSpec.loader.exec_module(ScriptModule)
+        except ImportError:
+            import imp # Python 2.
+            ScriptModule = imp.load_source(ModuleName, ScriptPath)
+        sys.modules[ModuleName] = ScriptModule
+    return sys.modules[ModuleName]
+
+# --------------------------------------------------------------------------------
+# "WayForward File IDs" lists.
+# --------------------------------------------------------------------------------
+# Each line number (starting from 0) is that file's ID, which is also the filename my QuickBMS scripts use when unpacking GBA games. DS games keep their real names instead.
+
+TilesetTypes = ('.ts4', '.ts8')
+SpriteTypes = ('.anm', '.an4', '.an8')
+ScreenTypes = ('.lyr',)
+SceneTypes = ('.scn', '.pal')
+
+def ReadFileList(FileListName):
+    if not os.path.exists(FileListName):
+        FileListName = os.path.join(os.path.dirname(os.path.abspath(__file__)), FileListName) # Try next to this script as well.
+    if not os.path.exists(FileListName):
+        raise ExtractError("Can't find '" + FileListName + "'. Check to make sure you filled in the 'FileList' entry correctly.")
+    with open(FileListName, "r") as listfile:
+        return [FileName.strip() for FileName in listfile.read().split('\n')]
+
+def FindFile(FileID, FileName):
+    # Returns the name of the unpacked file (minus extension) if it exists, checking its ID first and then its name.
+    FileStem, FileType = os.path.splitext(FileName)
+    for Candidate in (str(FileID), FileStem):
+        if Candidate != "" and (os.path.exists(Candidate + FileType.lower()) or os.path.exists(Candidate + FileType)):
+            return Candidate
+    return None
+
+def PairScenes(FileNames, DefaultScene=""):
+    # Works out which scene file each listed file most likely uses: the one with the same name if there is one (such as "hub1.scn" for "hub1.ts4"), otherwise the closest one listed before it.
+    ScenePairs = {}
+    LastScene = DefaultScene
+    SceneIDs = dict((os.path.splitext(FileName)[0].lower(), FileID) for FileID, FileName in enumerate(FileNames) if os.path.splitext(FileName)[1].lower() in SceneTypes)
+    for FileID, FileName in enumerate(FileNames):
+        FileType = os.path.splitext(FileName)[1].lower()
+        if FileType in SceneTypes:
+            FoundName = FindFile(FileID, FileName)
+            if FoundName != None:
+                LastScene = FoundName # Tilesets usually come right after the scene file they belong to.
+            continue
+        SceneID = SceneIDs.get(os.path.splitext(FileName)[0].lower())
+        MatchingScene = None
+        if SceneID != None:
+            MatchingScene = FindFile(SceneID, FileNames[SceneID])
+        if MatchingScene != None:
+            ScenePairs[FileID] = MatchingScene
+        else:
+            ScenePairs[FileID] = LastScene
+    return ScenePairs
+
+# --------------------------------------------------------------------------------
+# 4BPP tile decoding.
+# --------------------------------------------------------------------------------
+# 4BPP tiles store two pixels per byte, the lower nibble being the left pixel and the upper nibble the right one.
+# Rather than unpacking them one byte at a time, we run the entire tile block through a pair of 256-entry lookup tables (one per nibble), which also applies the palette row and transparency rule in the same pass.
+
+NibbleTables = {} # Lookup tables are built once per palette row, then reused.
+
+def GetPaletteRowTable(PaletteOffset):
+    # Maps a raw 4BPP index (0-15) to its palette row. Index 0 stays at 0 for a global transparency instead of that line's specific transparency value.
+    RowTable = bytearray(256)
+    for x in range(1, 16):
+        RowTable[x] = (x + PaletteOffset) & 0xFF
+    return bytes(RowTable)
+
+def GetNibbleTables(PaletteOffset):
+    if PaletteOffset not in NibbleTables:
+        RowTable = bytearray(GetPaletteRowTable(PaletteOffset))
+        LowTable = bytearray(256); HighTable = bytearray(256)
+        for x in range(256):
+            LowTable[x] = RowTable[x & 0x0F] # Left pixel.
+            HighTable[x] = RowTable[(x & 0xF0) >> 4] # Right pixel.
+        NibbleTables[PaletteOffset] = (bytes(LowTable), bytes(HighTable), bytes(RowTable))
+    return NibbleTables[PaletteOffset]
+
+def DecodeTiles4BPP(TileData, PaletteOffset=0):
+    # Unpacks any amount of 4BPP tiles (0x20 bytes apiece) into one byte per pixel, 0x40 bytes per tile in the same order they were stored.
+    # PaletteOffset is the palette row multiplied by 16 (0x00, 0x10 ... 0xF0), same as the "TilePalette" values in the scripts.
+    LowTable, HighTable, RowTable = GetNibbleTables(PaletteOffset)
+    TileData = bytearray(TileData)
+    TileIndices = bytearray(len(TileData) * 2)
+    TileIndices[0::2] = TileData.translate(LowTable)
+    TileIndices[1::2] = TileData.translate(HighTable)
+    return TileIndices
+
+def ShiftPaletteRow(TileIndices, PaletteOffset):
+    # Moves tiles decoded with a PaletteOffset of 0 onto another palette row, without having to decode them again.
+    if PaletteOffset == 0:
+        return bytearray(TileIndices)
+    return bytearray(TileIndices).translate(GetNibbleTables(PaletteOffset)[2])
+
+RowShiftTables = {}
+
+def ShiftPaletteRows(PixelData, RowShift):
+    # Moves already-decoded 16-colour pixels (on any palette row) along by RowShift, wrapping around past the last row. Index 0 stays at 0, same as when decoding.
+    if RowShift not in RowShiftTables:
+        ShiftTable = bytearray(256)
+        for x in range(1, 256):
+            ShiftTable[x] = (x + RowShift) & 0xFF
+        RowShiftTables[RowShift] = bytes(ShiftTable)
+    return bytearray(PixelData).translate(RowShiftTables[RowShift])
+
+# --------------------------------------------------------------------------------
+# Decoded tile cache.
+# --------------------------------------------------------------------------------
+# Tilesets reuse a small set of tiles very heavily, so rather than seeking, reading, decoding and flipping the same tile over and over, we keep the decoded tile around along with all four of its flip variants.
+
+def FlipVariants(CropImage):
+    # Returns the tile in the same order as the "TileFlip" values: none, horizontal (4), vertical (8) and both (C).
+    from PIL import Image
+    FlipImageH = CropImage.transpose(Image.FLIP_LEFT_RIGHT)
+    FlipImageV = CropImage.transpose(Image.FLIP_TOP_BOTTOM)
+    FlipImageHV = FlipImageH.transpose(Image.FLIP_TOP_BOTTOM)
+    return (CropImage, FlipImageH, FlipImageV, FlipImageHV)
+
+def FlipTile(CropImage, TileFlip):
+    # Just the one flip variant, for when the others aren't going to be kept.
+    from PIL import Image
+    if TileFlip & 1 == 1:
+        CropImage = CropImage.transpose(Image.FLIP_LEFT_RIGHT)
+    if TileFlip & 2 == 2:
+        CropImage = CropImage.transpose(Image.FLIP_TOP_BOTTOM)
+    return CropImage
+
+class TileCache(object):
+    # Bounded (least recently used) cache of decoded tiles, keyed by (TileID, TilePalette) and indexed by TileFlip. Set MaxTiles to 0 to disable it.
+    def __init__(self, MaxTiles=4096):
+        self.MaxTiles = MaxTiles
+        self.Tiles = OrderedDict()
+        self.Hits = 0
+        self.Misses = 0
+
+    def Get(self, TileKey, TileFlip):
+        Variants = self.Tiles.pop(TileKey, None)
+        if Variants is None:
+            self.Misses = self.Misses + 1
+            return None
+        self.Tiles[TileKey] = Variants # Re-inserting it marks it as the most recently used.
+        self.Hits = self.Hits + 1
+        return Variants[TileFlip]
+
+    def Store(self, TileKey, TileFlip, CropImage):
+        # Builds all four flip variants from a single decode, and returns the one that was asked for.
+        if self.MaxTiles == 0:
+            return FlipTile(CropImage, TileFlip) # Nothing's kept, so only the one that was asked for gets flipped.
+        Variants = FlipVariants(CropImage)
+        self.Tiles[TileKey] = Variants
+        if len(self.Tiles) > self.MaxTiles:
+            self.Tiles.popitem(last=False) # Out with the oldest.
+        return Variants[TileFlip]
+
+    def Report(self):
+        if self.Hits + self.Misses == 0:
+            return "Tile cache: no lookups."
+        return "Tile cache: " + str(self.Hits) + " hits, " + str(self.Misses) + " misses (" + str((self.Hits * 100) // (self.Hits + self.Misses)) + "% hit rate)."
+
+# --------------------------------------------------------------------------------
+# Metatile atlas and screen composition.
+# --------------------------------------------------------------------------------
+# Instead of cropping and pasting 256 metatiles one at a time for every screen, the metatile sheet gets split up into rows of raw pixel data once.
+# A screen (or an entire map made out of screens) is then built by gathering the matching rows for a grid of IDs and joining them together.
+
+def GetMetatileMask(ScreenFlags):
+    if ScreenFlags == 0x0010 or ScreenFlags == 0x0020:
+        return 0x03FF # 1024 metatiles maximum?
+    elif ScreenFlags == 0x0040:
+        return 0x0FFF # 4096 metatiles maximum.
+    else:
+        return 0x07FF # 2048 metatiles maximum, presumably.
+
+def GetPixelSize(ImageMode):
+    from PIL import Image
+    return len(Image.new(ImageMode, (1, 1)).tobytes())
+
+def SplitBlockRows(PixelData, ImageWidth, BlockSize, BlockCount, PixelSize):
+    # Splits a sheet of square blocks (16 per line for metatiles, one per line for screens) into one list per pixel row, each indexed by block ID.
+    BlocksWide = ImageWidth // BlockSize
+    Stride = ImageWidth * PixelSize
+    RowSize = BlockSize * PixelSize
+    BlockRows = []
+    for r in range(BlockSize):
+        PixelRow = []
+        for ID in range(BlockCount):
+            RowStart = (((ID // BlocksWide) * BlockSize) + r) * Stride + ((ID % BlocksWide) * RowSize)
+            PixelRow.append(PixelData[RowStart:RowStart + RowSize])
+        BlockRows.append(PixelRow)
+    return BlockRows
+
+def LoadMetatileAtlas(SheetImage, MetatileCount, ImageMode='RGBA'):
+    # Converts a "_metatile" sheet into rows of 16x16 blocks covering every possible metatile ID. IDs past the end of the sheet get the same colour an out-of-bounds crop would have.
+    from PIL import Image
+    SheetHeight = ((MetatileCount + 15) // 16) * 16
+    OutOfBounds = SheetImage.crop((0, SheetImage.size[1], 1, SheetImage.size[1] + 1)).convert(ImageMode).getpixel((0, 0))
+    AtlasImage = Image.new(ImageMode, (256, SheetHeight), OutOfBounds)
+    if ImageMode == 'P':
+        AtlasImage.putpalette(SheetImage.getpalette())
+    AtlasImage.paste(SheetImage.convert(ImageMode), (0, 0))
+    return SplitBlockRows(AtlasImage.tobytes(), 256, 16, MetatileCount, GetPixelSize(ImageMode))
+
+def ComposeBlocks(BlockRows, BlockIDs, BlocksWide):
+    # Gathers the blocks listed in BlockIDs (left to right, top to bottom) into a single image's worth of raw pixel data.
+    ComposedRows = []
+    for y in range(0, len(BlockIDs), BlocksWide):
+        RowIDs = BlockIDs[y:y + BlocksWide]
+        for PixelRow in BlockRows:
+            ComposedRows.append(b''.join([PixelRow[ID] for ID in RowIDs]))
+    return b''.join(ComposedRows)
+
+# --------------------------------------------------------------------------------
+# Duplicate output detection.
+# --------------------------------------------------------------------------------
+# Repeated sprite frames and screens (such as the blank screen 0 every .LYR has) get hashed before they're saved, so only the first copy gets encoded and written.
+# The rest get listed in a "duplicates.json" file in the same folder, pointing at the first copy.
+
+def HashPixels(ImageMode, ImageSize, PixelData, ImagePalette=None):
+    PixelHash = hashlib.sha1((ImageMode + " " + str(ImageSize[0]) + "x" + str(ImageSize[1]) + " ").encode('ascii'))
+    PixelHash.update(PixelData)
+    if ImagePalette != None:
+        PixelHash.update(bytes(bytearray(ImagePalette))) # Same pixels with a different palette aren't the same image.
+    return PixelHash.hexdigest()
+
+def HashImage(ImageData):
+    return HashPixels(ImageData.mode, ImageData.size, ImageData.tobytes(), ImageData.getpalette() if ImageData.mode == 'P' else None)
+
+def SaveDuplicates(FolderName, Duplicates):
+    # Duplicates maps each skipped file name to the file name of its first copy, both relative to the folder.
+    outfile = FolderName + '/duplicates.json'
+    with open(outfile, "w") as dupefile:
+        json.dump({'Duplicates': Duplicates}, dupefile, indent=1, sort_keys=True)
+    return outfile
+
+# --------------------------------------------------------------------------------
+# Atlas packing.
+# --------------------------------------------------------------------------------
+# Packs a bunch of rectangles (trimmed sprite frames, usually) into as few sheets as possible. Tallest first, left to right along "shelves", starting a new shelf when a row fills up and a new sheet when a sheet does.
+# Not the tightest packing there is, but it's quick and sprite frames tend to be similar sizes anyway.
+
+def PackRects(RectSizes, SheetSize, Padding=1):
+    # RectSizes is a list of (width, height). Hands back a (sheet, x, y) for each of them (or None for empty ones), along with the size each sheet needs to be.
+    RectSpots = [None] * len(RectSizes)
+    SheetSizes = []
+    ShelfX = 0; ShelfY = 0; ShelfHeight = 0
+    for x in sorted(range(len(RectSizes)), key=lambda x: (-RectSizes[x][1], -RectSizes[x][0], x)):
+        RectWidth, RectHeight = RectSizes[x]
+        if RectWidth == 0 or RectHeight == 0:
+            continue
+        if len(SheetSizes) > 0 and ShelfX > 0 and ShelfX + RectWidth > SheetSize:
+            ShelfX = 0; ShelfY = ShelfY + ShelfHeight + Padding; ShelfHeight = 0 # Row's full, onto the next shelf.
+        if len(SheetSizes) == 0 or (ShelfY > 0 and ShelfY + RectHeight > SheetSize):
+            SheetSizes.append([0, 0]) # Sheet's full (or there isn't one yet), onto the next sheet.
+            ShelfX = 0; ShelfY = 0; ShelfHeight = 0
+        RectSpots[x] = (len(SheetSizes) - 1, ShelfX, ShelfY)
+        SheetSizes[-1][0] = max(SheetSizes[-1][0], ShelfX + RectWidth)
+        SheetSizes[-1][1] = max(SheetSizes[-1][1], ShelfY + RectHeight)
+        ShelfX = ShelfX + RectWidth + Padding
+        ShelfHeight = max(ShelfHeight, RectHeight)
+    return RectSpots, [tuple(UsedSize) for UsedSize in SheetSizes]
+
+# --------------------------------------------------------------------------------
+# Memory-mapped ROM access.
+# --------------------------------------------------------------------------------
+# GBA ROMs can be up to 32 MB, and the scripts read them a couple of bytes at a time. Rather than a seek and read (both system calls) for every single value, the ROM gets memory-mapped once and every read is just a slice of that.
+# The mapping is kept around, so extracting many sprite sets or tilesets from the same ROM in one session only maps it the one time.
+# This works for any file, not just ROMs: ANM-Extract's frame workers each map the source .ANM file (or ROM) here, so the operating system shares the same pages between all of them.
+
+MappedROMs = {}
+
+class MappedFile(object):
+    # Stand-in for an opened file (seek, tell and read work the same way), reading straight out of a memory-mapped ROM. Each MappedFile has its own position, so many of them can share the same mapping.
+    # BaseOffset is where the data starts in the original file, so decompressed data can be read with the same offsets it would have had uncompressed.
+    def __init__(self, FileView, BaseOffset=0):
+        self.View = FileView
+        self.Base = BaseOffset
+        self.Position = BaseOffset
+
+    def seek(self, Offset, Whence=0):
+        if Whence == 1:
+            self.Position = self.Position + Offset
+        elif Whence == 2:
+            self.Position = self.Base + len(self.View) + Offset
+        else:
+            self.Position = Offset
+        return self.Position
+
+    def tell(self):
+        return self.Position
+
+    def read(self, Size=-1):
+        ViewPosition = max(self.Position - self.Base, 0)
+        if Size < 0:
+            FileData = self.View[ViewPosition:]
+        else:
+            FileData = self.View[ViewPosition:ViewPosition + Size] # No copying, this just points into the mapped ROM.
+        self.Position = self.Position + len(FileData)
+        return FileData
+
+    def close(self):
+        pass # The mapping stays open for whoever uses the ROM next.
+
+def OpenROM(ROMName):
+    ROMPath = os.path.abspath(ROMName)
+    ROMStat = os.stat(ROMPath)
+    if ROMPath not in MappedROMs or MappedROMs[ROMPath][0] != (ROMStat.st_size, ROMStat.st_mtime):
+        with open(ROMPath, "rb") as romfile:
+            ROMMap = mmap.mmap(romfile.fileno(), 0, access=mmap.ACCESS_READ)
+        if sys.version_info[0] >= 3:
+            MappedROMs[ROMPath] = ((ROMStat.st_size, ROMStat.st_mtime), memoryview(ROMMap))
+        else:
+            MappedROMs[ROMPath] = ((ROMStat.st_size, ROMStat.st_mtime), ROMMap) # Python 2's struct doesn't take memoryviews, but slicing the mapping works just as well there.
+    return MappedFile(MappedROMs[ROMPath][1])
+
+def RenderFrameJob(SourceName, outfile, FrameArgs, SaveOptions):
+    # Builds (and saves) a single sprite frame in one of ANM-Extract's worker processes. It lives here rather than in ANM-Extract, as worker processes can always import this file by name (the extraction scripts can't be, see LoadExtractScript).
+    # Each worker memory-maps the source file itself, so they all read from the same shared pages instead of being sent the data.
+    ANMScript = LoadExtractScript('ANM')
+    result_image, SpriteTileStart, FrameInfo = ANMScript.RenderFrame(OpenROM(SourceName), *FrameArgs)
+    return ANMScript.FinishFrame(result_image, outfile, ImageSaver(0, *SaveOptions)), FrameInfo # The other workers are already building frames alongside this one.
+
+# --------------------------------------------------------------------------------
+# Re-extraction manifests.
+# --------------------------------------------------------------------------------
+# Every extraction saves a manifest next to what it exported, listing a hash of each file it read (or just its range of the ROM), the settings which change how the output looks, and the files it saved.
+# With "SkipUnchanged" on, an extraction whose inputs and settings match its manifest (with all of its files still there) is skipped, so re-running a whole game after changing one palette only re-exports what that palette touches.
+# Bump ManifestVersion whenever a change to the scripts changes their output, so older manifests stop matching.
+
+ManifestVersion = 1
+
+def HashInput(FileName, Start=0, End=None):
+    if End == None:
+        with open(FileName, "rb") as inputfile:
+            return hashlib.sha1(inputfile.read()).hexdigest()
+    return hashlib.sha1(OpenROM(FileName).View[Start:End]).hexdigest() # Only this file's part of the ROM, read straight out of the mapping.
+
+def AddInput(Inputs, FileName, Start=0, End=None):
+    if End == None:
+        Inputs[FileName] = HashInput(FileName)
+    else:
+        Inputs[FileName + " " + str(hex(Start)) + "-" + str(hex(End))] = HashInput(FileName, Start, End)
+    return Inputs
+
+def CheckManifest(ManifestName, Inputs, Settings):
+    # Hands back the files saved last time if nothing's changed since, otherwise None.
+    if not os.path.exists(ManifestName):
+        return None
+    try:
+        with open(ManifestName, "r") as manifestfile:
+            Manifest = json.load(manifestfile)
+    except ValueError:
+        return None # Broken or half-written, so it doesn't count.
+    if Manifest.get('Version') != ManifestVersion or Manifest.get('Inputs') != Inputs or Manifest.get('Settings') != Settings:
+        return None
+    OutputFiles = [str(outfile) for outfile in Manifest.get('Outputs', [])]
+    for outfile in OutputFiles:
+        if not os.path.exists(outfile):
+            return None
+    return OutputFiles
+
+def SaveManifest(ManifestName, Inputs, Settings, OutputFiles):
+    with open(ManifestName, "w") as manifestfile:
+        json.dump({'Version': ManifestVersion, 'Inputs': Inputs, 'Settings': Settings, 'Outputs': OutputFiles}, manifestfile, indent=1, sort_keys=True)
+    return ManifestName
+
+# --------------------------------------------------------------------------------
+# Stage timing.
+# --------------------------------------------------------------------------------
+# With "Instrument" on, the extraction scripts time each stage of their work (reading the header, loading the palette, decoding tiles, flipping them, pasting them together, saving the PNGs), count how many bytes they read and how many seeks they made, and save it all as a JSON report.
+# With it off, the timer still gets called but doesn't record anything, and files don't get wrapped at all.
+
+class StageTimer(object):
+    def __init__(self, Enabled=False):
+        self.Enabled = Enabled
+        self.StartTime = time.time()
+        self.Stages = OrderedDict() # Seconds spent in each stage, and how many times it ran.
+        self.Counters = OrderedDict()
+        self.Running = {}
+
+    def Start(self, Stage):
+        if self.Enabled == True:
+            self.Running[Stage] = time.time()
+
+    def Stop(self, Stage):
+        if self.Enabled == True:
+            StageTotal = self.Stages.setdefault(Stage, [0.0, 0])
+            StageTotal[0] = StageTotal[0] + (time.time() - self.Running.pop(Stage))
+            StageTotal[1] = StageTotal[1] + 1
+
+    def Count(self, Counter, Amount=1):
+        if self.Enabled == True:
+            self.Counters[Counter] = self.Counters.get(Counter, 0) + Amount
+
+    def Report(self):
+        TotalTime = time.time() - self.StartTime
+        return {'Seconds': TotalTime, 'Stages': OrderedDict((Stage, {'Seconds': StageTotal[0], 'Calls': StageTotal[1]}) for Stage, StageTotal in self.Stages.items()),
+            'Unaccounted': TotalTime - sum(StageTotal[0] for StageTotal in self.Stages.values()), 'Counters': self.Counters}
+
+    def Save(self, ReportName):
+        with open(ReportName, "w") as reportfile:
+            json.dump(self.Report(), reportfile, indent=1)
+        return ReportName
+
+class CountedFile(object):
+    # Stand-in for an opened file (or MappedFile), adding up the bytes read and seeks made through it.
+    def __init__(self, FileObject, Timer):
+        self.File = FileObject
+        self.Timer = Timer
+
+    def seek(self, Offset, Whence=0):
+        self.Timer.Count('Seeks')
+        return self.File.seek(Offset, Whence)
+
+    def tell(self):
+        return self.File.tell()
+
+    def read(self, Size=-1):
+        FileData = self.File.read(Size)
+        self.Timer.Count('BytesRead', len(FileData))
+        return FileData
+
+    def close(self):
+        return self.File.close()
+
+    def __getattr__(self, Name):
+        return getattr(self.File, Name) # Anything else (such as a MappedFile's "View") comes straight from the file.
+
+def CountFile(FileObject, Timer):
+    if Timer.Enabled == True:
+        return CountedFile(FileObject, Timer)
+    return FileObject
+
+# --------------------------------------------------------------------------------
+# Background PNG saving.
+# --------------------------------------------------------------------------------
+# Compressing a PNG takes about as long as building the image in the first place, so rather than waiting on every save before starting the next frame or screen, the images get handed off to a few saving threads.
+# Pillow lets go of the GIL while it compresses, so those threads really do run alongside the script (and each other). Only a couple of images per thread get to wait in line at once, so memory use stays about the same no matter how far ahead the script gets.
+# With "SaveWorkers" at 0, each image gets saved right away instead, same as before.
+
+class ImageSaver(object):
+    def __init__(self, SaveWorkers=0, CompressLevel=6, Optimize=False):
+        self.Options = {'compress_level': CompressLevel, 'optimize': Optimize} # 0 is no compression (fastest), 9 is the most. "Optimize" tries harder still, and ignores the compression level.
+        self.Errors = []
+        self.Threads = []
+        if SaveWorkers > 0:
+            self.Queue = queue.Queue(SaveWorkers * 2)
+            for x in range(SaveWorkers):
+                SaveThread = threading.Thread(target=self.SaveQueued)
+                SaveThread.daemon = True # Doesn't keep Python running if the script stops with an error.
+                SaveThread.start()
+                self.Threads.append(SaveThread)
+
+    def SaveQueued(self):
+        while True:
+            QueuedSave = self.Queue.get()
+            if QueuedSave == None:
+                return
+            try:
+                QueuedSave[0].save(QueuedSave[1], **self.Options)
+            except Exception as Error:
+                self.Errors.append(Error) # Raised from Finish instead, where the script's waiting on it.
+
+    def Save(self, ImageData, FileName):
+        if len(self.Threads) == 0:
+            ImageData.save(FileName, **self.Options)
+        else:
+            self.Queue.put((ImageData, FileName)) # Waits for a free spot if the saving threads have fallen behind.
+
+    def Encode(self, ImageData):
+        # Compresses an image into PNG data without saving it anywhere, for when the same image gets written out more than once.
+        PNGData = io.BytesIO()
+        ImageData.save(PNGData, 'PNG', **self.Options)
+        return PNGData.getvalue()
+
+    def Finish(self):
+        # Waits for everything handed to Save to actually be written.
+        for SaveThread in self.Threads:
+            self.Queue.put(None)
+        for SaveThread in self.Threads:
+            SaveThread.join()
+        self.Threads = []
+        if len(self.Errors) > 0:
+            raise self.Errors[0]
+
+# --------------------------------------------------------------------------------
+# Streaming PNG writing.
+# --------------------------------------------------------------------------------
+# Full maps can be tens of thousands of pixels across, so instead of building the whole map as one image before saving it, it gets written a band of rows at a time.
+# Each band is compressed and written out as soon as it's built, so only one band (plus the screens themselves) is ever in memory, no matter how tall the map is.
+# Rows are stored unfiltered (filter type 0), which is what paletted PNGs normally use anyway. Full-colour ones come out a bit larger than Pillow would make them.
+
+class PNGWriter(object):
+    def __init__(self, FileName, ImageWidth, ImageHeight, ImageMode, ImagePalette=None, Transparency=None, CompressLevel=6):
+        self.File = open(FileName, "wb")
+        self.RowSize = ImageWidth * GetPixelSize(ImageMode)
+        self.RowsLeft = ImageHeight
+        self.Compressor = zlib.compressobj(CompressLevel)
+        self.File.write(b'\x89PNG\r\n\x1a\n')
+        self.WriteChunk(b'IHDR', struct.pack('>LLBBBBB', ImageWidth, ImageHeight, 8, 3 if ImageMode == 'P' else 6, 0, 0, 0)) # 8 bits per channel, colour type 3 (paletted) or 6 (RGBA).
+        if ImageMode == 'P':
+            self.WriteChunk(b'PLTE', bytes(bytearray(ImagePalette[0:768])))
+            if Transparency != None:
+                self.WriteChunk(b'tRNS', bytes(bytearray([255] * Transparency + [0]))) # Every index before the transparent one stays opaque.
+
+    def WriteChunk(self, ChunkType, ChunkData):
+        self.File.write(struct.pack('>L', len(ChunkData)) + ChunkType + ChunkData + struct.pack('>L', zlib.crc32(ChunkType + ChunkData) & 0xFFFFFFFF))
+
+    def Write(self, PixelData):
+        # Adds any number of whole rows of raw pixel data, top to bottom.
+        RowData = bytearray()
+        for RowStart in range(0, len(PixelData), self.RowSize):
+            RowData += b'\x00' + PixelData[RowStart:RowStart + self.RowSize] # Filter type 0 at the start of each row.
+        self.RowsLeft = self.RowsLeft - (len(PixelData) // self.RowSize)
+        CompressedData = self.Compressor.compress(bytes(RowData))
+        if len(CompressedData) > 0:
+            self.WriteChunk(b'IDAT', CompressedData)
+
+    def Close(self):
+        if self.RowsLeft != 0:
+            self.File.close()
+            raise ExtractError("PNG was closed with " + str(self.RowsLeft) + " rows still to go.")
+        self.WriteChunk(b'IDAT', self.Compressor.flush())
+        self.WriteChunk(b'IEND', b'')
+        self.File.close()
+
+# --------------------------------------------------------------------------------
+# LZSS decompression.
+# --------------------------------------------------------------------------------
+# Compressed tilesets (flag 0x0004) use the same LZSS variant as the GBA/DS BIOS: a 0x10 byte and the decompressed size (three bytes), then groups of eight blocks, each group led by a flag byte (highest bit first).
+# A clear bit is a single literal byte, a set bit is two bytes copying 3-18 bytes from up to 4096 bytes back in what's already been decompressed.
+# Whole groups of literals and non-overlapping copies are done as slices rather than one byte at a time, and everything goes into a buffer that's kept around for the next file instead of growing a new one.
+
+LZSSBuffer = [bytearray(0)]
+
+def DecompressLZSS(lzfile):
+    # Decompresses from the current position in "lzfile". Hands back the decompressed data (pointing into the shared buffer, so it's only good until the next call) and how many compressed bytes were used.
+    LZSSHeader = bytearray(lzfile.read(4))
+    if len(LZSSHeader) < 4 or LZSSHeader[0] != 0x10:
+        raise ExtractError("Data is flagged as LZSS-compressed, but doesn't start with an LZSS header. Check to make sure you have the right format value filled in.")
+    OutSize = LZSSHeader[1] | (LZSSHeader[2] << 8) | (LZSSHeader[3] << 16)
+    if len(LZSSBuffer[0]) < OutSize:
+        LZSSBuffer[0] = bytearray(OutSize) # Only ever grows, by replacing it outright (anything still pointing at the old one keeps it alive).
+    OutData = LZSSBuffer[0]
+    InData = bytearray(lzfile.read(OutSize + (OutSize >> 3) + 1)) # Worst case is every block being a literal, plus a flag byte for each group of eight.
+    InPos = 0; OutPos = 0
+    try:
+        while OutPos < OutSize:
+            BlockFlags = InData[InPos]
+            InPos = InPos + 1
+            if BlockFlags == 0 and OutPos + 8 <= OutSize:
+                if InPos + 8 > len(InData):
+                    raise IndexError # A short slice would shrink the buffer instead.
+                OutData[OutPos:OutPos + 8] = InData[InPos:InPos + 8] # Eight literals in a row, the most common case for tile graphics.
+                InPos = InPos + 8; OutPos = OutPos + 8
+                continue
+            for BlockBit in (0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01):
+                if OutPos >= OutSize:
+                    break
+                if BlockFlags & BlockBit == 0:
+                    OutData[OutPos] = InData[InPos]
+                    InPos = InPos + 1; OutPos = OutPos + 1
+                else:
+                    CopyLength = min((InData[InPos] >> 4) + 3, OutSize - OutPos)
+                    CopyFrom = OutPos - (((InData[InPos] & 0x0F) << 8) | InData[InPos + 1]) - 1
+                    if CopyFrom < 0:
+                        raise ExtractError("LZSS data points back past the start of the file, " + str(hex(InPos + 4)) + " bytes into the compressed data. The file is most likely broken, or not actually compressed.")
+                    InPos = InPos + 2
+                    if OutPos - CopyFrom >= CopyLength:
+                        OutData[OutPos:OutPos + CopyLength] = OutData[CopyFrom:CopyFrom + CopyLength]
+                    else:
+                        CopyPattern = OutData[CopyFrom:OutPos] # Overlapping copy, which repeats the last few bytes (a run of the same byte when it's only one back).
+                        OutData[OutPos:OutPos + CopyLength] = (CopyPattern * ((CopyLength // len(CopyPattern)) + 1))[:CopyLength]
+                    OutPos = OutPos + CopyLength
+    except IndexError:
+        raise ExtractError("LZSS data ends early, expected " + str(OutSize) + " bytes but only got " + str(OutPos) + ". The file is most likely broken.")
+    if sys.version_info[0] >= 3:
+        return memoryview(OutData)[:OutSize], InPos + 4
+    return bytes(OutData[:OutSize]), InPos + 4 # Python 2's struct doesn't take memoryviews.
+
+# --------------------------------------------------------------------------------
+# Header probing.
+# --------------------------------------------------------------------------------
+# Checks whether an offset looks like the start of a tileset, sprite set or screen file, using the same header rules the extraction scripts rely on (GBA formats only).
+# Each probe hands back None if the header can't be right. Otherwise it hands back a score out of 100 (how much of the data after the header checks out as well), where the data ends, and a short description.
+
+def ProbeTileset(ROMData, Offset, TSFormat):
+    HeaderSize = 8 if TSFormat > 0 else 6
+    if Offset + HeaderSize + 8 > len(ROMData):
+        return None
+    TilesetFlags, MetatileCount, TileCount = struct.unpack_from('<3H', ROMData, Offset)
+    if TilesetFlags & 0xFFEE != 0 or MetatileCount < 2 or MetatileCount > 4096 or TileCount == 0 or TileCount > 2048:
+        return None # Only 0x0001 and 0x0010 are checked for, compressed tilesets can't be checked this way.
+    TileOffset = Offset + HeaderSize + (MetatileCount * 8)
+    if TilesetFlags & 0x0001 == 1:
+        EndOffset = TileOffset + (TileCount * 0x40)
+    else:
+        EndOffset = TileOffset + (TileCount * 0x20)
+    if EndOffset > len(ROMData):
+        return None
+    MetatileData = struct.unpack_from('<' + str(MetatileCount * 4) + 'H', ROMData, Offset + HeaderSize)
+    if max(MetatileData[0:4]) != 0 or max(MetatileData) == 0:
+        return None # The first metatile is always empty, but the rest shouldn't all be.
+    ValidTiles = len([MetatileFlags for MetatileFlags in MetatileData if MetatileFlags & 0x03FF < TileCount]) # Same tile ID bits at either colour depth, 0x0400 and 0x0800 being the flip flags.
+    return (ValidTiles * 100) // len(MetatileData), EndOffset, str(MetatileCount) + " metatiles, " + str(TileCount) + (" 256-colour" if TilesetFlags & 0x0001 == 1 else " 16-colour") + " tiles"
+
+def ProbeSprites(ROMData, Offset, ANMFormat):
+    TableStart = Offset + (24 if ANMFormat == 1 else 16)
+    if TableStart > len(ROMData):
+        return None
+    FrameFlags, FrameMaxPieces, FrameMaxBytes, FrameTotal = struct.unpack_from('<4H', ROMData, Offset)
+    if FrameFlags not in (0x0000, 0x8000, 0x0F00, 0xFF00) or FrameMaxPieces == 0 or FrameMaxPieces > 128 or FrameTotal == 0 or FrameTotal > 4096:
+        return None
+    SpriteTileStart, SpriteTileSize = struct.unpack_from('<2L', ROMData, TableStart - 8)
+    if ANMFormat == 1:
+        TableEnd = TableStart + (FrameTotal * 10)
+    else:
+        TableEnd = TableStart + (FrameTotal * 12)
+    EndOffset = Offset + SpriteTileStart + SpriteTileSize
+    if Offset + SpriteTileStart < TableEnd or EndOffset > len(ROMData):
+        return None # The tiles have to come after the frame table, and end before the ROM does.
+    if ANMFormat == 1:
+        FrameTable = struct.unpack_from('<' + str(FrameTotal * 2) + 'L' + str(FrameTotal) + 'H', ROMData, TableStart)
+        FrameOffset = FrameTable[0:FrameTotal]; FrameStart = FrameTable[FrameTotal:FrameTotal * 2]; FrameLength = FrameTable[FrameTotal * 2:]
+    else:
+        FrameTable = struct.unpack_from('<' + str(FrameTotal * 3) + 'L', ROMData, TableStart)
+        FrameOffset = FrameTable[0::3]; FrameStart = FrameTable[1::3]; FrameLength = FrameTable[2::3]
+    PieceCountAt = 16 if ANMFormat == 1 else 24 # Where the piece count is in each frame's assembly data, after the bounding boxes.
+    if FrameOffset[0] < TableEnd - Offset or FrameOffset[-1] + PieceCountAt + 2 > SpriteTileStart:
+        return None # Assembly data sits between the frame table and the tiles.
+    for x in range(1, FrameTotal):
+        if FrameOffset[x] < FrameOffset[x - 1]:
+            return None # ...and is stored in frame order.
+    ValidFrames = 0
+    for x in range(FrameTotal):
+        PieceCount = struct.unpack_from('<H', ROMData, Offset + FrameOffset[x] + PieceCountAt)[0]
+        if PieceCount <= FrameMaxPieces and FrameStart[x] + FrameLength[x] <= SpriteTileSize:
+            ValidFrames = ValidFrames + 1
+    return (ValidFrames * 100) // FrameTotal, EndOffset, str(FrameTotal) + " frames, tiles at " + str(hex(Offset + SpriteTileStart))
+
+def ProbeScreens(ROMData, Offset, LYRFormat):
+    HeaderSize = 20 if LYRFormat > 1 else 16
+    if Offset + HeaderSize > len(ROMData):
+        return None
+    ScreenFlags, ScreenWidth, ScreenHeight, ScreenCount = struct.unpack_from('<4H', ROMData, Offset)
+    if ScreenFlags not in (0x0000, 0x0010, 0x0020, 0x0040) or ScreenWidth == 0 or ScreenHeight == 0 or ScreenWidth * ScreenHeight > 4096 or ScreenCount < 2 or ScreenCount > 4096:
+        return None
+    DataStart = Offset + HeaderSize + (ScreenWidth * ScreenHeight * 2)
+    if DataStart > len(ROMData):
+        return None
+    ScreenIDs = struct.unpack_from('<' + str(ScreenWidth * ScreenHeight) + 'H', ROMData, Offset + HeaderSize)
+    if LYRFormat == 0 and DataStart % 4 != 0:
+        DataStart = DataStart + 2 # Same re-alignment as in "WayForward_LYR-Extract".
+    if LYRFormat > 2:
+        ScreenUnkCountA, ScreenUnkCountB, ScreenUnkCountC = struct.unpack_from('<3H', ROMData, Offset + 8)
+        DataStart = DataStart + (ScreenWidth * ScreenHeight * 4) + (ScreenUnkCountA * 20) + (ScreenUnkCountB * 8) + (ScreenUnkCountC * 16)
+    EndOffset = DataStart + (ScreenCount * 512)
+    if EndOffset > len(ROMData) or max(ScreenIDs) == 0:
+        return None # A map made entirely out of blank screens isn't worth listing.
+    ValidScreens = len([ScreenID for ScreenID in ScreenIDs if ScreenID < ScreenCount])
+    Score = (ValidScreens * 90) // len(ScreenIDs)
+    if bytearray(ROMData[DataStart:DataStart + 512]) == bytearray(512):
+        Score = Score + 10 # The first screen is always blank.
+    ScreenTilesetID = struct.unpack_from('<H', ROMData, Offset + (12 if LYRFormat == 0 else (14 if LYRFormat == 1 else 18)))[0]
+    return Score, EndOffset, str(ScreenWidth) + "x" + str(ScreenHeight) + " map, " + str(ScreenCount) + " screens, tileset ID " + str(ScreenTilesetID)
+
+def ReadHeader(FileType, FileData, Offset, FileFormat):
+    # Reads the header values the extraction scripts use, for any format (not just GBA ones). Offset has to skip the Didj palette block on unpacked Didj files.
+    if FileType == 'TS':
+        HeaderFields = dict(zip(('TilesetFlags', 'MetatileCount', 'TileCount'), struct.unpack_from('<3H', FileData, Offset)))
+        if FileFormat > 0:
+            HeaderFields['MetatileUnk'] = struct.unpack_from('<H', FileData, Offset + 6)[0]
+    elif FileType == 'ANM':
+        HeaderFields = dict(zip(('FrameFlags', 'FrameMaxPieces', 'FrameMaxBytes', 'FrameTotal'), struct.unpack_from('<4H', FileData, Offset)))
+        HeaderFields['SpriteTileStart'], HeaderFields['SpriteTileSize'] = struct.unpack_from('<2L', FileData, Offset + (16 if FileFormat == 1 else 8))
+    else:
+        HeaderFields = dict(zip(('ScreenFlags', 'ScreenWidth', 'ScreenHeight', 'ScreenCount'), struct.unpack_from('<4H', FileData, Offset)))
+        if FileFormat == 0:
+            HeaderFields['ScreenTypesID'], HeaderFields['ScreenTilesetID'] = struct.unpack_from('<2H', FileData, Offset + 10)
+        elif FileFormat == 1:
+            HeaderFields['ScreenTypesID'], HeaderFields['ScreenTilesetID'] = struct.unpack_from('<H2xH', FileData, Offset + 10)
+        else:
+            HeaderFields['ScreenTypesID'], HeaderFields['ScreenTilesetID'] = struct.unpack_from('<H2xH', FileData, Offset + 14)
+    return HeaderFields
+
+# --------------------------------------------------------------------------------
+# ROM scanning.
+# --------------------------------------------------------------------------------
+# Rather than probing all eight million or so offsets in a 32 MB ROM one by one, each type has a pattern built from its header rules (flag values, and counts which can't be zero or too large), searched for across the entire ROM in one go.
+# Only the offsets matching that pattern (and ending in 0, 4, 8 or C) get probed properly.
+
+AnyCount = b'(?:[\x01-\xff][\x00-\x0f]|\x00[\x01-\x0f])' # Any 16-bit value from 1 to 4095.
+AnyTileCount = b'(?:[\x01-\xff][\x00-\x07]|\x00[\x01-\x07])' # Any 16-bit value from 1 to 2047.
+
+def GetScanPatterns(TSFormat, ANMFormat, LYRFormat, ScanTypes=('TS', 'ANM', 'LYR')):
+    # Lookahead patterns, so that every offset gets a chance to match and not just the ones after the previous match.
+    ScanPatterns = []
+    if 'TS' in ScanTypes:
+        ScanPatterns.append(('TS', ProbeTileset, TSFormat, b'[\x00\x01\x10\x11]\x00' + AnyCount + AnyTileCount + (b'..' if TSFormat > 0 else b'') + b'\x00{8}')) # Flags, metatile count, tile count, then the empty first metatile.
+    if 'ANM' in ScanTypes:
+        ScanPatterns.append(('ANM', ProbeSprites, ANMFormat, b'\x00[\x00\x80\x0f\xff][\x01-\x80]\x00..' + AnyCount + (b'.{8}' if ANMFormat == 1 else b'') + b'...\x00...\x00')) # Flags, most pieces in a frame, most tile bytes, frame count, then the tile offset and size.
+    if 'LYR' in ScanTypes:
+        ScanPatterns.append(('LYR', ProbeScreens, LYRFormat, b'[\x00\x10\x20\x40]\x00[\x01-\xff]\x00[\x01-\xff]\x00' + AnyCount)) # Flags, map width, map height, screen count.
+    return [(FileType, Probe, FileFormat, re.compile(b'(?=' + Pattern + b')', re.DOTALL)) for FileType, Probe, FileFormat, Pattern in ScanPatterns]
+
+def ScanROM(ROMData, TSFormat, ANMFormat, LYRFormat, ScanTypes=('TS', 'ANM', 'LYR'), MinScore=75):
+    # Hands back every candidate scoring at least "MinScore", along with how many offsets matched each pattern and how long they took to check.
+    Candidates = []; ScanStats = []
+    for FileType, Probe, FileFormat, Pattern in GetScanPatterns(TSFormat, ANMFormat, LYRFormat, ScanTypes):
+        StartTime = time.time()
+        Matched = 0
+        for Match in Pattern.finditer(ROMData):
+            Offset = Match.start()
+            if Offset & 3 != 0:
+                continue # Everything starts on a multiple of 4.
+            Matched = Matched + 1
+            Result = Probe(ROMData, Offset, FileFormat)
+            if Result != None and Result[0] >= MinScore:
+                Candidates.append({'Type': FileType, 'Format': FileFormat, 'Offset': Offset, 'Score': Result[0], 'End': Result[1], 'Info': Result[2]})
+        ScanStats.append((FileType, Matched, time.time() - StartTime))
+    return Candidates, ScanStats
+
+def RankCandidates(Candidates):
+    # Highest score first, then the largest (real files tend to be bigger than lucky matches). Anything starting inside an already accepted candidate is dropped, since tile graphics can easily look like a header by chance.
+    Candidates = sorted(Candidates, key=lambda Candidate: (-Candidate['Score'], -(Candidate['End'] - Candidate['Offset']), Candidate['Offset']))
+    Ranked = []; TakenStarts = []; TakenEnds = []
+    for Candidate in Candidates:
+        x = bisect.bisect_right(TakenStarts, Candidate['Offset'])
+        if x > 0 and Candidate['Offset'] < TakenEnds[x - 1]:
+            continue
+        TakenStarts.insert(x, Candidate['Offset']); TakenEnds.insert(x, Candidate['End'])
+        Ranked.append(Candidate)
+    return Ranked
+
+# --------------------------------------------------------------------------------
+# Format detection.
+# --------------------------------------------------------------------------------
+# Works out which "TSFormat", "ANMFormat" or "LYRFormat" value fits a file, by reading its header and offset tables the way each format would and scoring how well the rest of the file agrees.
+# Unpacked files also have to end exactly where the format says they should, which is what tells apart formats with headers only a couple of bytes different.
+# Each check hands back None if the format can't be right at all, otherwise a score out of 100. Inside a GBA ROM, only the GBA formats are tried and the file size can't be checked.
+
+FormatRanges = {'TS': range(0, 5), 'ANM': range(0, 7), 'LYR': range(0, 4)}
+ROMFormatRanges = {'TS': range(0, 2), 'ANM': range(0, 3), 'LYR': range(0, 3)}
+PieceShapes = {0x0000: (1, 1), 0x0400: (2, 1), 0x0800: (1, 2), 0x1000: (2, 2), 0x1400: (4, 1), 0x1800: (1, 4), 0x2000: (4, 4), 0x2400: (4, 2), 0x2800: (2, 4), 0x3000: (8, 8), 0x3400: (8, 4), 0x3800: (4, 8)} # Same piece sizes (in tiles) as "WayForward_ANM-Extract".
+
+def SizeScore(EndOffset, FileSize):
+    # Full marks for ending right at the end of the file, some for being a few bytes of padding short.
+    if EndOffset == FileSize:
+        return 1.0
+    elif EndOffset < FileSize and FileSize - EndOffset < 4:
+        return 0.5
+    return 0.0
+
+def ScoreTilesetFormat(FileData, Offset, TSFormat, Unpacked=True):
+    Start = Offset + (0x200 if TSFormat == 3 and Unpacked == True else 0) # Didj files have their palette first.
+    HeaderSize = 6 if TSFormat == 0 else 8
+    if Start + HeaderSize > len(FileData):
+        return None
+    TilesetFlags, MetatileCount, TileCount = struct.unpack_from('<3H', FileData, Start)
+    if TilesetFlags & 0xFFEA != 0 or MetatileCount == 0:
+        return None
+    if TSFormat == 2 or TSFormat == 3:
+        MetatileSize = 16; TileMask = 0xFFFF
+    elif TSFormat == 4:
+        MetatileSize = 12; TileMask = 0xFFFF # Four tile IDs, then four tile flip bytes.
+    else:
+        MetatileSize = 8; TileMask = 0x03FF
+    if TSFormat == 4:
+        TileSize = 0x80 # Leapster tiles are always ARGB4444.
+    elif TilesetFlags & 0x0001 == 1:
+        TileSize = 0x40
+    else:
+        TileSize = 0x20
+    DataSize = (MetatileCount * MetatileSize) + (TileCount * TileSize)
+    if TilesetFlags & 0x0004 == 0x0004:
+        LZSSHeader = bytearray(FileData[Start + HeaderSize:Start + HeaderSize + 4])
+        if len(LZSSHeader) < 4 or LZSSHeader[0] != 0x10 or (LZSSHeader[1] | (LZSSHeader[2] << 8) | (LZSSHeader[3] << 16)) != DataSize:
+            return None # Everything after the header is compressed, so all there is to go on is the decompressed size.
+        return 100
+    EndOffset = Start + HeaderSize + DataSize
+    if EndOffset > len(FileData):
+        return None
+    if TSFormat == 2 or TSFormat == 3:
+        TileIDs = struct.unpack_from('<' + str(MetatileCount * 4) + 'L', FileData, Start + HeaderSize)
+    else:
+        TileIDs = struct.unpack_from('<' + str(MetatileCount * 4) + 'H', FileData, Start + HeaderSize)
+    ValidTiles = len([TileID for TileID in TileIDs if TileID & TileMask < TileCount or (TSFormat == 3 and TileID & 0xFFFF == 0xCCCC)])
+    if Unpacked == False:
+        return (ValidTiles * 100) // len(TileIDs)
+    return int(((ValidTiles * 50.0) / len(TileIDs)) + (SizeScore(EndOffset, len(FileData)) * 50))
+
+def ScoreSpriteFormat(FileData, Offset, ANMFormat, Unpacked=True):
+    Start = Offset + (0x200 if ANMFormat == 5 and Unpacked == True else 0) # Didj files have their palette first, but their offsets still count from the very beginning.
+    TableStart = Start + (24 if ANMFormat == 1 else 16)
+    if TableStart > len(FileData):
+        return None
+    FrameFlags, FrameMaxPieces, FrameMaxBytes, FrameTotal = struct.unpack_from('<4H', FileData, Start)
+    SpriteTileStart, SpriteTileSize = struct.unpack_from('<2L', FileData, TableStart - 8)
+    if FrameFlags not in (0x0000, 0x8000, 0x0F00, 0xFF00) or FrameTotal == 0:
+        return None
+    TableEnd = TableStart + (FrameTotal * (10 if ANMFormat == 1 else 12))
+    TileStart = Offset + SpriteTileStart
+    EndOffset = TileStart + SpriteTileSize
+    if TileStart < TableEnd or EndOffset > len(FileData):
+        return None
+    if ANMFormat == 1:
+        FrameTable = struct.unpack_from('<' + str(FrameTotal * 2) + 'L', FileData, TableStart)
+        FrameOffset = FrameTable[0:FrameTotal]; FrameStart = FrameTable[FrameTotal:]
+        BoundsSize = 16
+    else:
+        FrameTable = struct.unpack_from('<' + str(FrameTotal * 3) + 'L', FileData, TableStart)
+        FrameOffset = FrameTable[0::3]; FrameStart = FrameTable[1::3]
+        BoundsSize = 32 if ANMFormat == 3 or ANMFormat == 5 else (56 if ANMFormat == 4 else 24) # Same bounding box sizes as "WayForward_ANM-Extract".
+    ValidFrames = 0
+    for x in range(FrameTotal):
+        FrameAt = Offset + FrameOffset[x]
+        if FrameAt < TableEnd or FrameAt + BoundsSize + 2 > TileStart:
+            continue # Assembly data sits between the frame table and the tiles.
+        PieceCount = struct.unpack_from('<H', FileData, FrameAt + BoundsSize)[0]
+        FrameEnd = FrameAt + BoundsSize + 2 + (PieceCount * 6)
+        NextFrameAt = Offset + FrameOffset[x + 1] if x + 1 < FrameTotal else TileStart
+        if PieceCount > FrameMaxPieces or FrameEnd > NextFrameAt or NextFrameAt - FrameEnd > 3:
+            continue # Frames are packed one after another, with at most a little padding in between.
+        Pieces = struct.unpack_from('<' + str(PieceCount) + 'H', FileData, FrameEnd - (PieceCount * 2))
+        if ANMFormat == 6:
+            if PieceCount == 1 and Pieces[0] & 0x00FF != 0 and Pieces[0] & 0xFF00 != 0:
+                ValidFrames = ValidFrames + 1 # Leapster frames are a single piece, with a width and height in pixels.
+            continue
+        ValidPieces = 0
+        for PieceFlags in Pieces:
+            if ANMFormat == 1:
+                PieceTile = PieceFlags & 0x00FF; PieceSize = (PieceFlags & 0x1F00) << 2
+            elif ANMFormat == 2:
+                PieceTile = PieceFlags & 0x007F; PieceSize = (PieceFlags & 0x0F80) << 3
+            else:
+                PieceTile = PieceFlags & 0x03FF; PieceSize = PieceFlags & 0xFC00
+            if PieceSize & 0x3C00 in PieceShapes:
+                PieceWidth, PieceHeight = PieceShapes[PieceSize & 0x3C00]
+                if FrameStart[x] + (PieceTile * 32) + (PieceWidth * PieceHeight * (0x40 if PieceSize & 0x8000 == 0x8000 or FrameFlags == 0x8000 else 0x20)) <= SpriteTileSize:
+                    ValidPieces = ValidPieces + 1 # Every piece's tiles have to be inside the tile data.
+        if ValidPieces == PieceCount:
+            ValidFrames = ValidFrames + 1
+    if Unpacked == False:
+        return (ValidFrames * 100) // FrameTotal
+    return int(((ValidFrames * 80.0) / FrameTotal) + (SizeScore(EndOffset, len(FileData)) * 20))
+
+def ScoreScreenFormat(FileData, Offset, LYRFormat, Unpacked=True):
+    HeaderSize = 20 if LYRFormat > 1 else 16
+    if Offset + HeaderSize > len(FileData):
+        return None
+    ScreenFlags, ScreenWidth, ScreenHeight, ScreenCount = struct.unpack_from('<4H', FileData, Offset)
+    if ScreenWidth == 0 or ScreenHeight == 0 or ScreenCount == 0:
+        return None
+    DataStart = Offset + HeaderSize + (ScreenWidth * ScreenHeight * 2)
+    if DataStart > len(FileData):
+        return None
+    ScreenIDs = struct.unpack_from('<' + str(ScreenWidth * ScreenHeight) + 'H', FileData, Offset + HeaderSize)
+    if LYRFormat == 0 and (DataStart - Offset) % 4 != 0:
+        DataStart = DataStart + 2 # Same re-alignment as in "WayForward_LYR-Extract".
+    if LYRFormat > 2:
+        ScreenUnkCountA, ScreenUnkCountB, ScreenUnkCountC = struct.unpack_from('<3H', FileData, Offset + 8)
+        DataStart = DataStart + (ScreenWidth * ScreenHeight * 4) + (ScreenUnkCountA * 20) + (ScreenUnkCountB * 8) + (ScreenUnkCountC * 16)
+    EndOffset = DataStart + (ScreenCount * 512) # Every screen is 16x16 metatile IDs.
+    if EndOffset > len(FileData):
+        return None
+    Score = (len([ScreenID for ScreenID in ScreenIDs if ScreenID < ScreenCount]) * 30.0) / len(ScreenIDs)
+    if bytearray(FileData[DataStart:DataStart + 512]) == bytearray(512):
+        Score = Score + 10 # The first screen is always blank.
+    if LYRFormat > 1 or (struct.unpack_from('<H', FileData, Offset + 14)[0] == 0xCCCC) == (LYRFormat == 0):
+        Score = Score + 10 # The Scorpion King ends its header with 0xCCCC, where format 1 has the tileset ID.
+    if Unpacked == False:
+        return int(Score * 2)
+    return int(Score + (SizeScore(EndOffset, len(FileData)) * 50))
+
+def DetectFormat(FileType, FileData, Offset=0, Unpacked=True):
+    # Hands back the best fitting format (or None if nothing fits), along with every format's score.
+    FormatScore = {'TS': ScoreTilesetFormat, 'ANM': ScoreSpriteFormat, 'LYR': ScoreScreenFormat}[FileType]
+    Scores = {}
+    for FileFormat in (FormatRanges[FileType] if Unpacked == True else ROMFormatRanges[FileType]):
+        try:
+            Scores[FileFormat] = FormatScore(FileData, Offset, FileFormat, Unpacked)
+        except struct.error:
+            Scores[FileFormat] = None # Tables running off the end of the file.
+    Fitting = [FileFormat for FileFormat in Scores if Scores[FileFormat] != None]
+    if len(Fitting) == 0:
+        return None, Scores
+    return max(Fitting, key=lambda FileFormat: (Scores[FileFormat], -FileFormat)), Scores
+
+def ChooseFormat(FileType, FileData, Offset, FileFormat, AutoDetect, Unpacked=True):
+    # Picks the format to use. With "AutoDetect" on, that's the best scoring one. Otherwise the one filled in gets used as-is, with a warning if another one fits the file clearly better.
+    FormatName = {'TS': 'TSFormat', 'ANM': 'ANMFormat', 'LYR': 'LYRFormat'}[FileType]
+    BestFormat, Scores = DetectFormat(FileType, FileData, Offset, Unpacked)
+    ScoreList = ", ".join([str(x) + ": " + (str(Scores[x]) if Scores[x] != None else "-") for x in sorted(Scores)])
+    if AutoDetect == True:
+        if BestFormat == None or Scores[BestFormat] < 50:
+            raise ExtractError("Couldn't work out the " + FormatName + " value for this file (scores " + ScoreList + "). Set AutoDetect = False and fill it in from the list instead.")
+        print("Detected " + FormatName + " = " + str(BestFormat) + " (scores " + ScoreList + ").")
+        TiedFormats = [str(x) for x in sorted(Scores) if x != BestFormat and Scores[x] == Scores[BestFormat]]
+        if len(TiedFormats) > 0:
+            print("WARNING: " + FormatName + " = " + " / ".join(TiedFormats) + " fit this file just as well. If the output looks wrong, set AutoDetect = False and fill in the value from the list instead.")
+        return BestFormat
+    if BestFormat != None and BestFormat != FileFormat and Scores[BestFormat] >= 50 and (Scores.get(FileFormat) == None or Scores[BestFormat] - Scores[FileFormat] >= 20):
+        print("WARNING: " + FormatName + " = " + str(FileFormat) + " doesn't look right for this file, " + FormatName + " = " + str(BestFormat) + " fits it better (scores " + ScoreList + "). Set AutoDetect = True to use that instead.")
+    return FileFormat
+
+# --------------------------------------------------------------------------------
+# Colour conversion.
+# --------------------------------------------------------------------------------
+# Palettes (BGR555) and Leapster graphics (ARGB4444) are converted through lookup tables, built once for each "RawPalette" setting and reused afterwards.
+# RawPalette = True keeps the values as multiples of 8 (BGR555) or 16 (ARGB4444), RawPalette = False stretches them to a 255 maximum like most emulators would display.
+
+BGR555Tables = {}
+ARGB4444Tables = {}
+
+def GetBGR555Table(RawPalette):
+    # 65536 entries, one RGB triplet for every possible palette value (the unused top bit is ignored).
+    if RawPalette not in BGR555Tables:
+        ChannelValues = []
+        for x in range(32):
+            if RawPalette == True:
+                ChannelValues.append(x * 8)
+            else:
+                ChannelValues.append((x * 8) + (((x * 8) + 1) // 32))
+        ColourTable = []
+        for x in range(32768):
+            ColourTable.append(bytes(bytearray((ChannelValues[x & 0x001F], ChannelValues[(x & 0x03E0) >> 5], ChannelValues[(x & 0x7C00) >> 10]))))
+        BGR555Tables[RawPalette] = ColourTable + ColourTable
+    return BGR555Tables[RawPalette]
+
+def ConvertBGR555(PaletteData, RawPalette):
+    # Converts a block of BGR555 palette values (two bytes apiece) into RGB values, ready for putpalette.
+    ColourTable = GetBGR555Table(RawPalette)
+    return b''.join([ColourTable[PaletteBytes] for PaletteBytes in struct.unpack('<' + str(len(PaletteData) // 2) + 'H', PaletteData[:(len(PaletteData) // 2) * 2])])
+
+def ReadPalette(palfile, RawPalette):
+    # Reads a full 256-colour palette (0x200 bytes) from wherever the file currently is.
+    return ConvertBGR555(palfile.read(0x200), RawPalette)
+
+def GrayscalePalette():
+    return bytes(bytearray(x for x in range(256) for y in range(3)))
+
+def GetARGB4444Tables(RawPalette):
+    # ARGB4444 splits cleanly along byte boundaries (alpha and red in the upper byte, green and blue in the lower one), so four 256-entry tables cover every channel.
+    if RawPalette not in ARGB4444Tables:
+        if RawPalette == True:
+            ChannelValues = [x * 16 for x in range(16)]
+        else:
+            ChannelValues = [x + (x * 16) for x in range(16)]
+        RedTable = bytes(bytearray(ChannelValues[x & 0x0F] for x in range(256))) # Second "nibble" is the red value.
+        GreenTable = bytes(bytearray(ChannelValues[(x & 0xF0) >> 4] for x in range(256))) # Third "nibble" is the green value.
+        BlueTable = bytes(bytearray(ChannelValues[x & 0x0F] for x in range(256))) # Fourth "nibble" is the blue value.
+        AlphaTable = bytes(bytearray(255 - (((x & 0xF0) >> 4) * 17) for x in range(256))) # First "nibble" is the alpha value. The alpha value is inverted, so we need to fix that.
+        ARGB4444Tables[RawPalette] = (RedTable, GreenTable, BlueTable, AlphaTable)
+    return ARGB4444Tables[RawPalette]
+
+def ConvertARGB4444(PixelData, RawPalette):
+    # Converts any amount of Leapster ARGB4444 pixels (two bytes apiece) into RGBA, one table lookup per channel for the whole run.
+    RedTable, GreenTable, BlueTable, AlphaTable = GetARGB4444Tables(RawPalette)
+    PixelData = bytearray(PixelData)
+    LowBytes = PixelData[0::2]; HighBytes = PixelData[1::2]
+    PixelColours = bytearray(len(LowBytes) * 4)
+    PixelColours[0::4] = HighBytes.translate(RedTable)
+    PixelColours[1::4] = LowBytes.translate(GreenTable)
+    PixelColours[2::4] = LowBytes.translate(BlueTable)
+    PixelColours[3::4] = HighBytes.translate(AlphaTable)
+    return PixelColours
@@ -4,20 +4,33 @@ import platform
 import glob
 import struct
 from PIL import Image
+from WayForward_Common import ExtractError, GetMetatileMask, GetPixelSize, LoadMetatileAtlas, ComposeBlocks, OpenROM, HashPixels, SaveDuplicates, AddInput, CheckManifest, SaveManifest, ChooseFormat, StageTimer, CountFile, ImageSaver, PNGWriter
 
 # WayForward GBA/DS/LeapFrog Didj/Leapster screen / map (*.LYR) extraction script written by Random Talking Bush.
 # Based only slightly on onepill's TextureUnpacker script: https://github.com/onepill/texture_unpacker_scirpt
 
 LYRFormat = 0 # See the list below for which value should be used for the game you're ripping from.
+AutoDetect = False # Set this to True to work out the "LYRFormat" value from the .LYR itself instead, by checking which format its header and screen data make the most sense for. Even when this is False, the script warns if the file looks like it's in a different format.
 MetatilesName = "BrambleMaze" # PNG exported from my "WayForward_TS-Extract" script, minus the "_metatile" suffix. If a PNG matching the .LYR's internal tileset ID is autodetected (such as "311_metatile.png", useful for pairing GBA .LYR files), that will be used instead.
 ScreenName = "366" # Filename of .LYR file, minus extension. Ignored when UseGBAROM is True. (Example: "366" will be the first foreground layer of the Bramble Maze when using my QuickBMS script to unpack Shantae Advance: Risky Revolution.)
 
 UseGBAROM = False # Change this to true to read from a GBA ROM instead of a .LYR file. Make sure both the "ROMName" and "ScreenStart" lines below are filled in correctly.
 ROMName = "Shantae.gba" # GBA ROM file needed to extract map data. Ignored when UseGBAROM is False.
 ScreenStart = 0x96B074 # Offset to the start of the screen data in a GBA ROM. Ignored when UseGBAROM is False. (Example: "0x96B074" will be the first foreground layer of the Bramble Maze in Shantae Advance: Risky Revolution.)
+SaveScreens = True # Set this to False to skip exporting each individual screen as its own PNG, and only export the assembled "Full.png" map. The screens are kept in memory for the map either way.
+SkipDuplicates = False # Set this to True to only save the first copy of screens which come out exactly the same (pixel for pixel), such as the empty screens most layers have. The skipped ones get listed in a "duplicates.json" file, pointing at the screen they're a copy of. Ignored if SaveScreens = False.
+IndexedColour = True # Set this to False to export the screens and map as full-colour (RGBA) PNGs, like older versions of this script did. Otherwise they keep the metatile image's palette, which takes a quarter of the memory and makes for much smaller files. Leapster metatile images are full-colour already, so they're always exported that way.
+SaveFullMap = True # Set this to False to skip exporting the assembled "Full.png" map, such as when only the tiles below are needed.
+SaveTiles = False # Set this to True to also export the map as a zoomable tile pyramid: a "Full.dzi" file and a "Full_files" folder of 256x256 tiles (one per screen at full size) along with smaller versions for zooming out. Viewers like OpenSeadragon load only the tiles on screen, instead of the whole map at once.
+SaveWorkers = 2 # How many PNGs to compress at the same time, in the background while the next screens are being built. Set this to 0 to save each screen before moving on to the next one.
+CompressLevel = 6 # How hard to compress the PNGs, from 0 (fastest to save, largest files) to 9 (slowest to save, smallest files). The images themselves come out the same either way. Most of the time goes into the full map, so this makes the biggest difference there.
+OptimizePNG = False # Set this to True to squeeze the PNGs down as small as they'll go, which takes a while longer to save. Handy for a final export, not so much while trying out settings.
+SkipUnchanged = False # Set this to True to skip re-exporting the map if neither its files (including the metatile image) nor the settings above have changed since last time. Each export saves a "manifest.json" file in the map's folder, recording what it was made from.
+Instrument = False # Set this to True to time each stage of the export (header, loading the metatiles, building the screens and the full map, and saving) and count the bytes read and seeks made, saved as a "timing.json" file in the map's folder.
 
 # Instructions on how to use this script:
 # 1. Install both Python (either 2 or 3, both work) and Pillow: https://github.com/python-pillow/Pillow
+# 1B. Keep the "WayForward_Common.py" file in the same folder as this script, it contains functions shared between all of the extraction scripts.
 # 2. If ripping from a GBA game, use QuickBMS (https://aluigi.altervista.org/quickbms.htm) and one of my "WayForwardGBA" scripts (https://github.com/RandomTBush/RTB-QuickBMS-Scripts/tree/master/Archive) to unpack the game you want to rip from. For DS or Didj games, you can use something like Tinke to unpack the former and 7-Zip for the latter.
 # 3. Use my "WayForward_TS-Extract" script first to set up the "metatile" sheet to be used with this script.
 # 4. For a .LYR file, set the UseGBAROM option to False. Change the path for the "ScreenName" entry above to the name of the .LYR file you want to extract (if UseGBAROM = False, otherwise see the section below), and the "MetatilesName" with the name of the metatile image generated with step #3.
@@ -26,6 +39,7 @@ ScreenStart = 0x96B074 # Offset to the start of the screen data in a GBA ROM. Ig
 # ROM-file ripping (for experts):
 # 4B. Set the UseGBAROM option to True, change the name for the "ROMName" entry to match the GBA ROM you want to try extracting a screen / map file from (eg. "Shantae.gba", it can either be a relative name or a full path), and the "MetatilesName" entry to the name of the extracted metatiles PNG (see step #3 in the previous section).
 # 4C. Locate the start of the screen information in the GBA ROM. It's harder to explain compared to the .ANM sprites and .TS4/.TS8 tilesets, so just look at the example offset above for Shantae Advance or any other .LYR files to get a general idea of what you're looking for there, and fill in the "ScreenStart" value above accordingly.
+# 4D. Alternatively, run my "WayForward_ROM-Scan" script on the ROM first. It lists every offset that looks like the start of a file, best matches first, so you can copy one of the "ScreenStart" offsets marked LYR straight from there.
 
 # Troubleshooting:
 # If the script throws an error or doesn't export anything, check to make sure that the "LYRFormat", "MetatilesName" and "ScreenName" entries are filled in correctly. If UseGBAROM = True, double-check in a hex editor to make sure you have the right offset set up for "ScreenStart" (it tends to start with 0x0000, 0x0010, 0x0020 or 0x0040), and ends in either 0, 4, 8 or C. Shift it forward or backward by 4 at a time if you need to.
@@ -94,127 +108,278 @@ ScreenStart = 0x96B074 # Offset to the start of the screen data in a GBA ROM. Ig
 # --------------------------------------------------------------------------------
 # Everything below this line should be left alone.
 
-if UseGBAROM == False:
-    if not os.path.exists(ScreenName + ".lyr"):
-        print("Can't find '" + ScreenName + ".lyr'. Check to make sure you filled in the 'ScreenName' entry correctly.")
-        os.system('pause')
-        exit()
-    else:
-        scrfile = open(ScreenName + '.lyr', "rb") # .LYR file
-        scrfile.seek(0, 0) # Start at the top of the .LYR file.
-        if not os.path.exists(ScreenName):
-            os.makedirs(ScreenName) # If the folder doesn't exist, then make it.
-else:
-    if not os.path.exists(ROMName):
-        print("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
-        os.system('pause')
-        exit()
-    else:
-        scrfile = open(ROMName, "rb") # .GBA ROM file
-        scrfile.seek(ScreenStart, 0) # Start at the "ScreenStart" offset above.
-        if not os.path.exists(str(ScreenStart)):
-            os.makedirs(str(ScreenStart)) # We'll use the offset as the folder name for Risky Revolution.
-
-ScreenFlags = struct.unpack('<H', scrfile.read(2))[0] # Flags. 0x0010, 0x0020 and 0x0040 exist. TODO: Figure out the context of 0x0020.
-ScreenWidth = struct.unpack('<H', scrfile.read(2))[0] # How many screens wide is the map.
-ScreenHeight = struct.unpack('<H', scrfile.read(2))[0] # How many screens tall is the map.
-ScreenCount = struct.unpack('<H', scrfile.read(2))[0] # How many unique screens are in the map. First screen is always blank, so two is technically the minimum unless it's empty.
-if LYRFormat == 0:
-    ScreenUnkA = struct.unpack('<H', scrfile.read(2))[0] # Count?
-    ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
-    ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
-    ScreenUnkD = struct.unpack('<H', scrfile.read(2))[0] # Always 0xCCCC?
-elif LYRFormat == 1:
-    ScreenUnkA = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
-    ScreenUnkC = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
-else:
-    ScreenUnkCountA = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenUnkCountB = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenUnkCountC = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
-    ScreenUnkIDB = struct.unpack('<H', scrfile.read(2))[0] # ???
-    ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
-
-if not os.path.exists(str(ScreenTilesetID) + '_metatile.png'):
-    if not os.path.exists(MetatilesName + '_metatile.png'):
-        print("Can't find metatile image '" + MetatilesName + "_metatile.png'. Run the 'WayForward_TS-Extract' script to generate one first, or correct the 'MetatilesName' entry if you already did.")
-        os.system('pause')
-        exit()
+def ReadScreenHeader(scrfile, LYRFormat):
+    # Reads the map's header and which screen goes in each section, leaving the file at the start of the first screen.
+    ScreenFlags = struct.unpack('<H', scrfile.read(2))[0] # Flags. 0x0010, 0x0020 and 0x0040 exist. TODO: Figure out the context of 0x0020.
+    ScreenWidth = struct.unpack('<H', scrfile.read(2))[0] # How many screens wide is the map.
+    ScreenHeight = struct.unpack('<H', scrfile.read(2))[0] # How many screens tall is the map.
+    ScreenCount = struct.unpack('<H', scrfile.read(2))[0] # How many unique screens are in the map. First screen is always blank, so two is technically the minimum unless it's empty.
+    if LYRFormat == 0:
+        ScreenUnkA = struct.unpack('<H', scrfile.read(2))[0] # Count?
+        ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
+        ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
+        ScreenUnkD = struct.unpack('<H', scrfile.read(2))[0] # Always 0xCCCC?
+    elif LYRFormat == 1:
+        ScreenUnkA = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
+        ScreenUnkC = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
     else:
-        sprfile = Image.open(MetatilesName + '_metatile.png') # Open the metatiles file which matches the "MetatilesName" entry above.
-else:
-    sprfile = Image.open(str(ScreenTilesetID) + '_metatile.png') # Override the "MetatilesName" entry above if it finds a matching ID. Helpful for GBA games.
+        ScreenUnkCountA = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenUnkCountB = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenUnkCountC = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenTypesID = struct.unpack('<H', scrfile.read(2))[0] # File number of "TYPES.TYP".
+        ScreenUnkIDB = struct.unpack('<H', scrfile.read(2))[0] # ???
+        ScreenTilesetID = struct.unpack('<H', scrfile.read(2))[0] # File number of the tileset used.
+    ScreenIDs = list(struct.unpack('<' + str(ScreenWidth * ScreenHeight) + 'H', scrfile.read(ScreenWidth * ScreenHeight * 2))) # Which 256x256 screen is used for each section of the map, read all at once.
+    if LYRFormat == 0:
+        if scrfile.tell() % 4 != 0:
+            print("Re-aligning...")
+            scrfile.seek(2, 1) # Screen data has to start at an offset which is a multiple of 4 (*0, *4, 8, or *C) for The Scorpion King, so re-align if it's not (it'll never end on an odd number, so shift by 2 will work).
+    if LYRFormat > 2:
+        for x in range(ScreenWidth * ScreenHeight):
+            ScreenID2 = struct.unpack('<H', scrfile.read(2))[0] # A secondary set of IDs which don't seem necessary for map building.
+        for x in range(ScreenWidth * ScreenHeight):
+            ScreenID3 = struct.unpack('<H', scrfile.read(2))[0] # And a third that's not needed.
+        scrfile.seek((ScreenUnkCountA * 20), 1) # Skip past the first set of unknowns...
+        scrfile.seek((ScreenUnkCountB * 8), 1) # ...and the second...
+        scrfile.seek((ScreenUnkCountC * 16), 1) # ...and the third.
+    return ScreenFlags, ScreenWidth, ScreenHeight, ScreenCount, ScreenTilesetID, ScreenIDs
+
+def FindMetatileImage(ScreenTilesetID, MetatilesName):
+    # Picks the metatile image exported by "WayForward_TS-Extract" to build the screens with.
+    if not os.path.exists(str(ScreenTilesetID) + '_metatile.png'):
+        if not os.path.exists(MetatilesName + '_metatile.png'):
+            raise ExtractError("Can't find metatile image '" + MetatilesName + "_metatile.png'. Run the 'WayForward_TS-Extract' script to generate one first, or correct the 'MetatilesName' entry if you already did.")
+        return MetatilesName + '_metatile.png' # The metatiles file which matches the "MetatilesName" entry above.
     print("Found tileset matching internal ID ('" + str(ScreenTilesetID) + "_metatile.png') using that instead.")
+    return str(ScreenTilesetID) + '_metatile.png' # Override the "MetatilesName" entry above if it finds a matching ID. Helpful for GBA games.
 
-ScreenIDRet = scrfile.tell()
-for x in range(ScreenWidth * ScreenHeight):
-    ScreenID = struct.unpack('<H', scrfile.read(2))[0] # Which 256x256 screen is used for this section of the map.
-if LYRFormat == 0:
-    if scrfile.tell() % 4 != 0:
-        print("Re-aligning...")
-        scrfile.seek(2, 1) # Screen data has to start at an offset which is a multiple of 4 (*0, *4, 8, or *C) for The Scorpion King, so re-align if it's not (it'll never end on an odd number, so shift by 2 will work).
-if LYRFormat > 2:
-    for x in range(ScreenWidth * ScreenHeight):
-        ScreenID2 = struct.unpack('<H', scrfile.read(2))[0] # A secondary set of IDs which don't seem necessary for map building.
+def FindBlankIndex(SheetImage):
+    # Looks for a palette index the metatile image doesn't use (index 0 counts as used, as that's what metatile IDs past the end of the image get), to show the blank screen as transparent without touching any real pixels.
+    UsedIndices = set([0] + [Index for Count, Index in SheetImage.getcolors(256)])
+    for Index in range(256):
+        if Index not in UsedIndices:
+            return Index
+    return None
+
+def BuildMapBand(ScreenRows, BandIDs, ScreenCount, ScreenMode, ScreenPalette, FullColour):
+    # Builds one row of screens (256 pixels tall) of the full map. With FullColour on, a paletted band gets converted to RGBA with its blank screens cleared instead (see FindBlankIndex).
+    BandData = ComposeBlocks(ScreenRows, BandIDs, len(BandIDs))
+    if FullColour == True and ScreenMode == 'P':
+        BandImage = Image.frombuffer('P', (len(BandIDs) * 256, 256), BandData, 'raw', 'P', 0, 1)
+        BandImage.putpalette(ScreenPalette)
+        BandImage = BandImage.convert('RGBA')
+        for x in range(len(BandIDs)):
+            if BandIDs[x] == ScreenCount:
+                BandImage.paste((0, 0, 0, 0), (x * 256, 0, (x + 1) * 256, 256))
+        BandData = BandImage.tobytes()
+    return BandData
+
+def SaveTilePyramid(FolderName, ScreenRows, ScreenIDs, ScreenWidth, ScreenHeight, ScreenCount, ScreenCopies, ScreenMode, MapMode, MapPalette, MapTransparency, Saver):
+    # Saves the map as a Deep Zoom (.dzi) tile pyramid. The most zoomed-in level has one 256x256 tile per map section, which is exactly one screen, and each level after that is half the size of the one before until it's down to a single pixel.
+    # Full-size tiles get compressed once per screen and written out for every section using that screen. The smaller levels are blended down from the level above, in full colour.
+    MapWidth = ScreenWidth * 256; MapHeight = ScreenHeight * 256
+    MaxLevel = 0
+    while (1 << MaxLevel) < max(MapWidth, MapHeight):
+        MaxLevel = MaxLevel + 1
+    TileFolder = FolderName + '/Full_files'
+    OutputFiles = []
+    ScreenTiles = {}; LevelTiles = {}
+    if not os.path.exists(TileFolder + '/' + str(MaxLevel)):
+        os.makedirs(TileFolder + '/' + str(MaxLevel))
     for x in range(ScreenWidth * ScreenHeight):
-        ScreenID3 = struct.unpack('<H', scrfile.read(2))[0] # And a third that's not needed.
-    scrfile.seek((ScreenUnkCountA * 20), 1) # Skip past the first set of unknowns...
-    scrfile.seek((ScreenUnkCountB * 8), 1) # ...and the second...
-    scrfile.seek((ScreenUnkCountC * 16), 1) # ...and the third.
-
-for x in range(ScreenCount):
-    MetatileStartX = 0; MetatileStartY = 0; MetatilePasteX = 0; MetatilePasteY = 0 # Initializing values for screen assembly.
-    ScreenImage = Image.new('RGBA', (256, 256), (0, 0, 0, 0)) # Initializing the assembled screen PNG in memory.
-    for y in range(256):
-        MetatileID = struct.unpack('<H', scrfile.read(2))[0] # Which metatile is used for this offset. Screens are always 16x16 metatiles, or 256x256.
-        if ScreenFlags == 0x0010 or ScreenFlags == 0x0020:
-            MetatileID = MetatileID & 0x03FF # 1024 metatiles maximum?
-            MetatileStartX = (MetatileID & 0x000F) * 16 # Maths to determine X position of metatile sheet to cut.
-            MetatileStartY = (MetatileID & 0x03F0) # More maths to determine Y position of metatile sheet to cut.
-        elif ScreenFlags == 0x0040:
-            MetatileID = MetatileID & 0x0FFF # 4096 metatiles maximum.
-            MetatileStartX = (MetatileID & 0x000F) * 16 # Maths to determine X position of metatile sheet to cut.
-            MetatileStartY = (MetatileID & 0x0FF0) # More maths to determine Y position of metatile sheet to cut.
+        TileKey = ScreenCopies.get(ScreenIDs[x], ScreenIDs[x]) # Duplicate screens (see SkipDuplicates) share a tile with their first copy.
+        if TileKey not in ScreenTiles:
+            TileImage = Image.frombuffer(MapMode, (256, 256), BuildMapBand(ScreenRows, [ScreenIDs[x]], ScreenCount, ScreenMode, MapPalette, MapMode != ScreenMode), 'raw', MapMode, 0, 1)
+            if MapMode == 'P':
+                TileImage.putpalette(MapPalette)
+                if MapTransparency != None:
+                    TileImage.info['transparency'] = MapTransparency
+            ScreenTiles[TileKey] = (TileImage.convert('RGBA'), Saver.Encode(TileImage))
+        outfile = TileFolder + '/' + str(MaxLevel) + '/' + str(x % ScreenWidth) + '_' + str(x // ScreenWidth) + '.png'
+        with open(outfile, "wb") as tilefile:
+            tilefile.write(ScreenTiles[TileKey][1])
+        OutputFiles.append(outfile)
+        LevelTiles[(x % ScreenWidth, x // ScreenWidth)] = ScreenTiles[TileKey][0]
+    ScreenTiles = None # Only the level above is needed from here on.
+
+    LevelWidth = MapWidth; LevelHeight = MapHeight
+    for Level in range(MaxLevel - 1, -1, -1):
+        LevelWidth = (LevelWidth + 1) // 2; LevelHeight = (LevelHeight + 1) // 2
+        if not os.path.exists(TileFolder + '/' + str(Level)):
+            os.makedirs(TileFolder + '/' + str(Level))
+        HalfTiles = {}
+        for TileY in range((LevelHeight + 255) // 256):
+            for TileX in range((LevelWidth + 255) // 256):
+                SourceTiles = [((TileX * 2) + dx, (TileY * 2) + dy) for dy in range(2) for dx in range(2) if ((TileX * 2) + dx, (TileY * 2) + dy) in LevelTiles]
+                JoinedWidth = sum(LevelTiles[SourceTile].size[0] for SourceTile in SourceTiles if SourceTile[1] == TileY * 2)
+                JoinedHeight = sum(LevelTiles[SourceTile].size[1] for SourceTile in SourceTiles if SourceTile[0] == TileX * 2)
+                JoinedImage = Image.new('RGBA', (JoinedWidth, JoinedHeight), (0, 0, 0, 0))
+                for SourceTile in SourceTiles:
+                    JoinedImage.paste(LevelTiles[SourceTile], ((SourceTile[0] - (TileX * 2)) * 256, (SourceTile[1] - (TileY * 2)) * 256))
+                HalfTiles[(TileX, TileY)] = JoinedImage.resize(((JoinedWidth + 1) // 2, (JoinedHeight + 1) // 2), Image.BOX) # Each pixel's the average of the four it replaces.
+                outfile = TileFolder + '/' + str(Level) + '/' + str(TileX) + '_' + str(TileY) + '.png'
+                Saver.Save(HalfTiles[(TileX, TileY)], outfile)
+                OutputFiles.append(outfile)
+        LevelTiles = HalfTiles
+
+    outfile = FolderName + '/Full.dzi'
+    with open(outfile, "w") as dzifile:
+        dzifile.write('<?xml version="1.0" encoding="UTF-8"?>\n<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="256" Overlap="0" Format="png">\n  <Size Width="' + str(MapWidth) + '" Height="' + str(MapHeight) + '"/>\n</Image>\n')
+    OutputFiles.append(outfile)
+    return OutputFiles
+
+def ExtractScreens(ScreenName=ScreenName, MetatilesName=MetatilesName, LYRFormat=LYRFormat, UseGBAROM=UseGBAROM, ROMName=ROMName, ScreenStart=ScreenStart, SaveScreens=SaveScreens, SkipDuplicates=SkipDuplicates, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, IndexedColour=IndexedColour, SaveFullMap=SaveFullMap, SaveTiles=SaveTiles, SaveWorkers=SaveWorkers, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG):
+    OutputFiles = [] # Every file saved, handed back to whoever called this.
+    Timer = StageTimer(Instrument) # Does nothing unless "Instrument" is on.
+    Inputs = {} # Every file read (and its hash), for the manifest.
+
+    if UseGBAROM == False:
+        if not os.path.exists(ScreenName + ".lyr"):
+            raise ExtractError("Can't find '" + ScreenName + ".lyr'. Check to make sure you filled in the 'ScreenName' entry correctly.")
+        else:
+            scrfile = CountFile(open(ScreenName + '.lyr', "rb"), Timer) # .LYR file, counting bytes read and seeks made if "Instrument" is on.
+            LYRFormat = ChooseFormat('LYR', scrfile.read(), 0, LYRFormat, AutoDetect) # Checking the header and screen data against every format before going any further.
+            scrfile.seek(0, 0) # Start at the top of the .LYR file.
+            if not os.path.exists(ScreenName):
+                os.makedirs(ScreenName) # If the folder doesn't exist, then make it.
+    else:
+        if not os.path.exists(ROMName):
+            raise ExtractError("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
         else:
-            MetatileID = MetatileID & 0x07FF # 2048 metatiles maximum, presumably.
-            MetatileStartX = (MetatileID & 0x000F) * 16 # Maths to determine X position of metatile sheet to cut.
-            MetatileStartY = (MetatileID & 0x07F0) # More maths to determine Y position of metatile sheet to cut.
-        CropImage = sprfile.crop((MetatileStartX, MetatileStartY, MetatileStartX + 16, MetatileStartY + 16)) # Grabbing the right metatile.
-        ScreenImage.paste(CropImage, ((MetatilePasteX * 16), (MetatilePasteY * 16)), mask=0) # Pasting the metatile in the right spot.
-        MetatilePasteX = MetatilePasteX + 1 # Shift right by 1 metatile.
-        if MetatilePasteX == 16:
-            MetatilePasteX = 0 # We've reached the edge, so we reset and...
-            MetatilePasteY = MetatilePasteY + 1 # ...move onto the next line.
+            scrfile = CountFile(OpenROM(ROMName), Timer) # .GBA ROM file, memory-mapped and shared with any other extractions from the same ROM.
+            LYRFormat = ChooseFormat('LYR', scrfile.View, ScreenStart, LYRFormat, AutoDetect, False)
+            scrfile.seek(ScreenStart, 0) # Start at the "ScreenStart" offset above.
+            if not os.path.exists(str(ScreenStart)):
+                os.makedirs(str(ScreenStart)) # We'll use the offset as the folder name for Risky Revolution.
+
+    Timer.Start('Header')
+    ScreenFlags, ScreenWidth, ScreenHeight, ScreenCount, ScreenTilesetID, ScreenIDs = ReadScreenHeader(scrfile, LYRFormat)
+    Timer.Stop('Header')
+
+    MetatileFile = FindMetatileImage(ScreenTilesetID, MetatilesName)
+    sprfile = Image.open(MetatileFile)
+    AddInput(Inputs, MetatileFile)
 
     if UseGBAROM == False:
-        outfile = (ScreenName + '/' + str(x) + '.png') # Setting up the file path. .LYR files will use their name for the folder.
+        FolderName = ScreenName
+        AddInput(Inputs, ScreenName + '.lyr')
+    else:
+        FolderName = str(ScreenStart)
+        AddInput(Inputs, ROMName, ScreenStart, scrfile.tell() + (ScreenCount * 512)) # Only the map's own part of the ROM counts, which ends with the screens.
+    Settings = {'Script': 'LYR', 'LYRFormat': LYRFormat, 'SaveScreens': SaveScreens, 'SkipDuplicates': SkipDuplicates, 'IndexedColour': IndexedColour, 'SaveFullMap': SaveFullMap, 'SaveTiles': SaveTiles, 'CompressLevel': CompressLevel, 'OptimizePNG': OptimizePNG}
+    ManifestName = FolderName + '/manifest.json'
+    if SkipUnchanged == True:
+        SavedFiles = CheckManifest(ManifestName, Inputs, Settings)
+        if SavedFiles != None:
+            print("Nothing's changed since " + ManifestName + " was saved, skipping.")
+            return SavedFiles + [ManifestName]
+
+    MetatileMask = GetMetatileMask(ScreenFlags) # How many metatiles the screens can address, depending on the flags.
+    if IndexedColour == True and sprfile.mode == 'P':
+        ScreenMode = 'P' # One byte per pixel, sharing the metatile image's palette.
+        ScreenPalette = sprfile.getpalette()
     else:
-        outfile = (str(ScreenStart) + '/' + str(x) + '.png') # Setting up the file path. A GBA ROM will use the offset as the name for the folder.
-    ScreenImage.save(outfile) # Saving the file.
-    print("Saved to " + outfile) # We did the thing.
+        ScreenMode = 'RGBA' # Leapster metatile images (or IndexedColour = False).
+    Timer.Start('Metatiles')
+    MetatileAtlas = LoadMetatileAtlas(sprfile, MetatileMask + 1, ScreenMode) # Splitting the metatile sheet up once, rather than cropping it 256 times per screen.
+    Timer.Stop('Metatiles')
+    PixelSize = GetPixelSize(ScreenMode)
+    ScreenRows = [[] for y in range(256)] # Keeping every rendered screen in memory for building the full map later, rather than reading the PNGs back in.
+    ScreenHashes = {}; Duplicates = {}; ScreenCopies = {}
+    Saver = ImageSaver(SaveWorkers, CompressLevel, OptimizePNG) # Screens get compressed in the background while the next ones are built.
+    for x in range(ScreenCount):
+        MetatileIDs = [MetatileID & MetatileMask for MetatileID in struct.unpack('<256H', scrfile.read(512))] # Which metatile is used for each offset. Screens are always 16x16 metatiles, or 256x256.
+        Timer.Start('Compose')
+        ScreenData = ComposeBlocks(MetatileAtlas, MetatileIDs, 16) # Gathering all 256 metatiles into the screen in one go.
+        Timer.Stop('Compose')
+        if SkipDuplicates == True and SaveScreens == True:
+            ScreenHash = HashPixels(ScreenMode, (256, 256), ScreenData)
+            if ScreenHash in ScreenHashes:
+                for y in range(256):
+                    ScreenRows[y].append(ScreenRows[y][ScreenHashes[ScreenHash]]) # Same pixels as an earlier screen, so the map reuses that one's rows too.
+                Duplicates[str(x) + '.png'] = str(ScreenHashes[ScreenHash]) + '.png'
+                ScreenCopies[x] = ScreenHashes[ScreenHash]
+                continue
+            ScreenHashes[ScreenHash] = x
+        for y in range(256):
+            ScreenRows[y].append(ScreenData[(y * 256 * PixelSize):((y + 1) * 256 * PixelSize)])
 
-scrfile.seek(ScreenIDRet, 0) # Now let's try building the entire map...
-MetatilePasteX = 0; MetatilePasteY = 0 # Re-initializing values for screen assembly.
-MapImage = Image.new('RGBA', ((ScreenWidth * 256), (ScreenHeight * 256)), (0, 0, 0, 0)) # Initializing the full map PNG in memory.
+        if SaveScreens == True:
+            ScreenImage = Image.frombuffer(ScreenMode, (256, 256), ScreenData, 'raw', ScreenMode, 0, 1)
+            if ScreenMode == 'P':
+                ScreenImage.putpalette(ScreenPalette)
+            if UseGBAROM == False:
+                outfile = (ScreenName + '/' + str(x) + '.png') # Setting up the file path. .LYR files will use their name for the folder.
+            else:
+                outfile = (str(ScreenStart) + '/' + str(x) + '.png') # Setting up the file path. A GBA ROM will use the offset as the name for the folder.
+            Timer.Start('Save')
+            Saver.Save(ScreenImage, outfile) # Saving the file (or handing it off to be saved).
+            Timer.Stop('Save')
+            OutputFiles.append(outfile)
+            print("Saved to " + outfile) # We did the thing.
+
+    if SkipDuplicates == True and SaveScreens == True:
+        OutputFiles.append(SaveDuplicates(FolderName, Duplicates))
+        print("Skipped " + str(len(Duplicates)) + " duplicate screens, listed in " + OutputFiles[-1])
+
+    for x in range(ScreenWidth * ScreenHeight):
+        if ScreenIDs[x] >= ScreenCount:
+            print("WARNING: Map uses screen " + str(ScreenIDs[x]) + ", but there are only " + str(ScreenCount) + " screens. Leaving it blank.")
+            ScreenIDs[x] = ScreenCount
+    BlankIndex = 0 # Fully transparent for a full-colour map.
+    MapMode = ScreenMode; MapPalette = None; MapTransparency = None
+    if ScreenMode == 'P':
+        MapPalette = ScreenPalette
+        if ScreenCount in ScreenIDs:
+            MapTransparency = FindBlankIndex(sprfile) # A paletted map needs a spare palette index to be transparent instead.
+            if MapTransparency == None:
+                MapMode = 'RGBA' # Every index is taken, so the blank sections get cleared after converting each band to full colour (see BuildMapBand).
+                print("Metatile image uses every palette index, so the full map gets saved as full-colour to keep the blank screens transparent.")
+            else:
+                BlankIndex = MapTransparency
+    for y in range(256):
+        ScreenRows[y].append(bytes(bytearray([BlankIndex]) * (256 * PixelSize))) # One extra blank screen, for any map sections pointing past the screen count.
 
-print("Building full map (" + str(ScreenWidth) + "x" + str(ScreenHeight) + ") screens...")
-for x in range(ScreenWidth * ScreenHeight):
-    ScreenID = struct.unpack('<H', scrfile.read(2))[0] # Which 256x256 screen is used for this section of the map.
     if UseGBAROM == False:
-        ScreenTile = Image.open(ScreenName + '/' + str(ScreenID) + '.png') # Get the respective screen from the "ScreenName" folder.
+        outfile = (ScreenName + '/' + 'Full.png') # Setting up the full map file path, will use the .LYR's name for the folder.
     else:
-        ScreenTile = Image.open(str(ScreenStart) + '/' + str(ScreenID) + '.png') # Get the respective screen from the "ScreenStart" folder.
-    MapImage.paste(ScreenTile, ((MetatilePasteX * 256), (MetatilePasteY * 256)), mask=0) # Pasting the screen in the right spot, but only if it's not blank.
-    MetatilePasteX = MetatilePasteX + 1 # Shift right by 1 metatile.
-    if MetatilePasteX == ScreenWidth:
-        MetatilePasteX = 0 # We've reached the edge, so we reset and...
-        MetatilePasteY = MetatilePasteY + 1 # ...move onto the next line.
-
-if UseGBAROM == False:
-    outfile = (ScreenName + '/' + 'Full.png') # Setting up the full map file path, will use the .LYR's name for the folder.
-else:
-    outfile = (str(ScreenStart) + '/' + 'Full.png') # Setting up the full map file path, will use the ROM's offset as the name for the folder.
-MapImage.save(outfile) # Saving the assembled map.
-print("Saved to " + outfile) # We did the other thing.
\ No newline at end of file
+        outfile = (str(ScreenStart) + '/' + 'Full.png') # Setting up the full map file path, will use the ROM's offset as the name for the folder.
+    if SaveFullMap == True:
+        print("Building full map (" + str(ScreenWidth) + "x" + str(ScreenHeight) + ") screens...")
+        MapWriter = PNGWriter(outfile, ScreenWidth * 256, ScreenHeight * 256, MapMode, MapPalette, MapTransparency, 9 if OptimizePNG == True else CompressLevel) # Written one row of screens at a time, alongside whichever screens are still being saved.
+        for y in range(ScreenHeight):
+            Timer.Start('Map')
+            BandData = BuildMapBand(ScreenRows, ScreenIDs[(y * ScreenWidth):((y + 1) * ScreenWidth)], ScreenCount, ScreenMode, MapPalette, MapMode != ScreenMode) # Gathering the screens the same way the screens themselves were built.
+            Timer.Stop('Map')
+            Timer.Start('Save')
+            MapWriter.Write(BandData)
+            Timer.Stop('Save')
+        MapWriter.Close()
+        OutputFiles.append(outfile)
+        print("Saved to " + outfile) # We did the other thing.
+    if SaveTiles == True:
+        Timer.Start('Tiles')
+        TileFiles = SaveTilePyramid(FolderName, ScreenRows, ScreenIDs, ScreenWidth, ScreenHeight, ScreenCount, ScreenCopies, ScreenMode, MapMode, MapPalette, MapTransparency, Saver)
+        Timer.Stop('Tiles')
+        OutputFiles.extend(TileFiles)
+        print("Saved " + str(len(TileFiles) - 1) + " map tiles to " + FolderName + "/Full_files, described by " + TileFiles[-1])
+    Timer.Start('SaveWait')
+    Saver.Finish() # Everything has to be written before the manifest says it was.
+    Timer.Stop('SaveWait')
+    if Instrument == True:
+        Timer.Count('Screens', ScreenCount)
+        Timer.Count('Duplicates', len(Duplicates))
+        OutputFiles.append(Timer.Save(FolderName + '/timing.json'))
+        print("Timings saved to " + OutputFiles[-1])
+    OutputFiles.append(SaveManifest(ManifestName, Inputs, Settings, list(OutputFiles)))
+    return OutputFiles
+
+if __name__ == "__main__":
+    try:
+        ExtractScreens()
+    except ExtractError as Error:
+        print(Error)
+        os.system('pause')
+        exit()
@@ -0,0 +1,125 @@
+import os
+import time
+import struct
+import random
+from WayForward_Common import ExtractError, DecompressLZSS, MappedFile
+
+# WayForward LZSS decompression benchmark script written by Random Talking Bush.
+# Checks the LZSS decompressor used for compressed tilesets (flag 0x0004) against a plain byte-by-byte version, and times the two of them.
+
+TilesetName = "" # The name of an LZSS-compressed .TS4 or .TS8 file (with extension) to benchmark with. Leave blank to use made-up tile data instead.
+TSFormat = 1 # Same as the "TSFormat" value in "WayForward_TS-Extract", only used to find where the header ends when "TilesetName" is filled in.
+TestSize = 0x20000 # How many bytes of made-up tile data to compress and decompress when "TilesetName" is blank. 0x20000 is 4096 16-colour tiles.
+Repeats = 5 # How many times to run each decompressor. The fastest run is the one that gets reported.
+
+# Instructions on how to use this script:
+# 1. Install Python (either 2 or 3, both work). Keep "WayForward_Common.py" in the same folder as this script.
+# 2. Optionally fill in the "TilesetName" with a compressed tileset, otherwise leave it blank.
+# 3. Run the script (no additional command-line parameters needed). It prints how long each decompressor took, and stops with an error if they don't give the same result.
+
+# Everything below this line should be left alone.
+
+def DecompressLZSSReference(lzfile):
+    # The straightforward version: every byte is decoded and copied one at a time. Slow, but easy to check by eye.
+    LZSSHeader = bytearray(lzfile.read(4))
+    OutSize = LZSSHeader[1] | (LZSSHeader[2] << 8) | (LZSSHeader[3] << 16)
+    OutData = bytearray()
+    while len(OutData) < OutSize:
+        BlockFlags = bytearray(lzfile.read(1))[0]
+        for b in range(8):
+            if len(OutData) >= OutSize:
+                break
+            if BlockFlags & (0x80 >> b) == 0:
+                OutData.append(bytearray(lzfile.read(1))[0])
+            else:
+                BlockInfo = bytearray(lzfile.read(2))
+                CopyLength = (BlockInfo[0] >> 4) + 3
+                CopyDistance = (((BlockInfo[0] & 0x0F) << 8) | BlockInfo[1]) + 1
+                for c in range(CopyLength):
+                    OutData.append(OutData[len(OutData) - CopyDistance])
+    return bytes(OutData[:OutSize])
+
+def CompressLZSS(RawData):
+    # A simple greedy compressor, only here to make test data. It looks for matches through a table of the last position each three-byte string was seen at.
+    RawData = bytearray(RawData)
+    OutData = bytearray(struct.pack('<L', 0x10 | (len(RawData) << 8)))
+    LastSeen = {}
+    InPos = 0
+    while InPos < len(RawData):
+        FlagPos = len(OutData)
+        OutData.append(0)
+        for b in range(8):
+            if InPos >= len(RawData):
+                break
+            MatchLength = 0
+            MatchFrom = LastSeen.get(bytes(RawData[InPos:InPos + 3]), -1)
+            if MatchFrom >= 0 and InPos - MatchFrom <= 0x1000:
+                while MatchLength < 18 and InPos + MatchLength < len(RawData) and RawData[MatchFrom + MatchLength] == RawData[InPos + MatchLength]:
+                    MatchLength = MatchLength + 1
+            if MatchLength >= 3:
+                CopyDistance = InPos - MatchFrom - 1
+                OutData[FlagPos] = OutData[FlagPos] | (0x80 >> b)
+                OutData.append(((MatchLength - 3) << 4) | (CopyDistance >> 8))
+                OutData.append(CopyDistance & 0xFF)
+            else:
+                MatchLength = 1
+                OutData.append(RawData[InPos])
+            for m in range(MatchLength):
+                LastSeen[bytes(RawData[InPos + m:InPos + m + 3])] = InPos + m
+            InPos = InPos + MatchLength
+    return bytes(OutData)
+
+def MakeTestData(DataSize):
+    # Made-up tile data: a handful of repeating tiles, runs of blank pixels and some noise, roughly how real tilesets compress.
+    Generator = random.Random(0x10)
+    BaseTiles = [bytearray(Generator.randint(0, 255) for x in range(0x20)) for t in range(16)]
+    TestData = bytearray()
+    while len(TestData) < DataSize:
+        TileType = Generator.randint(0, 3)
+        if TileType == 0:
+            TestData += bytearray(0x20)
+        elif TileType == 1:
+            TestData += bytearray(Generator.randint(0, 255) for x in range(0x20))
+        else:
+            TestData += BaseTiles[Generator.randint(0, 15)]
+    return bytes(TestData[:DataSize])
+
+def TimeDecompress(Decompressor, CompressedData):
+    BestTime = None
+    for r in range(Repeats):
+        StartTime = time.time()
+        Result = Decompressor(MappedFile(CompressedData))
+        RunTime = time.time() - StartTime
+        if BestTime == None or RunTime < BestTime:
+            BestTime = RunTime
+    return Result, BestTime
+
+def RunBenchmark():
+    if TilesetName != "":
+        if not os.path.exists(TilesetName):
+            raise ExtractError("Can't find '" + TilesetName + "'. Check to make sure you filled in the 'TilesetName' entry correctly.")
+        with open(TilesetName, "rb") as ts4file:
+            TilesetData = ts4file.read()
+        if struct.unpack_from('<H', TilesetData, 0)[0] & 0x0004 == 0:
+            raise ExtractError("'" + TilesetName + "' isn't flagged as LZSS-compressed.")
+        CompressedData = TilesetData[(8 if TSFormat > 0 else 6):] # Skipping the header, same as "WayForward_TS-Extract" does.
+        print("Benchmarking with " + TilesetName + ".")
+    else:
+        CompressedData = CompressLZSS(MakeTestData(TestSize))
+        print("Benchmarking with " + str(TestSize) + " bytes of made-up tile data (" + str(len(CompressedData)) + " bytes compressed).")
+
+    ReferenceData, ReferenceTime = TimeDecompress(DecompressLZSSReference, CompressedData)
+    FastData, FastTime = TimeDecompress(DecompressLZSS, CompressedData)
+    if bytes(FastData[0]) != ReferenceData:
+        raise ExtractError("The two decompressors gave different results! Something's broken.")
+    print("Reference: " + str(round(ReferenceTime * 1000, 2)) + " ms")
+    print("Fast:      " + str(round(FastTime * 1000, 2)) + " ms (" + str(round(ReferenceTime / max(FastTime, 0.000001), 1)) + "x)")
+    print("Both gave the same " + str(len(ReferenceData)) + " bytes.")
+
+if __name__ == "__main__":
+    try:
+        RunBenchmark()
+    except ExtractError as Error:
+        print(Error)
+        os.system('pause')
+        exit()
@@ -0,0 +1,202 @@
+import os
+import json
+import struct
+import random
+
+# WayForward test file generator script written by Random Talking Bush.
+# Makes up tilesets, sprite sets, maps and palettes in every format the extraction scripts support, so they can be tested and timed without needing any actual game files.
+# The files are nonsense graphically (random tiles and pieces), but they're laid out exactly like the real thing, down to the empty first metatile and blank first screen.
+
+OutputFolder = "Fixtures" # Folder to write the made-up files to. It gets created if it doesn't exist, and anything already in there with the same names gets overwritten.
+Scale = 1 # Multiplies the counts below, for testing how well things hold up with larger files. 1 is roughly the size of an average file from a real game.
+Seed = 1234 # The same seed always makes exactly the same files, so timings from different runs are comparable. Change it to get a different set.
+MetatileCount = 256 # How many metatiles each tileset has (before "Scale"). GBA tilesets max out at 1024 tiles, so those get capped there.
+TileCount = 384 # How many 8x8 tiles each tileset has (before "Scale").
+FrameCount = 48 # How many frames each sprite set has (before "Scale").
+ScreenCount = 24 # How many screens each map has (before "Scale").
+MapWidth = 8 # How many screens wide and tall each map is (before "Scale", which only makes them wider).
+MapHeight = 4
+
+# Instructions on how to use this script:
+# 1. Install Python (either 2 or 3, both work). Pillow isn't needed for this one.
+# 2. Change the settings above if you want to, then run the script (no additional command-line parameters needed).
+# 3. Everything gets written to the "OutputFolder", along with a "fixtures.json" file listing each file's type, format and size. That's what my "WayForward_Benchmark" script reads to know what to run.
+
+# What gets made:
+# scene.scn (512 bytes of background palettes, then 512 of sprite palettes) and scene.pal (just the one set).
+# ts<format>_4.ts4 and ts<format>_8.ts8 for every TSFormat (Leapster, TSFormat = 4, only has .ts8 since its tiles are always full-colour). Didj tilesets get their own palette block at the start, same as the real ones.
+# anm<format>.anm for every ANMFormat (Leapster ones use the row-packed sprite data), along with a 256-colour anm0_8.an8 and a DS-style anm3_4.an4.
+# lyr<format>_<flags>.lyr for every LYRFormat and "ScreenFlags" value (0x00, 0x10, 0x20 and 0x40), each built with the metatile image of the matching GBA or DS tileset above.
+
+# Everything below this line should be left alone.
+
+PieceShapes = [(0x0000, 1), (0x0400, 2), (0x0800, 2), (0x1000, 4), (0x1400, 4), (0x1800, 4), (0x2000, 16), (0x2400, 8), (0x2800, 8), (0x3000, 64), (0x3400, 32), (0x3800, 32)] # Size bits and how many tiles each piece size uses, same as "WayForward_ANM-Extract".
+ScreenFlagValues = [0x0000, 0x0010, 0x0020, 0x0040]
+TilesetIDs = {0: 100, 1: 101, 2: 101, 3: 102} # Tileset ID written into each LYRFormat's map headers.
+TilesetNames = {0: 'ts0_4', 1: 'ts1_4', 2: 'ts1_4', 3: 'ts2_4'} # Which tileset each LYRFormat's maps get built with: The Scorpion King's, the other GBA games', and the DS one.
+
+def MakePalette(Generator):
+    return struct.pack('<256H', *[Generator.randrange(0x8000) for x in range(256)])
+
+def MakeTileData(Generator, TileTotal, TileSize, BaseTiles):
+    # Roughly how real graphics look to a compressor: some blank tiles, a lot of repeated ones, and some noise.
+    TileData = bytearray()
+    for t in range(TileTotal):
+        TileType = Generator.randrange(4)
+        if TileType == 0 or t == 0:
+            TileData += bytearray(TileSize) # The first tile is always blank.
+        elif TileType == 1:
+            TileData += bytearray(Generator.randrange(256) for x in range(TileSize))
+        else:
+            TileData += Generator.choice(BaseTiles)[0:TileSize]
+    return TileData
+
+def MakeTileset(Generator, TSFormat, Colours, MetatileTotal, TileTotal):
+    TileFlags = 0x0001 if Colours == 8 else 0x0000
+    if TSFormat < 2:
+        TileTotal = min(TileTotal, 1024) # Only 10 bits for the tile ID.
+    FileData = bytearray()
+    if TSFormat == 3:
+        FileData += MakePalette(Generator) # Didj tilesets have their palette first.
+    FileData += struct.pack('<3H', TileFlags, MetatileTotal, TileTotal)
+    if TSFormat > 0:
+        FileData += struct.pack('<H', 0)
+    TileFlips = bytearray()
+    for m in range(MetatileTotal):
+        for q in range(4):
+            if m == 0:
+                TileID = 0; TileFlip = 0; TilePalette = 0 # The first metatile is always empty.
+            else:
+                TileID = Generator.randrange(TileTotal); TileFlip = Generator.randrange(4); TilePalette = Generator.randrange(16)
+            if TSFormat == 2 or TSFormat == 3:
+                FileData += struct.pack('<L', TileID | (TileFlip << 26) | (TilePalette << 28))
+            elif TSFormat == 4:
+                FileData += struct.pack('<H', TileID)
+                TileFlips.append(TileFlip << 2)
+            else:
+                FileData += struct.pack('<H', TileID | (TileFlip << 10) | (TilePalette << 12))
+    FileData += TileFlips
+    TileSize = 0x80 if TSFormat == 4 else (0x40 if Colours == 8 else 0x20)
+    FileData += MakeTileData(Generator, TileTotal, TileSize, [bytearray(Generator.randrange(256) for x in range(0x80)) for t in range(16)])
+    return FileData, TileTotal
+
+def MakeSprites(Generator, ANMFormat, FrameTotal, Colours=4):
+    Start = 0x200 if ANMFormat == 5 else 0 # Didj sprite sets have their palette first, but their offsets still count from the very beginning.
+    HeaderSize = 24 if ANMFormat == 1 else 16
+    TableSize = FrameTotal * (10 if ANMFormat == 1 else 12)
+    BoundsSize = {1: 16, 3: 32, 4: 56, 5: 32}.get(ANMFormat, 24)
+    AssemblyData = bytearray(); TileData = bytearray(); FrameOffset = []; FrameStart = []; FrameLength = []
+    MaxPieces = 1; MaxBytes = 0
+    BaseTiles = [bytearray(Generator.randrange(256) for x in range(0x40)) for t in range(16)]
+    for f in range(FrameTotal):
+        FrameOffset.append(len(AssemblyData)); FrameStart.append(len(TileData))
+        PieceCount = 1 if ANMFormat == 6 else Generator.randrange(1, 6) # Leapster frames are always a single piece.
+        MaxPieces = max(MaxPieces, PieceCount)
+        FrameData = bytearray(BoundsSize) + struct.pack('<H', PieceCount)
+        FrameData += struct.pack('<' + str(PieceCount * 2) + 'h', *[Generator.randrange(-64, 32) for x in range(PieceCount * 2)]) # All of the X offsets, then all of the Y offsets.
+        FrameTiles = 0
+        for s in range(PieceCount):
+            if ANMFormat == 6:
+                PieceWidth = Generator.randrange(8, 64); PieceHeight = Generator.randrange(8, 64)
+                FrameData += struct.pack('<BB', PieceWidth, PieceHeight)
+                for y in range(PieceHeight):
+                    PadBytes = Generator.randrange(PieceWidth // 2); SpriteBytes = Generator.randrange(PieceWidth - PadBytes + 1) # Blank pixels on the left, then the ones actually stored.
+                    TileData += struct.pack('<BB', PadBytes, SpriteBytes) + struct.pack('<' + str(SpriteBytes) + 'H', *[Generator.randrange(0x10000) for x in range(SpriteBytes)])
+            else:
+                SizeBits, ShapeTiles = Generator.choice(PieceShapes[0:9] if ANMFormat == 1 or ANMFormat == 2 else PieceShapes)
+                if Colours == 8:
+                    ShapeTiles = ShapeTiles * 2 # 256-colour tiles take up two tile IDs each.
+                if ANMFormat == 1:
+                    FrameData += struct.pack('<H', FrameTiles | (SizeBits >> 2))
+                elif ANMFormat == 2:
+                    FrameData += struct.pack('<H', FrameTiles | (SizeBits >> 3))
+                else:
+                    FrameData += struct.pack('<H', FrameTiles | SizeBits | Generator.choice([0x0000, 0x4000]) | (0x8000 if Colours == 8 else 0))
+                FrameTiles = FrameTiles + ShapeTiles
+        if ANMFormat != 6:
+            TileData += MakeTileData(Generator, FrameTiles, 0x20, BaseTiles)
+        FrameLength.append(len(TileData) - FrameStart[-1])
+        MaxBytes = max(MaxBytes, FrameLength[-1])
+        while len(FrameData) % 4 != 0:
+            FrameData.append(0)
+        AssemblyData += FrameData
+    AssemblyStart = Start + HeaderSize + TableSize
+    FileData = bytearray()
+    if ANMFormat == 5:
+        FileData += MakePalette(Generator)
+    FileData += struct.pack('<4H', 0x8000 if Colours == 8 else 0x0000, MaxPieces, min(MaxBytes, 0xFFFF), FrameTotal)
+    if ANMFormat == 1:
+        FileData += bytearray(8)
+    FileData += struct.pack('<2L', AssemblyStart + len(AssemblyData), len(TileData))
+    if ANMFormat == 1:
+        FileData += struct.pack('<' + str(FrameTotal * 2) + 'L' + str(FrameTotal) + 'H', *([AssemblyStart + Offset for Offset in FrameOffset] + FrameStart + [Length & 0xFFFF for Length in FrameLength])) # The Scorpion King stores these in three separate buffers.
+    else:
+        for f in range(FrameTotal):
+            FileData += struct.pack('<3L', AssemblyStart + FrameOffset[f], FrameStart[f], FrameLength[f])
+    FileData += AssemblyData + TileData
+    return FileData
+
+def MakeScreens(Generator, LYRFormat, ScreenFlags, Width, Height, ScreenTotal, TilesetID, MetatileTotal):
+    UnkCounts = (2, 3, 1)
+    FileData = bytearray(struct.pack('<4H', ScreenFlags, Width, Height, ScreenTotal))
+    if LYRFormat == 0:
+        FileData += struct.pack('<4H', 0, 0, TilesetID, 0xCCCC)
+    elif LYRFormat == 1:
+        FileData += struct.pack('<4H', 0, 0, 0, TilesetID)
+    else:
+        FileData += struct.pack('<6H', UnkCounts[0], UnkCounts[1], UnkCounts[2], 0, 0, TilesetID)
+    FileData += struct.pack('<' + str(Width * Height) + 'H', *[Generator.randrange(ScreenTotal) for x in range(Width * Height)])
+    if LYRFormat == 0 and len(FileData) % 4 != 0:
+        FileData += bytearray(2) # The Scorpion King's screens start on a multiple of 4.
+    if LYRFormat > 2:
+        FileData += bytearray(Width * Height * 4) + bytearray((UnkCounts[0] * 20) + (UnkCounts[1] * 8) + (UnkCounts[2] * 16))
+    MetatileLimit = min(MetatileTotal, {0x0010: 0x400, 0x0020: 0x400, 0x0040: 0x1000}.get(ScreenFlags, 0x800)) # Same limits as "WayForward_LYR-Extract".
+    for s in range(ScreenTotal):
+        if s == 0:
+            FileData += bytearray(512) # The first screen is always blank.
+        else:
+            FileData += struct.pack('<256H', *[Generator.randrange(MetatileLimit) for x in range(256)])
+    return FileData
+
+def SaveFixture(Fixtures, FileName, FileData, FixtureInfo):
+    with open(os.path.join(OutputFolder, FileName), "wb") as outfile:
+        outfile.write(FileData)
+    FixtureInfo['File'] = FileName
+    FixtureInfo['Name'] = os.path.splitext(FileName)[0]
+    FixtureInfo['Bytes'] = len(FileData)
+    Fixtures.append(FixtureInfo)
+    print("Saved to " + os.path.join(OutputFolder, FileName) + " (" + str(len(FileData)) + " bytes)")
+
+def MakeFixtures():
+    Generator = random.Random(Seed)
+    if not os.path.exists(OutputFolder):
+        os.makedirs(OutputFolder)
+    Fixtures = []
+
+    with open(os.path.join(OutputFolder, "scene.scn"), "wb") as outfile:
+        outfile.write(MakePalette(Generator) + MakePalette(Generator))
+    with open(os.path.join(OutputFolder, "scene.pal"), "wb") as outfile:
+        outfile.write(MakePalette(Generator))
+
+    for TSFormat in range(5):
+        for Colours in ((8,) if TSFormat == 4 else (4, 8)):
+            TileData, TileTotal = MakeTileset(Generator, TSFormat, Colours, MetatileCount * Scale, TileCount * Scale)
+            SaveFixture(Fixtures, 'ts' + str(TSFormat) + '_' + str(Colours) + '.ts' + str(Colours), TileData, {'Type': 'TS', 'Format': TSFormat, 'Count': TileTotal, 'Units': 'tiles', 'Metatiles': MetatileCount * Scale})
+    for ANMFormat in range(7):
+        SaveFixture(Fixtures, 'anm' + str(ANMFormat) + '.anm', MakeSprites(Generator, ANMFormat, FrameCount * Scale), {'Type': 'ANM', 'Format': ANMFormat, 'Count': FrameCount * Scale, 'Units': 'frames'})
+    SaveFixture(Fixtures, 'anm0_8.an8', MakeSprites(Generator, 0, FrameCount * Scale, 8), {'Type': 'ANM', 'Format': 0, 'Count': FrameCount * Scale, 'Units': 'frames'})
+    SaveFixture(Fixtures, 'anm3_4.an4', MakeSprites(Generator, 3, FrameCount * Scale), {'Type': 'ANM', 'Format': 3, 'Count': FrameCount * Scale, 'Units': 'frames'})
+
+    # Maps use the 16-colour tileset of the matching game type above, listed as their "Tileset" in the fixture list (the ID in their header doesn't match anything).
+    for LYRFormat in range(4):
+        for ScreenFlags in ScreenFlagValues:
+            SaveFixture(Fixtures, 'lyr' + str(LYRFormat) + '_' + str(hex(ScreenFlags))[2:] + '.lyr', MakeScreens(Generator, LYRFormat, ScreenFlags, MapWidth * Scale, MapHeight, ScreenCount * Scale, TilesetIDs[LYRFormat], MetatileCount * Scale),
+                {'Type': 'LYR', 'Format': LYRFormat, 'Count': ScreenCount * Scale, 'Units': 'screens', 'Tileset': TilesetNames[LYRFormat]})
+
+    with open(os.path.join(OutputFolder, "fixtures.json"), "w") as listfile:
+        json.dump({'Seed': Seed, 'Scale': Scale, 'Scene': 'scene', 'Fixtures': Fixtures}, listfile, indent=1, sort_keys=True)
+    print("Saved to " + os.path.join(OutputFolder, "fixtures.json"))
+    return Fixtures
+
+if __name__ == "__main__":
+    MakeFixtures()
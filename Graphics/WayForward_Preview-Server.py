@@ -0,0 +1,409 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from PIL import Image
+from WayForward_Common import ExtractError, LoadExtractScript, OpenROM, ChooseFormat, GetMetatileMask, GetPixelSize, LoadMetatileAtlas, ComposeBlocks, ImageSaver, TilesetTypes, SpriteTypes, ScreenTypes
+
+# WayForward preview server script written by Random Talking Bush.
+# Shows the tilesets, sprite frames and maps of an unpacked game (or a GBA ROM) in a web browser, building each image only when it's asked for instead of exporting everything up front.
+
+GameFolder = "" # Folder containing the unpacked game files (and the GBA ROM, if using one). Leave blank to use the current folder.
+Port = 8000 # Port to serve the previews on, open http://localhost:8000/ in a web browser once the script is running. Only this computer can connect to it.
+TSFormat = 1 # Same as the "TSFormat" value in "WayForward_TS-Extract", see the list in that script. Can be changed per preview with "format=" in the address.
+ANMFormat = 0 # Same as the "ANMFormat" value in "WayForward_ANM-Extract", see the list in that script. Can be changed per preview with "format=" in the address.
+LYRFormat = 2 # Same as the "LYRFormat" value in "WayForward_LYR-Extract", see the list in that script. Can be changed per preview with "format=" in the address.
+AutoDetect = True # Set this to False to always use the three format values above, instead of working out the format from each file (same as the "AutoDetect" value in the other scripts). Ignored for previews with "format=" in the address.
+SceneName = "" # The .SCN or .PAL file to use when a preview doesn't name one with "scene=" in the address. Leave blank to use a grayscale palette.
+PaletteNum = 1 # Same as the "PaletteNum" value in "WayForward_ANM-Extract", for sprite previews without "palette=" in the address.
+SpriteWidth = 256 # Same as the "SpriteWidth" and "SpriteHeight" values in "WayForward_ANM-Extract".
+SpriteHeight = 256
+TightBounds = False # Same as the "TightBounds" value in "WayForward_ANM-Extract".
+TileBounds = False # Same as the "TileBounds" value in "WayForward_ANM-Extract".
+RawPalette = True # Same as the "RawPalette" value in the other scripts.
+IndexedColour = True # Same as the "IndexedColour" value in "WayForward_LYR-Extract".
+ROMName = "" # GBA ROM to preview from when an address has "offset=" in it (such as /anm?offset=0x34E368) but no "rom=". Leave blank if you're only using unpacked files.
+CacheSize = 256 # Most memory (in MB) to spend on keeping headers, metatiles, screens and finished images around, so looking at them again is instant. The least recently looked at ones get dropped first.
+CompressLevel = 1 # Same as the "CompressLevel" value in the other scripts. Previews don't get kept, so quick to compress matters more than small here.
+
+# Instructions on how to use this script:
+# 1. Install Python 3 and Pillow: https://github.com/python-pillow/Pillow. Keep this script in the same folder as "WayForward_Common.py" and the three "WayForward_*-Extract" scripts.
+# 2. Unpack the game you want to look through, as explained in the other scripts, and fill in the "GameFolder" entry above along with the three format values (or leave "AutoDetect" on).
+# 3. Run the script (no additional command-line parameters needed), then open http://localhost:8000/ in a web browser. Every tileset, sprite set and map in the folder is listed there. Close the script's window to stop it.
+# 4. Maps need the metatile image of their tileset, same as "WayForward_LYR-Extract". Opening the tileset's preview exports it, so look at the tileset first (with the right scene file) if a map can't find one.
+
+# Addresses:
+# /ts?name=365&scene=362                   The metatile image for "365.ts4", using the palette from "362.scn". Also saved as "365_metatile.png", same as running "WayForward_TS-Extract".
+# /anm/view?name=20&scene=419&palette=1    Every frame of "20.anm", using palette number 1 from "419.scn". Each frame on the page is a link to /anm?name=20&frame=0 (and so on).
+# /lyr/view?name=366&metatiles=BrambleMaze The map of "366.lyr", one screen at a time. Each section is a link to /lyr?name=366&x=0&y=0 (and so on), /lyr?name=366&screen=3 shows screen 3 itself, and /lyr?name=366 the whole map at once.
+# Any of these can take "format=" to use a different format value, and "offset=" (with "rom=" if it's not the "ROMName" above) instead of "name=" to read from a GBA ROM.
+
+# How it works:
+# Nothing gets built until the browser asks for it. A sprite set's page only reads the header and frame table, and the browser only asks for the frames that are scrolled into view, so the rest never get decoded at all. Same goes for map screens.
+# Everything built along the way (headers and frame tables, palettes, the split-up metatile images, screens and the finished PNGs) goes into one cache, limited to "CacheSize" in total. Files are memory-mapped (see OpenROM), and a file that changes on disk gets read again.
+# Previews are built one at a time (the extraction scripts aren't written to be run from several threads at once). Anything already in the cache gets handed straight back without waiting on them.
+
+# Everything below this line should be left alone.
+
+class PreviewCache(object):
+    # Least recently used cache of anything a preview is built from, bounded by roughly how many bytes it holds rather than how many things.
+    def __init__(self, MaxBytes):
+        self.MaxBytes = MaxBytes
+        self.Entries = OrderedDict()
+        self.Bytes = 0
+        self.Hits = 0
+        self.Misses = 0
+        self.Lock = threading.Lock() # Only held while looking something up or putting it in, never while building it.
+
+    def Get(self, Key, Counted=True):
+        with self.Lock:
+            Entry = self.Entries.pop(Key, None)
+            if Entry is None:
+                if Counted == True:
+                    self.Misses = self.Misses + 1
+                return None
+            self.Entries[Key] = Entry # Re-inserting it marks it as the most recently used.
+            if Counted == True:
+                self.Hits = self.Hits + 1
+            return Entry[0]
+
+    def Store(self, Key, Value, Size):
+        with self.Lock:
+            if Key in self.Entries:
+                self.Bytes = self.Bytes - self.Entries.pop(Key)[1]
+            if Size <= self.MaxBytes: # Anything bigger than the whole cache gets handed back without being kept.
+                self.Entries[Key] = (Value, Size)
+                self.Bytes = self.Bytes + Size
+                while self.Bytes > self.MaxBytes:
+                    self.Bytes = self.Bytes - self.Entries.popitem(last=False)[1][1] # Out with the oldest.
+            return Value
+
+    def Report(self):
+        return str(len(self.Entries)) + " things cached, " + str(round(self.Bytes / 1048576.0, 1)) + " of " + str(round(self.MaxBytes / 1048576.0, 1)) + " MB used, " + str(self.Hits) + " hits and " + str(self.Misses) + " misses."
+
+Cache = PreviewCache(CacheSize * 1048576)
+PreviewLock = threading.RLock() # Held while building anything, which can mean building something else first (a map's screens, say).
+
+def Cached(Key, Builder, *BuildArgs):
+    # Hands back the cached value for Key, or builds it with Builder (which hands back the value and roughly how many bytes it takes up) and caches that.
+    Value = Cache.Get(Key)
+    if Value is None:
+        with PreviewLock:
+            Value = Cache.Get(Key, False) # Might've been built by another request while this one was waiting.
+            if Value is None:
+                Value, Size = Builder(*BuildArgs)
+                Cache.Store(Key, Value, Size)
+    return Value
+
+def FileStamp(FileName):
+    # Size and modification time, so anything cached from a file gets built again once the file changes.
+    if not os.path.exists(FileName):
+        return None
+    FileStat = os.stat(FileName)
+    return (FileStat.st_size, FileStat.st_mtime)
+
+def SceneStamp(SceneName):
+    return (FileStamp(SceneName + ".pal"), FileStamp(SceneName + ".scn"))
+
+def CheckPath(FileName):
+    # Previews only ever read from the game folder.
+    if os.path.commonpath([os.getcwd(), os.path.abspath(FileName)]) != os.getcwd():
+        raise ExtractError("'" + FileName + "' isn't in the game folder.")
+    return FileName
+
+def FindSource(Query, FileTypes):
+    # Works out which file a preview reads from: an unpacked file by its name (minus extension), or a spot in a GBA ROM by its offset. Hands back the file, the offset and whether it's unpacked.
+    if 'offset' in Query:
+        SourceName = CheckPath(Query.get('rom', ROMName))
+        if SourceName == "" or not os.path.exists(SourceName):
+            raise ExtractError("Can't find ROM '" + SourceName + "'. Check to make sure you filled in the 'ROMName' entry (or 'rom=' in the address) correctly.")
+        return SourceName, Query['offset'], False
+    FileName = CheckPath(Query.get('name', ""))
+    for FileType in FileTypes:
+        if os.path.exists(FileName + FileType):
+            return FileName + FileType, 0, True
+    raise ExtractError("Can't find '" + FileName + "' as any of " + ", ".join(FileTypes) + ".")
+
+def GetFormat(Query, DefaultFormat):
+    # Hands back the format value and whether to work it out from the file instead.
+    if 'format' in Query:
+        return Query['format'], False
+    return DefaultFormat, AutoDetect
+
+def EncodePNG(ImageData):
+    PNGData = ImageSaver(0, CompressLevel).Encode(ImageData)
+    return PNGData, len(PNGData)
+
+# --------------------------------------------------------------------------------
+# Tilesets.
+# --------------------------------------------------------------------------------
+
+def BuildTileset(SourceName, Start, Unpacked, FileFormat, FormatAuto, SceneName):
+    # Runs the tileset through "WayForward_TS-Extract" itself, which skips it if the metatile image on disk is already up to date. Maps need that image anyway.
+    TilesetName = os.path.splitext(SourceName)[0] if Unpacked == True else str(Start)
+    LoadExtractScript('TS').ExtractTileset(TilesetName=TilesetName, SceneName=SceneName, TSFormat=FileFormat, UseGBAROM=Unpacked == False, ROMName=SourceName, TilesetStart=Start, RawPalette=RawPalette, SkipUnchanged=True, AutoDetect=FormatAuto, CompressLevel=CompressLevel)
+    with open(TilesetName + '_metatile.png', "rb") as pngfile:
+        PNGData = pngfile.read()
+    return PNGData, len(PNGData)
+
+def PreviewTileset(Query):
+    SourceName, Start, Unpacked = FindSource(Query, TilesetTypes)
+    FileFormat, FormatAuto = GetFormat(Query, TSFormat)
+    Scene = CheckPath(Query.get('scene', SceneName))
+    return 'image/png', Cached(('TS', SourceName, Start, FileFormat, FormatAuto, Scene, FileStamp(SourceName), SceneStamp(Scene)), BuildTileset, SourceName, Start, Unpacked, FileFormat, FormatAuto, Scene)
+
+# --------------------------------------------------------------------------------
+# Sprite sets.
+# --------------------------------------------------------------------------------
+
+def LoadSpriteSet(SourceName, Start, Unpacked, FileFormat, FormatAuto, SceneName):
+    # Reads just the header, frame table and palette. The frames themselves get built one at a time, as they're asked for.
+    ANMScript = LoadExtractScript('ANM')
+    anmfile = OpenROM(SourceName)
+    SpriteSet = {'Format': ChooseFormat('ANM', anmfile.View, Start, FileFormat, FormatAuto, Unpacked)}
+    SpriteSet['Palette'] = ANMScript.LoadSpritePalette(anmfile, Start, SpriteSet['Format'], Unpacked == False, SceneName, RawPalette, {})
+    SpriteSet['Flags'], SpriteSet['FrameTotal'], SpriteTileStart, SpriteTileSize = ANMScript.ReadSpriteHeader(anmfile, Start, SpriteSet['Format'], Unpacked == False)
+    SpriteSet['FrameOffset'], SpriteSet['FrameStart'], FrameLength = ANMScript.ReadFrameTable(anmfile, SpriteSet['FrameTotal'], Start, SpriteTileStart, SpriteSet['Format'])
+    if SpriteSet['Format'] == 6:
+        SpriteSet['SpriteStarts'] = ANMScript.ScanLeapsterFrames(anmfile, SpriteSet['FrameOffset'], SpriteSet['FrameTotal'], SpriteTileStart)[0] # Leapster frames can't be found without walking through the ones before them.
+    else:
+        SpriteSet['SpriteStarts'] = dict((x, SpriteTileStart) for x in range(SpriteSet['FrameTotal']))
+    return SpriteSet, 1024 + (SpriteSet['FrameTotal'] * 256)
+
+def GetSpriteSet(Query):
+    SourceName, Start, Unpacked = FindSource(Query, SpriteTypes)
+    FileFormat, FormatAuto = GetFormat(Query, ANMFormat)
+    Scene = CheckPath(Query.get('scene', SceneName))
+    SpriteKey = ('ANM', SourceName, Start, FileFormat, FormatAuto, Scene, FileStamp(SourceName), SceneStamp(Scene))
+    return SpriteKey, SourceName, Cached(SpriteKey, LoadSpriteSet, SourceName, Start, Unpacked, FileFormat, FormatAuto, Scene)
+
+def BuildSpriteFrame(SourceName, SpriteSet, x, FramePalette):
+    result_image = LoadExtractScript('ANM').RenderFrame(OpenROM(SourceName), SpriteSet['FrameOffset'][x], SpriteSet['FrameStart'][x], SpriteSet['SpriteStarts'][x], SpriteSet['Flags'], SpriteSet['Palette'], SpriteSet['Format'], FramePalette, SpriteWidth, SpriteHeight, TileBounds, RawPalette, TightBounds)[0]
+    return EncodePNG(result_image)
+
+def PreviewSpriteFrame(Query):
+    SpriteKey, SourceName, SpriteSet = GetSpriteSet(Query)
+    x = Query.get('frame', 0)
+    FramePalette = Query.get('palette', PaletteNum)
+    if x < 0 or x >= SpriteSet['FrameTotal']:
+        raise ExtractError("There's no frame " + str(x) + ", the sprite set only has " + str(SpriteSet['FrameTotal']) + ".")
+    if FramePalette < 0 or FramePalette > 15:
+        raise ExtractError("Invalid palette number (" + str(FramePalette) + "). Make sure it's within the 0-15 range.")
+    return 'image/png', Cached(SpriteKey + ('Frame', x, FramePalette), BuildSpriteFrame, SourceName, SpriteSet, x, FramePalette)
+
+def ViewSpriteSet(Query):
+    SpriteKey, SourceName, SpriteSet = GetSpriteSet(Query)
+    FramePalette = Query.get('palette', PaletteNum)
+    PageLines = [PageTitle(SourceName + " (" + str(SpriteSet['FrameTotal']) + " frames, ANMFormat = " + str(SpriteSet['Format']) + ")")]
+    PageLines.append("<p>Palette: " + " ".join([PageLink('/anm/view', Query, {'palette': VariantNum}, str(VariantNum)) for VariantNum in range(16)]) + "</p>")
+    for x in range(SpriteSet['FrameTotal']):
+        PageLines.append(PageImage('/anm', Query, {'frame': x, 'palette': FramePalette}, str(x)))
+    return 'text/html', PageData(PageLines)
+
+# --------------------------------------------------------------------------------
+# Maps.
+# --------------------------------------------------------------------------------
+
+def LoadMap(SourceName, Start, Unpacked, FileFormat, FormatAuto, MetatilesName):
+    # Reads the header and splits up the metatile image, which is everything the screens are built from.
+    LYRScript = LoadExtractScript('LYR')
+    scrfile = OpenROM(SourceName)
+    MapInfo = {'Format': ChooseFormat('LYR', scrfile.View, Start, FileFormat, FormatAuto, Unpacked)}
+    scrfile.seek(Start, 0)
+    ScreenFlags, MapInfo['Width'], MapInfo['Height'], MapInfo['ScreenCount'], MapInfo['TilesetID'], MapInfo['ScreenIDs'] = LYRScript.ReadScreenHeader(scrfile, MapInfo['Format'])
+    MapInfo['ScreenStart'] = scrfile.tell()
+    MapInfo['ScreenIDs'] = [min(ScreenID, MapInfo['ScreenCount']) for ScreenID in MapInfo['ScreenIDs']] # Sections pointing past the screen count are left blank.
+    MapInfo['MetatileFile'] = LYRScript.FindMetatileImage(MapInfo['TilesetID'], MetatilesName)
+    MapInfo['MetatileStamp'] = FileStamp(MapInfo['MetatileFile'])
+    sprfile = Image.open(MapInfo['MetatileFile'])
+    MapInfo['Mask'] = GetMetatileMask(ScreenFlags)
+    if IndexedColour == True and sprfile.mode == 'P':
+        MapInfo['Mode'] = 'P'
+        MapInfo['Palette'] = sprfile.getpalette()
+        MapInfo['Transparency'] = LYRScript.FindBlankIndex(sprfile) # None if every index is taken, in which case the full map gets converted to RGBA (see BuildMapBand).
+    else:
+        MapInfo['Mode'] = 'RGBA'
+        MapInfo['Palette'] = None
+        MapInfo['Transparency'] = None
+    MapInfo['Atlas'] = LoadMetatileAtlas(sprfile, MapInfo['Mask'] + 1, MapInfo['Mode'])
+    return MapInfo, 1024 + (len(MapInfo['ScreenIDs']) * 8) + ((MapInfo['Mask'] + 1) * 256 * GetPixelSize(MapInfo['Mode']))
+
+def GetMap(Query):
+    SourceName, Start, Unpacked = FindSource(Query, ScreenTypes)
+    FileFormat, FormatAuto = GetFormat(Query, LYRFormat)
+    MetatilesName = CheckPath(Query.get('metatiles', ""))
+    MapKey = ('LYR', SourceName, Start, FileFormat, FormatAuto, MetatilesName, FileStamp(SourceName))
+    MapInfo = Cached(MapKey, LoadMap, SourceName, Start, Unpacked, FileFormat, FormatAuto, MetatilesName)
+    if FileStamp(MapInfo['MetatileFile']) != MapInfo['MetatileStamp']:
+        with PreviewLock:
+            MapInfo = Cache.Store(MapKey, *LoadMap(SourceName, Start, Unpacked, FileFormat, FormatAuto, MetatilesName)) # The metatile image got exported again since.
+    return MapKey + (MapInfo['MetatileStamp'],), SourceName, MapInfo # Screens are cached under the metatile image they were built from.
+
+def BuildScreen(SourceName, MapInfo, x):
+    # Raw pixel data for a single screen, built the same way "WayForward_LYR-Extract" builds them.
+    scrfile = OpenROM(SourceName)
+    scrfile.seek(MapInfo['ScreenStart'] + (x * 512), 0)
+    MetatileIDs = [MetatileID & MapInfo['Mask'] for MetatileID in struct.unpack('<256H', scrfile.read(512))]
+    ScreenData = ComposeBlocks(MapInfo['Atlas'], MetatileIDs, 16)
+    return ScreenData, len(ScreenData)
+
+def GetScreen(MapKey, SourceName, MapInfo, x):
+    return Cached(MapKey + ('Screen', x), BuildScreen, SourceName, MapInfo, x)
+
+def BuildScreenImage(MapKey, SourceName, MapInfo, x):
+    if x == MapInfo['ScreenCount']:
+        return EncodePNG(Image.new('RGBA', (256, 256), (0, 0, 0, 0))) # A blank map section.
+    ScreenImage = Image.frombuffer(MapInfo['Mode'], (256, 256), GetScreen(MapKey, SourceName, MapInfo, x), 'raw', MapInfo['Mode'], 0, 1)
+    if MapInfo['Mode'] == 'P':
+        ScreenImage.putpalette(MapInfo['Palette'])
+    return EncodePNG(ScreenImage)
+
+def BuildFullMap(MapKey, SourceName, MapInfo):
+    # Same as the "Full.png" from "WayForward_LYR-Extract", only screens the map actually uses get built.
+    PixelSize = GetPixelSize(MapInfo['Mode'])
+    ScreenRows = [[b''] * (MapInfo['ScreenCount'] + 1) for y in range(256)]
+    for x in set(MapInfo['ScreenIDs']):
+        if x == MapInfo['ScreenCount']:
+            BlankIndex = MapInfo['Transparency'] if MapInfo['Transparency'] != None else 0
+            ScreenData = bytes(bytearray([BlankIndex]) * (256 * 256 * PixelSize))
+        else:
+            ScreenData = GetScreen(MapKey, SourceName, MapInfo, x)
+        for y in range(256):
+            ScreenRows[y][x] = ScreenData[(y * 256 * PixelSize):((y + 1) * 256 * PixelSize)]
+    MapMode = MapInfo['Mode']
+    if MapMode == 'P' and MapInfo['Transparency'] == None and MapInfo['ScreenCount'] in MapInfo['ScreenIDs']:
+        MapMode = 'RGBA' # Every palette index is taken, so the blank sections get cleared after converting to full colour instead.
+    BuildMapBand = LoadExtractScript('LYR').BuildMapBand
+    MapData = b''.join([BuildMapBand(ScreenRows, MapInfo['ScreenIDs'][(y * MapInfo['Width']):((y + 1) * MapInfo['Width'])], MapInfo['ScreenCount'], MapInfo['Mode'], MapInfo['Palette'], MapMode != MapInfo['Mode']) for y in range(MapInfo['Height'])])
+    MapImage = Image.frombuffer(MapMode, (MapInfo['Width'] * 256, MapInfo['Height'] * 256), MapData, 'raw', MapMode, 0, 1)
+    if MapMode == 'P':
+        MapImage.putpalette(MapInfo['Palette'])
+        if MapInfo['Transparency'] != None and MapInfo['ScreenCount'] in MapInfo['ScreenIDs']:
+            MapImage.info['transparency'] = MapInfo['Transparency']
+    return EncodePNG(MapImage)
+
+def PreviewMap(Query):
+    MapKey, SourceName, MapInfo = GetMap(Query)
+    if 'screen' in Query:
+        x = Query['screen']
+        if x < 0 or x >= MapInfo['ScreenCount']:
+            raise ExtractError("There's no screen " + str(x) + ", the map only has " + str(MapInfo['ScreenCount']) + ".")
+    elif 'x' in Query or 'y' in Query:
+        SectionX = Query.get('x', 0); SectionY = Query.get('y', 0)
+        if SectionX < 0 or SectionX >= MapInfo['Width'] or SectionY < 0 or SectionY >= MapInfo['Height']:
+            raise ExtractError("There's no section at " + str(SectionX) + "x" + str(SectionY) + ", the map is only " + str(MapInfo['Width']) + "x" + str(MapInfo['Height']) + " screens.")
+        x = MapInfo['ScreenIDs'][(SectionY * MapInfo['Width']) + SectionX]
+    else:
+        return 'image/png', Cached(MapKey + ('Full',), BuildFullMap, MapKey, SourceName, MapInfo)
+    return 'image/png', Cached(MapKey + ('ScreenImage', x), BuildScreenImage, MapKey, SourceName, MapInfo, x)
+
+def ViewMap(Query):
+    MapKey, SourceName, MapInfo = GetMap(Query)
+    PageLines = [PageTitle(SourceName + " (" + str(MapInfo['Width']) + "x" + str(MapInfo['Height']) + " screens, " + str(MapInfo['ScreenCount']) + " unique, LYRFormat = " + str(MapInfo['Format']) + ", using " + MapInfo['MetatileFile'] + ")")]
+    PageLines.append("<p>" + PageLink('/lyr', Query, {}, "Full map") + "</p>")
+    PageLines.append("<div style=\"display:grid;grid-template-columns:repeat(" + str(MapInfo['Width']) + ",256px);width:" + str(MapInfo['Width'] * 256) + "px\">")
+    for y in range(MapInfo['Height']):
+        for x in range(MapInfo['Width']):
+            PageLines.append(PageImage('/lyr', Query, {'x': x, 'y': y}, str(x) + "x" + str(y), 256, 256))
+    PageLines.append("</div>")
+    return 'text/html', PageData(PageLines)
+
+# --------------------------------------------------------------------------------
+# Pages.
+# --------------------------------------------------------------------------------
+
+def PageAddress(PagePath, Query, Changes):
+    from urllib.parse import urlencode
+    PageQuery = dict(Query)
+    PageQuery.update(Changes)
+    return PagePath + "?" + urlencode(sorted(PageQuery.items()))
+
+def PageTitle(TitleText):
+    from html import escape
+    return "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>" + escape(TitleText) + "</title></head><body style=\"background:#808080;font-family:sans-serif\"><h3>" + escape(TitleText) + "</h3>"
+
+def PageLink(PagePath, Query, Changes, LinkText):
+    from html import escape
+    return "<a href=\"" + escape(PageAddress(PagePath, Query, Changes)) + "\">" + escape(LinkText) + "</a>"
+
+def PageImage(PagePath, Query, Changes, ImageTitle, ImageWidth=None, ImageHeight=None):
+    # The browser only asks for lazily loaded images once they're scrolled into view, which is what keeps the rest of the frames or screens from ever being built.
+    from html import escape
+    ImageAddress = escape(PageAddress(PagePath, Query, Changes))
+    if ImageWidth == None:
+        ImageSize = " style=\"display:block;float:left;min-width:16px;min-height:16px\"" # Frames come in all sizes, so they just get lined up one after another.
+    else:
+        ImageSize = " width=\"" + str(ImageWidth) + "\" height=\"" + str(ImageHeight) + "\" style=\"display:block\"" # Map sections line up in a grid.
+    return "<a href=\"" + ImageAddress + "\"><img loading=\"lazy\" src=\"" + ImageAddress + "\" title=\"" + escape(ImageTitle) + "\"" + ImageSize + "></a>"
+
+def PageData(PageLines):
+    return ("\n".join(PageLines) + "\n</body></html>\n").encode('utf-8')
+
+def ViewIndex(Query):
+    # Lists every tileset, sprite set and map in the game folder.
+    FileNames = sorted(os.listdir("."))
+    PageLines = [PageTitle("WayForward preview: " + os.getcwd())]
+    for ListTitle, FileTypes, PagePath in (("Tilesets", TilesetTypes, '/ts'), ("Sprite sets", SpriteTypes, '/anm/view'), ("Maps", ScreenTypes, '/lyr/view')):
+        ListNames = [os.path.splitext(FileName)[0] for FileName in FileNames if os.path.splitext(FileName)[1].lower() in FileTypes]
+        PageLines.append("<h4>" + ListTitle + " (" + str(len(ListNames)) + ")</h4><p>")
+        PageLines.append(" ".join([PageLink(PagePath, {}, {'name': ListName}, ListName) for ListName in ListNames]))
+        PageLines.append("</p>")
+    PageLines.append("<p>" + Cache.Report() + "</p>")
+    return 'text/html', PageData(PageLines)
+
+QueryNumbers = ('offset', 'format', 'frame', 'palette', 'screen', 'x', 'y')
+Routes = {'/': ViewIndex, '/ts': PreviewTileset, '/anm': PreviewSpriteFrame, '/anm/view': ViewSpriteSet, '/lyr': PreviewMap, '/lyr/view': ViewMap}
+
+def HandleRequest(RequestPath):
+    # Hands back the status code, content type and data for a single request.
+    from urllib.parse import urlsplit, parse_qs
+    RequestParts = urlsplit(RequestPath)
+    Query = dict((QueryName, QueryValues[-1]) for QueryName, QueryValues in parse_qs(RequestParts.query).items())
+    if RequestParts.path not in Routes:
+        return 404, 'text/plain', b"Nothing here. Start from / instead."
+    try:
+        for QueryName in QueryNumbers:
+            if QueryName in Query:
+                Query[QueryName] = int(Query[QueryName], 0 if QueryName == 'offset' else 10) # Offsets can be in hex, like "0x34E368".
+    except ValueError as Error:
+        return 400, 'text/plain', ("Couldn't read a number in the address: " + str(Error)).encode('utf-8')
+    try:
+        ContentType, ContentData = Routes[RequestParts.path](Query)
+        return 200, ContentType, ContentData
+    except ExtractError as Error:
+        return 404, 'text/plain', str(Error).encode('utf-8')
+    except Exception as Error:
+        # The wrong format value or a broken file can go wrong in any number of ways, which shouldn't bring the whole server down.
+        return 500, 'text/plain', (type(Error).__name__ + ": " + str(Error)).encode('utf-8')
+
+def RunServer():
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class PreviewHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            Status, ContentType, ContentData = HandleRequest(self.path)
+            self.send_response(Status)
+            self.send_header('Content-Type', ContentType)
+            self.send_header('Content-Length', str(len(ContentData)))
+            self.send_header('Cache-Control', 'no-cache') # The browser checks back each time, so changed files show up. Repeat views still come from the cache here.
+            self.end_headers()
+            self.wfile.write(ContentData)
+
+    if GameFolder != "":
+        if not os.path.isdir(GameFolder):
+            raise ExtractError("Can't find '" + GameFolder + "'. Check to make sure you filled in the 'GameFolder' entry correctly.")
+        os.chdir(GameFolder)
+    Server = ThreadingHTTPServer(('127.0.0.1', Port), PreviewHandler)
+    print("Previewing " + os.getcwd() + " at http://localhost:" + str(Port) + "/ (close this window to stop).")
+    try:
+        Server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    Server.server_close()
+
+if __name__ == "__main__":
+    try:
+        RunServer()
+    except ExtractError as Error:
+        print(Error)
+    os.system('pause')
@@ -0,0 +1,70 @@
+import os
+import time
+from WayForward_Common import ExtractError, OpenROM, ScanROM, RankCandidates
+
+# WayForward GBA ROM scanning script written by Random Talking Bush.
+# Looks through an entire GBA ROM for anything resembling a tileset, sprite set or screen file, and lists the offsets to fill in for "TilesetStart", "SpriteStart" and "ScreenStart" in the other scripts.
+
+ROMName = "Shantae.gba" # GBA ROM file to scan, it can either be a relative name or a full path.
+TSFormat = 1 # Same as the "TSFormat" value in "WayForward_TS-Extract", see the list in that script. Only 0 and 1 are used by GBA games.
+ANMFormat = 0 # Same as the "ANMFormat" value in "WayForward_ANM-Extract", see the list in that script. Only 0, 1 and 2 are used by GBA games.
+LYRFormat = 2 # Same as the "LYRFormat" value in "WayForward_LYR-Extract", see the list in that script.
+ScanTilesets = True # Set any of these to False to skip looking for that type of file.
+ScanSprites = True
+ScanScreens = True
+MinScore = 75 # Candidates scoring lower than this (out of 100) are left out. Lower it if something you know is there doesn't show up.
+MaxResults = 40 # How many candidates of each type to print. The full list always gets saved to the output file.
+OutputName = "" # Text file to save the full candidate list to. Leave blank to use the ROM's name with "_scan.txt" on the end.
+
+# Instructions on how to use this script:
+# 1. Install Python (either 2 or 3, both work). Pillow isn't needed for this one, but "WayForward_Common.py" has to be in the same folder as this script.
+# 2. Fill in the "ROMName" entry above, along with the three format values from the lists in the other scripts.
+# 3. Run the script (no additional command-line parameters needed). The best candidates of each type get printed, highest score first, and everything else gets saved to the output file.
+# 4. Copy an offset into the "TilesetStart", "SpriteStart" or "ScreenStart" entry of the matching script, and set "UseGBAROM" to True there.
+
+# How it works:
+# Rather than checking all eight million or so offsets in a 32 MB ROM one by one, each type has a pattern built from its header rules (such as the flag values, and counts which can't be zero or too large), which gets searched for across the entire ROM in one go.
+# Only the offsets matching that pattern (and ending in 0, 4, 8 or C) get checked properly, which also looks at the data after the header: metatiles pointing at real tiles, frame tables in order, screen IDs within the screen count, and so on.
+# Candidates that start inside the data of a higher-scoring candidate are dropped, since a bunch of tile graphics can easily look like a header by chance. The checks themselves are in "WayForward_Common.py", shared with "WayForward_Asset-Index".
+
+# Everything below this line should be left alone.
+
+OffsetNames = {'TS': 'TilesetStart', 'ANM': 'SpriteStart', 'LYR': 'ScreenStart'}
+
+def DescribeCandidate(Candidate):
+    return Candidate['Type'].ljust(4) + OffsetNames[Candidate['Type']] + " = " + str(hex(Candidate['Offset'])).ljust(10) + " score " + str(Candidate['Score']).rjust(3) + ", ends at " + str(hex(Candidate['End'])) + " (" + Candidate['Info'] + ")"
+
+def RunScan():
+    if not os.path.exists(ROMName):
+        raise ExtractError("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
+    ROMData = OpenROM(ROMName).View # The whole mapped ROM, searched without copying it.
+    StartTime = time.time()
+    ScanTypes = [FileType for FileType, ScanType in (('TS', ScanTilesets), ('ANM', ScanSprites), ('LYR', ScanScreens)) if ScanType == True]
+    Candidates, ScanStats = ScanROM(ROMData, TSFormat, ANMFormat, LYRFormat, ScanTypes, MinScore)
+    for FileType, Matched, ScanTime in ScanStats:
+        print(FileType + ": " + str(Matched) + " offsets matched the header pattern, checked in " + str(round(ScanTime, 2)) + " seconds.")
+    Ranked = RankCandidates(Candidates)
+    print("Scanned " + str(len(ROMData)) + " bytes in " + str(round(time.time() - StartTime, 2)) + " seconds, found " + str(len(Ranked)) + " candidates.")
+
+    for FileType in ('TS', 'ANM', 'LYR'):
+        TypeCandidates = [Candidate for Candidate in Ranked if Candidate['Type'] == FileType]
+        if len(TypeCandidates) > 0:
+            print("--------------------------------------------------------------------------------")
+            for Candidate in TypeCandidates[0:MaxResults]:
+                print(DescribeCandidate(Candidate))
+            if len(TypeCandidates) > MaxResults:
+                print("...and " + str(len(TypeCandidates) - MaxResults) + " more " + FileType + " candidates in the output file.")
+
+    outfile = OutputName if OutputName != "" else os.path.splitext(ROMName)[0] + "_scan.txt"
+    with open(outfile, "w") as scanfile:
+        for Candidate in Ranked:
+            scanfile.write(DescribeCandidate(Candidate) + "\n")
+    print("Saved to " + outfile)
+    return Ranked
+
+if __name__ == "__main__":
+    try:
+        RunScan()
+    except ExtractError as Error:
+        print(Error)
+    os.system('pause')
@@ -4,11 +4,13 @@ import platform
 import glob
 import struct
 from PIL import Image, ImagePalette
+from WayForward_Common import ExtractError, DecodeTiles4BPP, ShiftPaletteRow, TileCache, OpenROM, ReadPalette, GrayscalePalette, ConvertARGB4444, DecompressLZSS, MappedFile, AddInput, CheckManifest, SaveManifest, ChooseFormat, StageTimer, CountFile, ImageSaver
 
 # WayForward GBA/DS/LeapFrog Didj/Leapster tileset (*.TS4 / *.TS8) metatile extraction script written by Random Talking Bush.
 # Based only slightly on onepill's TextureUnpacker script: https://github.com/onepill/texture_unpacker_scirpt
 
 TSFormat = 0 # See the list below for which value should be used for the game you're ripping from.
+AutoDetect = False # Set this to True to work out the "TSFormat" value from the tileset itself instead, by checking which format its header and metatile data make the most sense for. Even when this is False, the script warns if the file looks like it's in a different format.
 TilesetName = "365" # The name of the tileset TS4/TS8 file, minus extension. Will also be the exported image's filename with a "_metatile" suffix added. (Example: "363" and "365" are for the Bramble Maze's background and foreground .TS4 filenames respectively when using my QuickBMS script to unpack Shantae Advance: Risky Revolution.)
 SceneName = "362" # The name of the .SCN or .PAL file to use the palette from, minus extension. Leave blank to use a grayscale palette. (Example: "362" is filename for the Bramble Maze scene when using my QuickBMS script to unpack Shantae Advance: Risky Revolution.) Ignored when TSFormat = 4 (Leapster sprites have no separate palettes).
 
@@ -18,9 +20,15 @@ TilesetStart = 0x962774 # Offset to the start of metatile data in a GBA ROM. Ign
 SceneStart = 0x95C5DC # Offset to the start of scene data in a GBA ROM. Ignored when UseGBAROM is False. (Example: 0x95C5DC is the offset to the Bramble Maze's SCN file in Shantae Advance: Risky Revolution.)
 TileDelimiter = False # Debug option for GBA tilesets with more than 1024 tiles (see "BROKEN TILESETS" section below). This will start ignoring the tile flip flags as soon as it detects a tile with ID 0x0400 (which would correspond to a horizontally-flipped blank tile). This will not "repair" the tileset, but it will make the last section at least *somewhat* legible.
 RawPalette = True # Set this to True to read palette values as multiples of 8 (0, 8, 16, etc. with max of 248 for DS or 240 for Leapster). Set this to False to recalculate them to 255 maximum like most emulators would display.
+TileCacheSize = 4096 # How many decoded tiles (along with their flipped variants) to keep in memory, so tiles reused across metatiles only get decoded once. Set this to 0 to disable the cache.
+SkipUnchanged = False # Set this to True to skip re-exporting the tileset if neither its files nor the settings above have changed since last time. Each export saves a "_manifest.json" file next to the metatile image, recording what it was made from.
+CompressLevel = 6 # How hard to compress the PNG, from 0 (fastest to save, largest file) to 9 (slowest to save, smallest file). The image itself comes out the same either way.
+OptimizePNG = False # Set this to True to squeeze the PNG down as small as it'll go, which takes a while longer to save. Handy for a final export, not so much while trying out settings.
+Instrument = False # Set this to True to time each stage of the export (header, palette, tile decoding, flipping, pasting and saving) and count the bytes read, seeks made and tile cache hits, saved as a "_timing.json" file next to the metatile image.
 
 # Instructions on how to use this script:
 # 1. Install both Python (either 2 or 3, both work) and Pillow: https://github.com/python-pillow/Pillow
+# 1B. Keep the "WayForward_Common.py" file in the same folder as this script, it contains functions shared between all of the extraction scripts.
 # 2. If ripping from a GBA game, use QuickBMS (https://aluigi.altervista.org/quickbms.htm) and one of my "WayForwardGBA" scripts (https://github.com/RandomTBush/RTB-QuickBMS-Scripts/tree/master/Archive) to unpack the game you want to rip from. For DS or Didj games, you can use something like Tinke to unpack the former and 7-Zip for the latter.
 # 3. For a .TS4/.TS8 file, set the UseGBAROM option to False. Change the path for the "TilesetName" entry above to the name of the .TS4/.TS8 file you want to extract from , and set "SceneName" to the SCN file you want to user the palette from.
 # 4. Run the script (no additional command-line parameters needed). If everything's ret-2-go, then resulting "metatile" set can be found in the same folder as the script. This can be used with my "LYR" script to generate a complete screen / map image.
@@ -28,10 +36,12 @@ RawPalette = True # Set this to True to read palette values as multiples of 8 (0
 # ROM-file ripping (for experts):
 # 3B. Set the UseGBAROM option to True, change the name for the "ROMName" entry to match the GBA ROM you want to try extracting a tileset from (eg. "Shantae.gba", it can either be a relative name or a full path), and the "TilesetName" entry to the name of the extracted tileset PNG (see #4 in the previous section).
 # 3C. Locate the start of the tileset information in the GBA ROM, which has the visual appearance of random pixels scattered about and is always located above the tileset (not below). At the very top of the "thinner" set and immediately following the tiles of the previous sprite set should be the offset you want to fill in for the "SpriteStart" value above.
+# 3D. Alternatively, run my "WayForward_ROM-Scan" script on the ROM first. It lists every offset that looks like the start of a file, best matches first, so you can copy one of the "TilesetStart" offsets marked TS straight from there.
 
 # Troubleshooting:
 # If the script throws an error or doesn't export anything, check to make sure that you have the right "TSFormat" and "TilesetName" values filled in.
 # If extracting from a GBA ROM instead of a .TS4/.TS8 file, make sure that the "TilesetStart" offset ends in either 0, 4, 8 or C, double-check in a hex editor to make sure you're in the right spot if you need to. The metatile assembly data starts with either 0x0000, 0x0001, or 0x0010 usually, with a block of eight "00" bytes a few ahead of it (the first metatile is always empty). Shift it forward or backward by 4 at a time if you need to.
+# Tilesets with the 0x0004 flag set are LZSS-compressed (the same kind the GBA/DS BIOS uses), and get decompressed automatically. If one of those throws an LZSS error, the file is either broken or the flag means something else for that game. "WayForward_LZSS-Benchmark" can be used to check the decompressor against a slower, simpler one.
 
 # Works with the following games:
 # --------------------------------------------------------------------------------
@@ -104,201 +114,230 @@ RawPalette = True # Set this to True to read palette values as multiples of 8 (0
 # --------------------------------------------------------------------------------
 # Everything below this line should be left alone.
 
-if UseGBAROM == False:
-    TilesetStart = 0x0 # Zeroing out the offset, as .TS4/.TS8 files have it at the beginning.
-    if not os.path.exists(TilesetName + ".ts4"):
-        if not os.path.exists(TilesetName + ".ts8"):
-            print("Can't find '" + TilesetName + ".ts4' or '" + TilesetName + ".ts8'. Check to make sure you filled in the 'TilesetName' entry correctly.")
-            os.system('pause')
-            exit()
+def ExtractTileset(TilesetName=TilesetName, SceneName=SceneName, TSFormat=TSFormat, UseGBAROM=UseGBAROM, ROMName=ROMName, TilesetStart=TilesetStart, SceneStart=SceneStart, TileDelimiter=TileDelimiter, RawPalette=RawPalette, TileCacheSize=TileCacheSize, SkipUnchanged=SkipUnchanged, AutoDetect=AutoDetect, Instrument=Instrument, CompressLevel=CompressLevel, OptimizePNG=OptimizePNG):
+    OutputFiles = [] # Every file saved, handed back to whoever called this.
+    Timer = StageTimer(Instrument) # Does nothing unless "Instrument" is on.
+    Inputs = {} # Every file read (and its hash), for the manifest.
+
+    if UseGBAROM == False:
+        TilesetStart = 0x0 # Zeroing out the offset, as .TS4/.TS8 files have it at the beginning.
+        if not os.path.exists(TilesetName + ".ts4"):
+            if not os.path.exists(TilesetName + ".ts8"):
+                raise ExtractError("Can't find '" + TilesetName + ".ts4' or '" + TilesetName + ".ts8'. Check to make sure you filled in the 'TilesetName' entry correctly.")
+            else:
+                ts4file = open(TilesetName + '.ts8', "rb") # Opens a .TS8 file, uses the name listed in "TilesetName" above.
+                AddInput(Inputs, TilesetName + '.ts8')
         else:
-            ts4file = open(TilesetName + '.ts8', "rb") # Opens a .TS8 file, uses the name listed in "TilesetName" above.
-    else:
-        ts4file = open(TilesetName + '.ts4', "rb") # Opens a .TS4 file, uses the name listed in "TilesetName" above.
-else:
-    if not os.path.exists(ROMName):
-        print("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
-        os.system('pause')
-        exit()
+            ts4file = open(TilesetName + '.ts4', "rb") # Opens a .TS4 file, uses the name listed in "TilesetName" above.
+            AddInput(Inputs, TilesetName + '.ts4')
     else:
-        ts4file = open(ROMName, "rb") # Opens a ROM file needed to extract tileset data, see the above note for the "TilesetStart" offset.
+        if not os.path.exists(ROMName):
+            raise ExtractError("Can't find " + ROMName + ". Check to make sure you filled in the 'ROMName' entry correctly.")
+        else:
+            ts4file = OpenROM(ROMName) # Maps a ROM file (shared with any other extractions from the same ROM) needed to extract tileset data, see the above note for the "TilesetStart" offset.
 
-if TSFormat != 4:
-    if UseGBAROM == False and TSFormat == 3:
-        # LeapFrog Didj has a 0x200 palette block at the beginning of its .TS4/.TS8 files, which is considered part of the file for its offset calculations.
-        print("Didj format tileset, using internal palette.")
-        ts4file.seek(0, 0) # Start reading the TS4/TS8 file.
-        TS4Palette = bytearray()
-        # I am doing it this way for the sake of "raw" palettes, and so that the method is compatible with both Python 2 and 3.
-        for x in range(256):
-            PaletteBytes = struct.unpack('<H', ts4file.read(2))[0]
-            PaletteByteA = ((PaletteBytes & 0x001F)) * 8
-            PaletteByteB = ((PaletteBytes & 0x03E0) >> 5) * 8
-            PaletteByteC = ((PaletteBytes & 0x7C00) >> 10) * 8
-            if RawPalette == False:
-                PaletteByteA = PaletteByteA + ((PaletteByteA + 1) // 32)
-                PaletteByteB = PaletteByteB + ((PaletteByteB + 1) // 32)
-                PaletteByteC = PaletteByteC + ((PaletteByteC + 1) // 32)
-            TS4Palette.append(PaletteByteA)
-            TS4Palette.append(PaletteByteB)
-            TS4Palette.append(PaletteByteC)
+    ts4file = CountFile(ts4file, Timer) # Counting bytes read and seeks made, if "Instrument" is on.
+
+    if UseGBAROM == False:
+        TSFormat = ChooseFormat('TS', ts4file.read(), 0, TSFormat, AutoDetect) # Checking the header against every format before going any further.
+        ts4file.seek(0, 0) # Back to the top of the .TS4/.TS8 file.
     else:
-        ts4file.seek(TilesetStart, 0) # Start reading the .TS4 / .TS8 / ROM file.
-        if os.path.exists(SceneName + ".pal") or os.path.exists(SceneName + ".scn"):
-            if os.path.exists(SceneName + ".pal"):
-                scnfile = open(SceneName + ".pal", "rb") # Opens a .PAL file to extract palette information from.
-            elif os.path.exists(SceneName + ".scn"):
-                scnfile = open(SceneName + ".scn", "rb") # Opens a .SCN file to extract palette information from.
-            scnfile.seek(0, 0) # Background palettes are in the first half of the SCN file.
-            TS4Palette = bytearray()
-            # I am doing it this way for the sake of "raw" palettes, and so that the method is compatible with both Python 2 and 3.
-            for x in range(256):
-                PaletteBytes = struct.unpack('<H', scnfile.read(2))[0]
-                PaletteByteA = ((PaletteBytes & 0x001F)) * 8
-                PaletteByteB = ((PaletteBytes & 0x03E0) >> 5) * 8
-                PaletteByteC = ((PaletteBytes & 0x7C00) >> 10) * 8
-                if RawPalette == False:
-                    PaletteByteA = PaletteByteA + ((PaletteByteA + 1) // 32)
-                    PaletteByteB = PaletteByteB + ((PaletteByteB + 1) // 32)
-                    PaletteByteC = PaletteByteC + ((PaletteByteC + 1) // 32)
-                TS4Palette.append(PaletteByteA)
-                TS4Palette.append(PaletteByteB)
-                TS4Palette.append(PaletteByteC)
+        TSFormat = ChooseFormat('TS', ts4file.View, TilesetStart, TSFormat, AutoDetect, False)
+
+    Timer.Start('Palette')
+    if TSFormat != 4:
+        if UseGBAROM == False and TSFormat == 3:
+            # LeapFrog Didj has a 0x200 palette block at the beginning of its .TS4/.TS8 files, which is considered part of the file for its offset calculations.
+            print("Didj format tileset, using internal palette.")
+            ts4file.seek(0, 0) # Start reading the TS4/TS8 file.
+            TS4Palette = ReadPalette(ts4file, RawPalette) # Converted through a lookup table, built once for the "RawPalette" setting.
         else:
-            if SceneName == "":
-                print("Defaulting to grayscale palette.")
+            ts4file.seek(TilesetStart, 0) # Start reading the .TS4 / .TS8 / ROM file.
+            if os.path.exists(SceneName + ".pal") or os.path.exists(SceneName + ".scn"):
+                if os.path.exists(SceneName + ".pal"):
+                    scnfile = open(SceneName + ".pal", "rb") # Opens a .PAL file to extract palette information from.
+                    AddInput(Inputs, SceneName + ".pal")
+                elif os.path.exists(SceneName + ".scn"):
+                    scnfile = open(SceneName + ".scn", "rb") # Opens a .SCN file to extract palette information from.
+                    AddInput(Inputs, SceneName + ".scn")
+                scnfile.seek(0, 0) # Background palettes are in the first half of the SCN file.
+                TS4Palette = ReadPalette(scnfile, RawPalette) # Converted through a lookup table, built once for the "RawPalette" setting.
             else:
-                print("Couldn't find '" + SceneName + ".scn' or '" + SceneName + ".pal', defaulting to grayscale instead.")
-            TS4Palette = bytearray() # Forcing a grayscale palette for Python 3 compatibility.
-            for x in range(256):
-                TS4Palette.append(x) 
-                TS4Palette.append(x)
-                TS4Palette.append(x)
+                if SceneName == "":
+                    print("Defaulting to grayscale palette.")
+                else:
+                    print("Couldn't find '" + SceneName + ".scn' or '" + SceneName + ".pal', defaulting to grayscale instead.")
+                TS4Palette = GrayscalePalette() # Forcing a grayscale palette.
+    Timer.Stop('Palette')
 
-TilesetFlags = struct.unpack('<H', ts4file.read(2))[0] # Flags. 0x0001 = 256-colour / .TS8 file, 0x0004 = LZSS-compressed, 0x0010 = ???.
-MetatileCount = struct.unpack('<H', ts4file.read(2))[0] # How many 16x16 metatiles (consisting of four 8x8 tiles) there are.
-TileCount = struct.unpack('<H', ts4file.read(2))[0] # How many 8x8 tiles there are.
-if TSFormat > 0:
-    MetatileUnk = struct.unpack('<H', ts4file.read(2))[0] # Early GBA games don't have a fourth set of bytes in the header.
+    Timer.Start('Header')
+    TilesetFlags = struct.unpack('<H', ts4file.read(2))[0] # Flags. 0x0001 = 256-colour / .TS8 file, 0x0004 = LZSS-compressed, 0x0010 = ???.
+    MetatileCount = struct.unpack('<H', ts4file.read(2))[0] # How many 16x16 metatiles (consisting of four 8x8 tiles) there are.
+    TileCount = struct.unpack('<H', ts4file.read(2))[0] # How many 8x8 tiles there are.
+    if TSFormat > 0:
+        MetatileUnk = struct.unpack('<H', ts4file.read(2))[0] # Early GBA games don't have a fourth set of bytes in the header.
+    if TilesetFlags & 0x0004 == 0x0004:
+        print("LZSS-compressed tileset, decompressing.")
+        CompressedStart = ts4file.tell()
+        Timer.Start('Decompress')
+        TilesetData, CompressedSize = DecompressLZSS(ts4file) # Everything after the header gets decompressed in one go...
+        Timer.Stop('Decompress')
+        ts4file = CountFile(MappedFile(TilesetData, CompressedStart), Timer) # ...and read from there on out, using the same offsets an uncompressed tileset would have.
 
-if TSFormat == 2 or TSFormat == 3:
-    TileOffset = (ts4file.tell() + (MetatileCount * 16)) # DS/Didj games have twice the buffer size compared to the GBA games.
-elif TSFormat == 4:
-    TileFlipRet = (ts4file.tell() + (MetatileCount * 8)) # Leapster games have an additional buffer meant for tile flip flags, after the metatile data and before the tile graphics. Store it for later.
-    TileOffset = TileFlipRet + (MetatileCount * 4) # Add the tile flip buffer to the offset as well.
-else:
-    TileOffset = (ts4file.tell() + (MetatileCount * 8))
+    if TSFormat == 2 or TSFormat == 3:
+        TileOffset = (ts4file.tell() + (MetatileCount * 16)) # DS/Didj games have twice the buffer size compared to the GBA games.
+    elif TSFormat == 4:
+        TileFlipRet = (ts4file.tell() + (MetatileCount * 8)) # Leapster games have an additional buffer meant for tile flip flags, after the metatile data and before the tile graphics. Store it for later.
+        TileOffset = TileFlipRet + (MetatileCount * 4) # Add the tile flip buffer to the offset as well.
+    else:
+        TileOffset = (ts4file.tell() + (MetatileCount * 8))
+    Timer.Stop('Header')
 
-if TileCount > 1024 and TSFormat < 2:
-    print("WARNING: Tileset uses GBA format and has over 1024 tiles. Expect broken metatiles.")
+    if UseGBAROM == True:
+        if TilesetFlags & 0x0004 == 0x0004:
+            AddInput(Inputs, ROMName, TilesetStart, CompressedStart + CompressedSize) # Only the tileset's own part of the ROM counts.
+        elif TilesetFlags & 0x0001 == 1:
+            AddInput(Inputs, ROMName, TilesetStart, TileOffset + (TileCount * (0x80 if TSFormat == 4 else 0x40)))
+        else:
+            AddInput(Inputs, ROMName, TilesetStart, TileOffset + (TileCount * 0x20))
+    Settings = {'Script': 'TS', 'TSFormat': TSFormat, 'RawPalette': RawPalette, 'TileDelimiter': TileDelimiter, 'CompressLevel': CompressLevel, 'OptimizePNG': OptimizePNG}
+    ManifestName = TilesetName + '_manifest.json'
+    if SkipUnchanged == True:
+        SavedFiles = CheckManifest(ManifestName, Inputs, Settings)
+        if SavedFiles != None:
+            print("Nothing's changed since " + ManifestName + " was saved, skipping.")
+            return SavedFiles + [ManifestName]
 
-SheetHeight = (MetatileCount & 0xFFF0) # Maths to determine how large the metatile sheet needs to be
-if (MetatileCount & 0x000F) != 0:
-    SheetHeight = SheetHeight + 16 # If it's not a full line, compensate for leftovers.
+    if TileCount > 1024 and TSFormat < 2:
+        print("WARNING: Tileset uses GBA format and has over 1024 tiles. Expect broken metatiles.")
 
-MetatilePasteX = 0; MetatilePasteY = 0 # Initializing values for metatile assembly.
-if TSFormat == 4:
-    TileImage = Image.new('RGBA', (256, SheetHeight), (0, 0, 0, 0)) # Initializing a full-colour metatile PNG in memory.
-else:
-    TileImage = Image.new('P', (256, SheetHeight), (0, 0, 0, 255)) # Initializing a paletted metatile PNG in memory.
-TileFix = False # In case of emergency, break glass.
+    SheetHeight = (MetatileCount & 0xFFF0) # Maths to determine how large the metatile sheet needs to be
+    if (MetatileCount & 0x000F) != 0:
+        SheetHeight = SheetHeight + 16 # If it's not a full line, compensate for leftovers.
 
-for x in range(MetatileCount):
-    for y in range(4):
-        if TSFormat == 2 or TSFormat == 3:
-            MetatileFlags = struct.unpack('<L', ts4file.read(4))[0] # Four bytes shared between three different information sets below.
-            TileID = (MetatileFlags & 0x0000FFFF) # I don't know the upper limit for this (one of the largest TS4 files, FV_PF_ALL_TS4_NIGHT.ts4 from Where the Wild Things Are, goes up to 0x0875 / 2165).
-            TileFlip = (MetatileFlags & 0x0C000000) >> 26 # Second nibble controls horizontal flip (4), vertical flip (8) or both (C).
-            TilePalette = (MetatileFlags & 0xF0000000) >> 24 # Upper nibble controls which palette set it uses.
-        elif TSFormat == 4:
-            TileID = struct.unpack('<H', ts4file.read(2))[0] # No "flags" so to speak, simply a two-byte tile ID.
-            TileRet = ts4file.tell() # We'll be back in a sec.
-            ts4file.seek(TileFlipRet, 0) # Hop to the tile flip buffer from earlier.
-            TileFlip = (struct.unpack('<B', ts4file.read(1))[0]) >> 2 # Only values are 0x00 (none), 0x04 (horizontal flip), 0x08 (vertical flip, and 0x0C (both).
-            TileFlipRet = TileFlipRet + 1 # Add one to the offset.
-            ts4file.seek(TileRet, 0) # And back to where we were earlier.
-        else:
-            MetatileFlags = struct.unpack('<H', ts4file.read(2))[0] # Two bytes shared between three different information sets below.
-            if TileDelimiter == True and MetatileFlags & 0x0FFF == 0x0400:
-                TileFix = True # Flip the switch.
-            if TileFix == True:
-                TileID = (MetatileFlags & 0x07FF) # Time to break things. Or "un-break" things. Either way.
-                TileFlip = 0 # Ignoring the horizontal and vertical flip flags since the former's been absorbed by tile #1024+.
+    MetatilePasteX = 0; MetatilePasteY = 0 # Initializing values for metatile assembly.
+    if TSFormat == 4:
+        TileImage = Image.new('RGBA', (256, SheetHeight), (0, 0, 0, 0)) # Initializing a full-colour metatile PNG in memory.
+    else:
+        TileImage = Image.new('P', (256, SheetHeight), (0, 0, 0, 255)) # Initializing a paletted metatile PNG in memory.
+    TileFix = False # In case of emergency, break glass.
+    TileCacheData = TileCache(TileCacheSize) # Decoded (and flipped) tiles get reused across metatiles.
+
+    Timer.Start('Decode')
+    if TilesetFlags & 0x0001 == 0 and TSFormat != 4:
+        TileRet = ts4file.tell() # We'll be back in a sec.
+        ts4file.seek(TileOffset, 0)
+        TileIndices = DecodeTiles4BPP(ts4file.read(TileCount * 0x20)) # Decode every 16-colour tile in one go, the palette row gets applied per metatile quadrant later on.
+        ts4file.seek(TileRet, 0) # And back to the metatile data.
+    elif TSFormat == 4:
+        MetatileData = struct.unpack('<' + str(MetatileCount * 4) + 'H', ts4file.read(MetatileCount * 8)) # Leapster tile IDs, four per metatile, all read in one go...
+        MetatileFlips = bytearray(ts4file.read(MetatileCount * 4)) # ...followed by the tile flip buffer, rather than hopping back and forth between the two for every quadrant.
+        if TilesetFlags & 0x0001 == 1:
+            TileColours = ConvertARGB4444(ts4file.read(TileCount * 0x80), RawPalette) # Converting every tile in one go as well, 0x100 bytes per tile once it's RGBA.
+        ts4file.seek(TileFlipRet, 0) # Back to the end of the metatile data.
+    Timer.Stop('Decode')
+
+    for x in range(MetatileCount):
+        for y in range(4):
+            if TSFormat == 2 or TSFormat == 3:
+                MetatileFlags = struct.unpack('<L', ts4file.read(4))[0] # Four bytes shared between three different information sets below.
+                TileID = (MetatileFlags & 0x0000FFFF) # I don't know the upper limit for this (one of the largest TS4 files, FV_PF_ALL_TS4_NIGHT.ts4 from Where the Wild Things Are, goes up to 0x0875 / 2165).
+                TileFlip = (MetatileFlags & 0x0C000000) >> 26 # Second nibble controls horizontal flip (4), vertical flip (8) or both (C).
+                TilePalette = (MetatileFlags & 0xF0000000) >> 24 # Upper nibble controls which palette set it uses.
+            elif TSFormat == 4:
+                TileID = MetatileData[(x * 4) + y] # No "flags" so to speak, simply a two-byte tile ID.
+                TileFlip = MetatileFlips[(x * 4) + y] >> 2 # Only values are 0x00 (none), 0x04 (horizontal flip), 0x08 (vertical flip, and 0x0C (both).
             else:
-                TileID = (MetatileFlags & 0x03FF) # Up to 1024 tiles, including a blank one.
-                TileFlip = (MetatileFlags & 0x0C00) >> 10 # Second nibble controls horizontal flip (4), vertical flip (8) or both (C).
-            TilePalette = (MetatileFlags & 0xF000) >> 8 # Upper nibble controls which palette set it uses.
-        if TileID != 0xCCCC:
-            if TSFormat != 4:
+                MetatileFlags = struct.unpack('<H', ts4file.read(2))[0] # Two bytes shared between three different information sets below.
+                if TileDelimiter == True and MetatileFlags & 0x0FFF == 0x0400:
+                    TileFix = True # Flip the switch.
+                if TileFix == True:
+                    TileID = (MetatileFlags & 0x07FF) # Time to break things. Or "un-break" things. Either way.
+                    TileFlip = 0 # Ignoring the horizontal and vertical flip flags since the former's been absorbed by tile #1024+.
+                else:
+                    TileID = (MetatileFlags & 0x03FF) # Up to 1024 tiles, including a blank one.
+                    TileFlip = (MetatileFlags & 0x0C00) >> 10 # Second nibble controls horizontal flip (4), vertical flip (8) or both (C).
+                TilePalette = (MetatileFlags & 0xF000) >> 8 # Upper nibble controls which palette set it uses.
+            if TileID != 0xCCCC:
                 TileRet = ts4file.tell() # We'll be back in a sec.
-            # Didj tilesets have 0xCCCC as an "end of file" identifier.
-            if TilesetFlags & 0x0001 == 1:
-                if TSFormat != 4:
-                    ts4file.seek(TileOffset + (TileID * 0x40), 0)
-                    CropImage = Image.frombuffer('L', (8,8), ts4file.read(0x40), 'raw', 'L', 0, 1)
+                # Didj tilesets have 0xCCCC as an "end of file" identifier.
+                if TilesetFlags & 0x0001 == 1 or TSFormat == 4:
+                    TileKey = (TileID, 0) # 256-colour and Leapster tiles don't use palette rows.
                 else:
-                    ts4file.seek(TileOffset + (TileID * 0x80), 0)
-                    TempTile = bytearray()
-                    for x in range(64):
-                        TileBytes = struct.unpack('<H', ts4file.read(2))[0] # Leapster uses ARGB4444, two bytes per pixel.
-                        if RawPalette == True:
-                            TileByteA = ((TileBytes & 0x0F00) >> 8) * 16 # Second "nibble" is the red value.
-                            TileByteB = ((TileBytes & 0x00F0) >> 4) * 16 # Third "nibble" is the green value.
-                            TileByteC = (TileBytes & 0x000F) * 16 # Fourth "nibble" is the blue value.
+                    TileKey = (TileID, TilePalette)
+                CropImage = TileCacheData.Get(TileKey, TileFlip) # Already decoded and flipped this one? Then there's no need to do it again.
+                if CropImage is None:
+                    Timer.Start('Decode')
+                    if TilesetFlags & 0x0001 == 1:
+                        if TSFormat != 4:
+                            ts4file.seek(TileOffset + (TileID * 0x40), 0)
+                            CropImage = Image.frombuffer('L', (8,8), ts4file.read(0x40), 'raw', 'L', 0, 1)
                         else:
-                            TileByteA = ((TileBytes & 0x0F00) >> 8) + (((TileBytes & 0x0F00) >> 8) * 16) # Second "nibble" is the red value.
-                            TileByteB = ((TileBytes & 0x00F0) >> 4) + (((TileBytes & 0x00F0) >> 4) * 16) # Third "nibble" is the green value.
-                            TileByteC = (TileBytes & 0x000F) + ((TileBytes & 0x000F) * 16) # Fourth "nibble" is the blue value.
-                        TileByteD = ((((TileBytes & 0xF000) >> 12) + (((TileBytes & 0xF000) >> 12) * 16)) * -1) + 255 # First "nibble" is the alpha value. The alpha value is inverted, so we need to fix that.
-                        TempTile.append(TileByteA)
-                        TempTile.append(TileByteB)
-                        TempTile.append(TileByteC)
-                        TempTile.append(TileByteD)
-                    CropImage = Image.frombuffer('RGBA', (8,8), TempTile, 'raw', 'RGBA', 0, 1)
-            else:
-                ts4file.seek(TileOffset + (TileID * 0x20), 0)
-                TempTile = bytearray()
-                for x in range(32):
-                    TileByte = struct.unpack('<B', ts4file.read(1))[0]
-                    TileByteA = (TileByte & 0x0F) + TilePalette
-                    if TileByteA & 0x0F == 0:
-                        TileByteA = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                    TileByteB = ((TileByte & 0xF0) >> 4) + TilePalette
-                    if TileByteB & 0x0F == 0:
-                        TileByteB = 0 # Use index 0 for a global transparency instead of that line's specific transparency value.
-                    TempTile.append(TileByteA)
-                    TempTile.append(TileByteB)
-                CropImage = Image.frombuffer('L', (8,8), TempTile, 'raw', 'L', 0, 1)
-            if TileFlip == 1:
-                CropImage = CropImage.transpose(Image.FLIP_LEFT_RIGHT) # A nibble of "4" means the tile is flipped horizontally.
-            elif TileFlip == 2:
-                CropImage = CropImage.transpose(Image.FLIP_TOP_BOTTOM) # A nibble of "8" means the tile is flipped vertically.
-            elif TileFlip == 3:
-                CropImage = CropImage.transpose(Image.FLIP_LEFT_RIGHT) # A nibble of "C" means the tile is flipped both horizontally...
-                CropImage = CropImage.transpose(Image.FLIP_TOP_BOTTOM) # ...and vertically.
-            if y == 0:
-                TileImage.paste(CropImage, ((MetatilePasteX * 16), (MetatilePasteY * 16)), mask=0) # Pasting the upper-left quadrant.
-            elif y == 1:
-                TileImage.paste(CropImage, ((MetatilePasteX * 16) + 8, (MetatilePasteY * 16)), mask=0) # Pasting the upper-right quadrant.
-            elif y == 2:
-                TileImage.paste(CropImage, ((MetatilePasteX * 16), (MetatilePasteY * 16) + 8), mask=0) # Pasting the lower-left quadrant.
-            elif y == 3:
-                TileImage.paste(CropImage, ((MetatilePasteX * 16) + 8, (MetatilePasteY * 16) + 8), mask=0) # Pasting the lower-right quadrant.
-            ts4file.seek(TileRet, 0)
-    MetatilePasteX = MetatilePasteX + 1 # Shift right by 1 metatile.
-    if MetatilePasteX == 16:
-        MetatilePasteX = 0 # We've reached the edge, so we reset and...
-        MetatilePasteY = MetatilePasteY + 1 # ...move onto the next line.
+                            if TileID < TileCount:
+                                TempTile = TileColours[(TileID * 0x100):(TileID * 0x100) + 0x100] # Already converted from ARGB4444 above.
+                            else:
+                                ts4file.seek(TileOffset + (TileID * 0x80), 0)
+                                TempTile = ConvertARGB4444(ts4file.read(0x80), RawPalette) # Leapster uses ARGB4444, two bytes per pixel.
+                            CropImage = Image.frombuffer('RGBA', (8,8), TempTile, 'raw', 'RGBA', 0, 1)
+                    else:
+                        if TileID < TileCount:
+                            TempTile = ShiftPaletteRow(TileIndices[(TileID * 0x40):(TileID * 0x40) + 0x40], TilePalette) # Index 0 stays as a global transparency instead of that line's specific transparency value.
+                        else:
+                            ts4file.seek(TileOffset + (TileID * 0x20), 0) # Broken tilesets can point past the tile count, so read those the old-fashioned way.
+                            TempTile = DecodeTiles4BPP(ts4file.read(0x20), TilePalette)
+                        CropImage = Image.frombuffer('L', (8,8), TempTile, 'raw', 'L', 0, 1)
+                    Timer.Stop('Decode')
+                    Timer.Start('Flip')
+                    CropImage = TileCacheData.Store(TileKey, TileFlip, CropImage) # Stores all four flip variants: none, horizontal (4), vertical (8) or both (C).
+                    Timer.Stop('Flip')
+                Timer.Start('Paste')
+                if y == 0:
+                    TileImage.paste(CropImage, ((MetatilePasteX * 16), (MetatilePasteY * 16)), mask=0) # Pasting the upper-left quadrant.
+                elif y == 1:
+                    TileImage.paste(CropImage, ((MetatilePasteX * 16) + 8, (MetatilePasteY * 16)), mask=0) # Pasting the upper-right quadrant.
+                elif y == 2:
+                    TileImage.paste(CropImage, ((MetatilePasteX * 16), (MetatilePasteY * 16) + 8), mask=0) # Pasting the lower-left quadrant.
+                elif y == 3:
+                    TileImage.paste(CropImage, ((MetatilePasteX * 16) + 8, (MetatilePasteY * 16) + 8), mask=0) # Pasting the lower-right quadrant.
+                Timer.Stop('Paste')
+                ts4file.seek(TileRet, 0)
+        MetatilePasteX = MetatilePasteX + 1 # Shift right by 1 metatile.
+        if MetatilePasteX == 16:
+            MetatilePasteX = 0 # We've reached the edge, so we reset and...
+            MetatilePasteY = MetatilePasteY + 1 # ...move onto the next line.
 
-outfile = (TilesetName + '_metatile.png') # Setting up the file path.
-if TSFormat != 4:
-    TileImage.putpalette(TS4Palette) # Load the palette (but only if it's not a Leapster TS8).
-TileImage.save(outfile) # Saving the file.
-print("Saved to " + outfile) # We did the thing.
+    outfile = (TilesetName + '_metatile.png') # Setting up the file path.
+    Timer.Start('Save')
+    if TSFormat != 4:
+        TileImage.putpalette(TS4Palette) # Load the palette (but only if it's not a Leapster TS8).
+    ImageSaver(0, CompressLevel, OptimizePNG).Save(TileImage, outfile) # Saving the file. Only the one image, so there's nothing to save in the background alongside.
+    Timer.Stop('Save')
+    OutputFiles.append(outfile)
+    print("Saved to " + outfile) # We did the thing.
+    if Instrument == True:
+        print(TileCacheData.Report()) # How many tiles were reused instead of decoded again.
+        Timer.Count('Metatiles', MetatileCount)
+        Timer.Count('CacheHits', TileCacheData.Hits)
+        Timer.Count('CacheMisses', TileCacheData.Misses)
+        OutputFiles.append(Timer.Save(TilesetName + '_timing.json'))
+        print("Timings saved to " + OutputFiles[-1])
+    OutputFiles.append(SaveManifest(ManifestName, Inputs, Settings, list(OutputFiles)))
 
-if UseGBAROM == True:
-    if TilesetFlags & 0x0001 == 1:
-        print("The next file should (theoretically) start at around " + str(hex(ts4file.tell() + (TileCount * 64))) + " in " + ROMName + ".")
-    else:
-        print("The next file should (theoretically) start at around " + str(hex(ts4file.tell() + (TileCount * 32))) + " in " + ROMName + ".")
-    os.system('pause')
\ No newline at end of file
+    if UseGBAROM == True:
+        if TilesetFlags & 0x0004 == 0x0004:
+            print("The next file should (theoretically) start at around " + str(hex(CompressedStart + CompressedSize)) + " in " + ROMName + ".")
+        elif TilesetFlags & 0x0001 == 1:
+            print("The next file should (theoretically) start at around " + str(hex(ts4file.tell() + (TileCount * 64))) + " in " + ROMName + ".")
+        else:
+            print("The next file should (theoretically) start at around " + str(hex(ts4file.tell() + (TileCount * 32))) + " in " + ROMName + ".")
+    return OutputFiles
+
+if __name__ == "__main__":
+    try:
+        ExtractTileset()
+    except ExtractError as Error:
+        print(Error)
+        os.system('pause')
+        exit()
+    if UseGBAROM == True:
+        os.system('pause')